@@ -1,7 +1,23 @@
+import os, secrets
+from dotenv import load_dotenv
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemLoader
 
+from app.template_cache import TemplateBytecodeCache
 
-TEMPLATES = Jinja2Templates(directory="./app/view")
+# the settings below can come from .env too, whichever module is imported first
+load_dotenv()
+
+
+TEMPLATE_DIR = './app/view'
+# compiled templates, filled by `python -m app.scripts.precompile_templates` or the warm-up on startup
+TEMPLATE_CACHE_DIR = './.cache/templates'
+
+TEMPLATES = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    bytecode_cache=TemplateBytecodeCache(TEMPLATE_CACHE_DIR)
+))
 CUBES = [
     {'size': 2, 'puzzle': '2x2x2', 'status': 'inactive'},
     {'size': 3, 'puzzle': '3x3x3', 'status': 'inactive'},
@@ -33,4 +49,81 @@ OPPOSITE_FACES = {
 }
 
 MODIFIERS = ['', "'", '2']
-MOVES = ['R', 'L', 'U', 'D', 'F', 'B']
\ No newline at end of file
+MOVES = ['R', 'L', 'U', 'D', 'F', 'B']
+
+USER_COOKIE = 'user_id'
+USER_COOKIE_MAX_AGE = 60 * 60 * 24 * 365
+# signs the session cookie, has to be the same on every worker, without it each process
+# signs with a random key of its own and a restart logs everybody out
+SESSION_SECRET = os.getenv('SESSION_SECRET') or secrets.token_hex(32)
+PASSWORD_HASH_ITERATIONS = 200_000
+
+# metric -> (window size, omit best and worst), the same windows get_current_averages uses
+HISTORY_METRICS = {
+    'single': (1, False),
+    'avg_five': (5, True),
+    'avg_twelve': (12, True),
+    'mean_hundred': (100, False)
+}
+HISTORY_MAX_POINTS = 5000
+HISTORY_CACHE_SIZE = 64
+# window size -> column of the best average every practice session keeps
+SESSION_BEST_AVERAGES = {5: 'best_avg_five', 12: 'best_avg_twelve'}
+
+# quantiles of the time distribution are within 1% of the exact ones
+DISTRIBUTION_RELATIVE_ACCURACY = 0.01
+DISTRIBUTION_QUANTILES = [0.1, 0.5, 0.9]
+# buckets of the sketch and of the histogram each, the highest ones are merged when the times span more,
+# that keeps a sketch at about 2 KB even with a forgotten timer in the history
+DISTRIBUTION_MAX_BUCKETS = 256
+# histogram bucket width in seconds and the "sub-N" thresholds, thresholds are multiples of the width so their counts are exact
+DISTRIBUTION_BUCKETS = {
+    '2x2x2': {'width': 0.5, 'thresholds': [3, 5, 10]},
+    '3x3x3': {'width': 1, 'thresholds': [10, 15, 20, 30]},
+    '4x4x4': {'width': 5, 'thresholds': [40, 60, 90]},
+    '5x5x5': {'width': 5, 'thresholds': [80, 120, 180]},
+    '6x6x6': {'width': 10, 'thresholds': [150, 240, 300]},
+    '7x7x7': {'width': 10, 'thresholds': [240, 360, 480]},
+    '8x8x8': {'width': 20, 'thresholds': [360, 480, 600]},
+    '9x9x9': {'width': 20, 'thresholds': [480, 600, 900]}
+}
+
+STATIC_CACHE_MAX_AGE = 60 * 60
+STATIC_COMPRESSIBLE_SUFFIXES = ['.js', '.css', '.html', '.svg', '.json']
+STATIC_COMPRESS_MIN_SIZE = 1024
+
+SOLUTIONS_BATCH_MAX_SIZE = 500
+
+PB_JOB_WORKERS = 2
+PB_EVENTS_KEEPALIVE = 15
+
+# connections opened (and put back into the pool) by the warm-up
+STARTUP_DB_CONNECTIONS = 2
+# seconds, checked by `python -m app.scripts.startup_budget`
+STARTUP_IMPORT_BUDGET = 1.5
+STARTUP_WARM_UP_BUDGET = 2.0
+STARTUP_FIRST_REQUEST_BUDGET = 0.1
+
+READ_PRIMARY_COOKIE = 'read_primary_until'
+# seconds after a write during which the client keeps reading from the primary, longer than the usual replica lag
+READ_YOUR_WRITES_WINDOW = 10
+
+# solutions older than this are moved to the archive by `python -m app.scripts.archive_solutions`
+SOLUTIONS_ARCHIVE_AFTER_DAYS = 120
+# the newest solutions of a puzzle always stay live, enough for the largest window (mo100)
+SOLUTIONS_ARCHIVE_KEEP_LATEST = 100
+# one directory of .npy columns per user and puzzle, has to be shared by all app servers
+SOLUTIONS_ARCHIVE_DIR = os.getenv('SOLUTIONS_ARCHIVE_DIR', './archive/solutions')
+# generation directories kept per archive, the current one and the ones readers may still have memory-mapped
+SOLUTIONS_ARCHIVE_KEEP_GENERATIONS = 2
+
+# seconds between the version checks while the cache invalidation listener isn't connected
+INVALIDATION_FALLBACK_INTERVAL = 1
+# seconds before the listener tries to connect again
+INVALIDATION_RECONNECT_DELAY = 5
+# users and puzzles whose last version each worker remembers, the least recently changed ones are forgotten
+INVALIDATION_SEEN_SIZE = 10000
+
+# "python" computes the latest averages of a puzzle from its newest 100 solutions in Python, one query per puzzle,
+# "sql" computes them for any number of puzzles in a single query with window functions
+AVERAGES_ENGINE = os.getenv('AVERAGES_ENGINE', 'python')
@@ -1,46 +1,72 @@
+from uuid import UUID
 from fastapi.responses import HTMLResponse
 from sqlmodel import Session
 from app.constants import PUZZLES, TEMPLATES
+from app.db.query_counter import max_queries
 from app.services.scramble_service import ScrambleService
+from app.services.session_service import SessionService
 from app.services.solution_service import SolutionService
-from app.utils import float_to_timestr, get_cubes
+from app.services.summary_service import SummaryService
+from app.services.version_service import VersionService
+from app.utils import floats_to_timestrs, get_cubes
 
 
 class PagesController:
     @classmethod
-    def serve_index_file(cls, db: Session):
+    @max_queries(3)
+    def serve_index_file(cls, user_id: UUID, db: Session, if_none_match: str | None = None):
+        etag = VersionService.get_etag(user_id, PUZZLES, db)
+        if VersionService.is_not_modified(etag, if_none_match):
+            return VersionService.not_modified_response(etag)
+
         cubes = []
+        summaries = SummaryService.get_summaries(user_id, db)
+        pbs = SolutionService.get_personal_bests(PUZZLES, user_id, db)
         for puzzle in PUZZLES:
-            pb = SolutionService.get_personal_best(puzzle, db)
             cubes.append({
                 'puzzle': puzzle,
                 'size': int(puzzle[0]),
                 'status': 'active',
-                'pb': pb
+                'pb': pbs[puzzle],
+                'summary': SummaryService.to_details(summaries.get(puzzle))
             })
 
         html = TEMPLATES.get_template('pages/index.html').render({
             'cubes': cubes
         })
-        return HTMLResponse(html)
+        return HTMLResponse(html, headers=VersionService.get_cache_headers(etag))
 
     @classmethod
-    def serve_cubing_file(cls, puzzle: str, db: Session):
-        current_averages = SolutionService.get_current_averages(puzzle, db)
-        solutions = SolutionService.get_solutions(puzzle, db)
-        for s in solutions['list']:
-            s.time = float_to_timestr(s.time)
+    @max_queries(5)
+    def serve_cubing_file(cls, puzzle: str, user_id: UUID, db: Session):
+        summary = SummaryService.get_summary(puzzle, user_id, db)
+        solutions = SolutionService.get_solutions(puzzle, user_id, db)
+        personal_best = SolutionService.get_personal_best(puzzle, user_id, db)
+        session = SessionService.get_active_session(puzzle, user_id, db)
+        sessions = SessionService.get_sessions(puzzle, user_id, db)
 
+        # formatted in place, the sessions don't autoflush and the view rolls back, so they are never written
+        time_strs = floats_to_timestrs([s.time for s in solutions['list']])
+        for s, time_str in zip(solutions['list'], time_strs):
+            s.time = time_str
 
         html = TEMPLATES.get_template('pages/cubing.html').render({
             "puzzle": puzzle,
             "cubes": get_cubes(puzzle),
-            "current_averages": current_averages,
-            "personal_best": SolutionService.get_personal_best(puzzle, db),
+            "current_averages": SummaryService.to_current_averages(summary),
+            "summary": SummaryService.to_details(summary),
+            "personal_best": personal_best,
             "scramble": ScrambleService.generate_scramble(puzzle),
-            "solutions": solutions
+            "solutions": solutions,
+            "session": SessionService.to_details(session),
+            "sessions": sessions
         })
 
         db.rollback()
 
-        return HTMLResponse(html)
\ No newline at end of file
+        return HTMLResponse(html)
+
+    @classmethod
+    def serve_login_file(cls):
+        html = TEMPLATES.get_template('pages/login.html').render()
+        return HTMLResponse(html)
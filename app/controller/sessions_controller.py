@@ -0,0 +1,85 @@
+from uuid import UUID
+from fastapi import HTTPException, status
+from fastapi.responses import HTMLResponse
+from sqlmodel import Session
+from app.constants import TEMPLATES
+from app.db.query_counter import max_queries
+from app.services.session_service import SessionService
+
+
+class SessionsController:
+    @classmethod
+    @max_queries(2)
+    def get_session_view(cls, puzzle: str, user_id: UUID, db: Session):
+        """
+        Retrieves the active session of a puzzle with its stats and returns an HTML response.
+
+        Args:
+            puzzle (str): The name of the puzzle.
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            HTMLResponse: A response containing the rendered session stats and controls.
+        """
+
+        html = cls.render_session(puzzle, user_id, db)
+        db.rollback()
+
+        return HTMLResponse(html)
+
+    @classmethod
+    def create_session(cls, puzzle: str, name: str | None, user_id: UUID, db: Session):
+        """
+        Starts a new session for a puzzle and returns the rendered session view.
+
+        Args:
+            puzzle (str): The name of the puzzle.
+            name (str | None): The name of the session.
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            HTMLResponse: A response containing the rendered session, with a status code of 201.
+        """
+
+        session = SessionService.create_session(puzzle, name, user_id, db)
+        html = cls.render_session(session.puzzle, user_id, db)
+        db.rollback()
+
+        return HTMLResponse(html, status_code=status.HTTP_201_CREATED)
+
+    @classmethod
+    def update_session(cls, id: str, action: str, user_id: UUID, db: Session):
+        """
+        Switches to or closes a session and returns the rendered session view.
+
+        Args:
+            id (str): The ID of the session.
+            action (str): Either "switch" or "close".
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            HTMLResponse: A response containing the rendered session view of the puzzle.
+        """
+
+        if action == 'switch':
+            session = SessionService.switch_session(id, user_id, db)
+        elif action == 'close':
+            session = SessionService.close_session(id, user_id, db)
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid action')
+
+        html = cls.render_session(session.puzzle, user_id, db)
+        db.rollback()
+
+        return HTMLResponse(html)
+
+    @classmethod
+    def render_session(cls, puzzle: str, user_id: UUID, db: Session) -> str:
+        return TEMPLATES.get_template('templates/session.html').render({
+            'puzzle': puzzle,
+            'session': SessionService.to_details(SessionService.get_active_session(puzzle, user_id, db)),
+            'sessions': SessionService.get_sessions(puzzle, user_id, db)
+        })
@@ -1,39 +1,61 @@
-from fastapi import Response, status
-from fastapi.responses import HTMLResponse
+import asyncio
+from typing import List
+from uuid import UUID
+from fastapi import Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from sqlmodel import Session
-from app.constants import TEMPLATES
+from app.constants import PB_EVENTS_KEEPALIVE, TEMPLATES
+from app.controller.sessions_controller import SessionsController
 from app.db.db_helpers import get_model_by_id
-from app.model.personal_best import PersonalBest
+from app.db.query_counter import max_queries
 from app.model.solution import Solution
+from app.services.distribution_service import DistributionService
+from app.services.history_service import HistoryService
+from app.services.invalidation_service import InvalidationService
+from app.services.personal_best_jobs import PersonalBestJobs
 from app.services.scramble_service import ScrambleService
 from app.services.solution_service import SolutionService
-from app.utils import float_to_timestr, is_valid_uuid
+from app.services.summary_service import SummaryService
+from app.services.version_service import VersionService
+from app.types.batch import BatchSolution
+from app.utils import float_to_timestr, floats_to_timestrs, is_valid_uuid
 
 
 
 
 class SolutionsController:
     @classmethod
-    def get_solutions_view(cls, puzzle: str, db: Session, cursor: str | None, limit: int = 20):
+    @max_queries(3)
+    def get_solutions_view(cls, puzzle: str, user_id: UUID, db: Session, cursor: str | None, limit: int = 20, if_none_match: str | None = None):
         """
         Retrieves a list of solutions for a given puzzle and returns an HTML response.
 
         Args:
             puzzle (str): The name of the puzzle to filter solutions by.
+            user_id (UUID): The logged in user.
             db (Session): The database session.
             cursor (str | None): A cursor for pagination, defaults to None.
             limit (int): The maximum number of solutions to return, defaults to 20.
+            if_none_match (str | None): The If-None-Match header of the request.
 
         Returns:
             HTMLResponse: A response containing the rendered HTML of the solutions.
+            Response: A 304 response if the client's copy is still current.
         """
 
-        solutions = SolutionService.get_solutions(puzzle, db, cursor, limit)
+        etag = VersionService.get_etag(user_id, [puzzle], db, str(cursor), str(limit))
+        if VersionService.is_not_modified(etag, if_none_match):
+            return VersionService.not_modified_response(etag)
+
+        solutions = SolutionService.get_solutions(puzzle, user_id, db, cursor, limit)
 
         solutions_html = []
 
-        for solution in solutions['list']:
-            solution.time = float_to_timestr(solution.time)
+        time_strs = floats_to_timestrs([solution.time for solution in solutions['list']])
+
+        for solution, time_str in zip(solutions['list'], time_strs):
+            solution.time = time_str
             html = TEMPLATES.get_template('templates/solution.html').render({
                 'solution': solution
             })
@@ -48,19 +70,21 @@ class SolutionsController:
                 <li id="show-more" hx-get="/solutions?puzzle={ puzzle }&cursor={ solutions['cursor'] }" hx-target="this" hx-swap="outerHTML">Show More</li>
             """
         
-        return HTMLResponse(result_html)
+        return HTMLResponse(result_html, headers=VersionService.get_cache_headers(etag))
 
 
     @classmethod
-    def create_solution(cls, solution_time: str, puzzle: str, scramble: str, db: Session):
+    def create_solution(cls, solution_time: str, puzzle: str, scramble: str, user_id: UUID, db: Session):
         """
         Creates a new solution, updates the current averages, and returns an HTML response 
-        with the solution, current averages, and new scramble.
+        with the solution, current averages, and new scramble. Personal bests are updated by a
+        background job afterwards, which notifies the page through `get_events`.
 
         Args:
             solution_time (str): The time of the solution.
             puzzle (str): The name of the puzzle.
             scramble (str): The scramble used for the solution.
+            user_id (UUID): The logged in user.
             db (Session): The database session.
 
         Returns:
@@ -68,10 +92,9 @@ class SolutionsController:
             and scramble, with a status code of 201 if successful.
         """
 
-        solution = SolutionService.create_solution(solution_time, puzzle, scramble, db)
-        current_averages = SolutionService.get_current_averages(puzzle, db)
-        PBs = SolutionService.get_personal_best(puzzle, db)
-        trigger_UI_change = SolutionService.update_personal_best(PBs, current_averages, db)
+        solution = SolutionService.create_solution(solution_time, puzzle, scramble, user_id, db)
+        PersonalBestJobs.enqueue(puzzle, user_id)
+        summary = SummaryService.get_summary(puzzle, user_id, db)
 
         solution.time = float_to_timestr(solution.time)
 
@@ -79,12 +102,14 @@ class SolutionsController:
             'solution': solution
         })
         averages_html = TEMPLATES.get_template('templates/averages_current.html').render({
-            'current_averages': current_averages,
+            'current_averages': SummaryService.to_current_averages(summary),
+            'summary': SummaryService.to_details(summary),
             'puzzle': puzzle
         })
         scramble_html = TEMPLATES.get_template('templates/scramble.html').render({
             'scramble': ScrambleService.generate_scramble(puzzle)
         })
+        session_html = SessionsController.render_session(puzzle, user_id, db)
 
         combined_html = f"""
             {solution_html}
@@ -94,18 +119,101 @@ class SolutionsController:
             <div hx-swap-oob="outerHTML:#scramble">
                 {scramble_html}
             </div>
+            <div hx-swap-oob="outerHTML:#practice_session">
+                {session_html}
+            </div>
         """
 
-        headers = {}
-        if trigger_UI_change:
-            headers["HX-Trigger"] = "new_pb"
-
         db.rollback()
-        return HTMLResponse(combined_html, status_code=status.HTTP_201_CREATED, headers=headers)
+        return HTMLResponse(combined_html, status_code=status.HTTP_201_CREATED)
     
 
     @classmethod
-    def update_solution(cls, id: str, action: str, db: Session):
+    def create_solutions(cls, items: List[BatchSolution], puzzle: str, user_id: UUID, db: Session):
+        """
+        Stores a batch of solutions replayed by an offline client and returns the HTML of the new
+        solutions, with the current averages and the session swapped in once for the whole batch.
+
+        Args:
+            items (List[BatchSolution]): The queued solutions with their idempotency keys.
+            puzzle (str): The name of the puzzle.
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            HTMLResponse: The rendered fragments, with a status code of 201 if any solution was new
+            and 200 if the whole batch was a replay.
+        """
+
+        solutions = SolutionService.create_solutions(items, puzzle, user_id, db)
+
+        if len(solutions) > 0:
+            PersonalBestJobs.enqueue(puzzle, user_id)
+
+        solutions_html = []
+        for solution, time_str in zip(solutions, floats_to_timestrs([solution.time for solution in solutions])):
+            solution.time = time_str
+            solutions_html.append(TEMPLATES.get_template('templates/solution.html').render({
+                'solution': solution
+            }))
+
+        summary = SummaryService.get_summary(puzzle, user_id, db)
+        averages_html = TEMPLATES.get_template('templates/averages_current.html').render({
+            'current_averages': SummaryService.to_current_averages(summary),
+            'summary': SummaryService.to_details(summary),
+            'puzzle': puzzle
+        })
+        session_html = SessionsController.render_session(puzzle, user_id, db)
+
+        combined_html = f"""
+            {''.join(solutions_html)}
+            <div hx-swap-oob="outerHTML:#current_averages">
+                {averages_html}
+            </div>
+            <div hx-swap-oob="outerHTML:#practice_session">
+                {session_html}
+            </div>
+        """
+
+        db.rollback()
+        status_code = status.HTTP_201_CREATED if len(solutions) > 0 else status.HTTP_200_OK
+        return HTMLResponse(combined_html, status_code=status_code)
+
+
+    @classmethod
+    def get_events(cls, puzzle: str, user_id: UUID, request: Request):
+        """
+        Streams server-sent events of a puzzle, currently a "new_pb" event whenever a background
+        job stored a new personal best. A comment is sent every few seconds to keep the connection open.
+
+        Args:
+            puzzle (str): The name of the puzzle.
+            user_id (UUID): The logged in user.
+            request (Request): The request, used to notice a disconnected client.
+
+        Returns:
+            StreamingResponse: A text/event-stream response.
+        """
+
+        async def stream():
+            queue = PersonalBestJobs.subscribe(puzzle, user_id)
+            try:
+                # one query, so a PB of another worker missed while its listener reconnects is still sent
+                await run_in_threadpool(InvalidationService.watch, puzzle, user_id)
+                while not await request.is_disconnected():
+                    try:
+                        event = await asyncio.wait_for(queue.get(), PB_EVENTS_KEEPALIVE)
+                        yield f'event: {event}\ndata: \n\n'
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+            finally:
+                PersonalBestJobs.unsubscribe(puzzle, user_id, queue)
+
+        return StreamingResponse(stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+    @classmethod
+    def update_solution(cls, id: str, action: str, user_id: UUID, db: Session):
         """
         Updates a solution based on the provided ID and action, then returns an HTML response 
         with the updated solution.
@@ -113,13 +221,14 @@ class SolutionsController:
         Args:
             id (str): The ID of the solution to update.
             action (str): The action to perform on the solution (e.g., update time, etc.).
+            user_id (UUID): The logged in user.
             db (Session): The database session.
 
         Returns:
             HTMLResponse: A response containing the rendered HTML for the updated solution.
         """
 
-        solution = SolutionService.update_solution(id, action, db)
+        solution = SolutionService.update_solution(id, action, user_id, db)
         
         solution.time = float_to_timestr(solution.time)
 
@@ -130,56 +239,124 @@ class SolutionsController:
         return HTMLResponse(html, status_code=status.HTTP_200_OK, headers=headers)
     
     @classmethod
-    def get_current_averages_view(cls, puzzle: str, db: Session):
+    @max_queries(2)
+    def get_current_averages_view(cls, puzzle: str, user_id: UUID, db: Session, if_none_match: str | None = None):
         """
-        Retrieves the current averages for a given puzzle and returns an HTML response.
+        Retrieves the current averages for a given puzzle from its summary and returns an HTML response.
 
         Args:
             puzzle (str): The name of the puzzle to get averages for.
+            user_id (UUID): The logged in user.
             db (Session): The database session.
+            if_none_match (str | None): The If-None-Match header of the request.
 
         Returns:
             HTMLResponse: A response containing the rendered HTML of the current averages.
+            Response: A 304 response if the client's copy is still current.
         """
 
-        current_averages = SolutionService.get_current_averages(puzzle, db)
+        etag = VersionService.get_etag(user_id, [puzzle], db)
+        if VersionService.is_not_modified(etag, if_none_match):
+            return VersionService.not_modified_response(etag)
+
+        summary = SummaryService.get_summary(puzzle, user_id, db)
         html = TEMPLATES.get_template('templates/averages_current.html').render({
-            'current_averages': current_averages,
+            'current_averages': SummaryService.to_current_averages(summary),
+            'summary': SummaryService.to_details(summary),
             'puzzle': puzzle
         })
 
-        return HTMLResponse(html)
+        return HTMLResponse(html, headers=VersionService.get_cache_headers(etag))
     
     @classmethod
-    def get_personal_best_view(cls, puzzle: str, db: Session):
+    @max_queries(2)
+    def get_personal_best_view(cls, puzzle: str, user_id: UUID, db: Session, if_none_match: str | None = None):
         """
         Retrieves the personal best solutions for a given puzzle and returns an HTML response.
 
         Args:
             puzzle (str): The name of the puzzle to get personal bests for.
+            user_id (UUID): The logged in user.
             db (Session): The database session.
+            if_none_match (str | None): The If-None-Match header of the request.
 
         Returns:
             HTMLResponse: A response containing the rendered HTML of the personal best solutions.
+            Response: A 304 response if the client's copy is still current.
         """
 
-        pbs = SolutionService.get_personal_best(puzzle, db)
+        etag = VersionService.get_etag(user_id, [puzzle], db)
+        if VersionService.is_not_modified(etag, if_none_match):
+            return VersionService.not_modified_response(etag)
+
+        pbs = SolutionService.get_personal_best(puzzle, user_id, db)
         
         html = TEMPLATES.get_template('templates/averages_best.html').render({
             'personal_best': pbs,
             'puzzle': puzzle
         })
 
+        return HTMLResponse(html, headers=VersionService.get_cache_headers(etag))
+    
+    @classmethod
+    @max_queries(1)
+    def get_history(cls, puzzle: str, metric: str, points: int, user_id: UUID, db: Session):
+        """
+        Retrieves the progress series of a metric downsampled for charts and returns a JSON response.
+
+        Args:
+            puzzle (str): The name of the puzzle.
+            metric (str): The metric to chart, "single", "avg_five", "avg_twelve" or "mean_hundred".
+            points (int): The maximum number of points to return.
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            JSONResponse: A response with the x (unix timestamps) and y (seconds) values of the series.
+        """
+
+        history = HistoryService.get_history(puzzle, metric, points, user_id, db)
+        db.rollback()
+
+        return JSONResponse(history)
+    
+    @classmethod
+    @max_queries(1)
+    def get_distribution_view(cls, puzzle: str, user_id: UUID, db: Session):
+        """
+        Retrieves the distribution of times of a puzzle and returns an HTML response.
+
+        Args:
+            puzzle (str): The name of the puzzle.
+            user_id (UUID): The logged in user.
+            db (Session): The database session.
+
+        Returns:
+            HTMLResponse: A response containing the rendered percentiles, sub-N counts and histogram.
+        """
+
+        distribution = DistributionService.get_distribution(puzzle, user_id, db)
+        largest_bucket = max((bucket['count'] for bucket in distribution['histogram']), default=0)
+
+        html = TEMPLATES.get_template('templates/distribution.html').render({
+            'distribution': distribution,
+            'largest_bucket': largest_bucket,
+            'accuracy_percent': round(distribution['relative_accuracy'] * 100, 2)
+        })
+        db.rollback()
+
         return HTMLResponse(html)
     
     @classmethod
-    def get_solution_details_view(cls, id: str, db: Session, puzzle: str | None = None):
+    @max_queries(3)
+    def get_solution_details_view(cls, id: str, user_id: UUID, db: Session, puzzle: str | None = None):
         """
         Retrieves the details of a solution or personal best based on the provided ID and puzzle, 
-        and returns an HTML response.
+        and returns an HTML response. Every branch loads its solutions with one query, no lazy loads.
 
         Args:
             id (str): The ID of the solution or personal best to get details for.
+            user_id (UUID): The logged in user.
             db (Session): The database session.
             puzzle (str | None): The puzzle to filter solutions by, defaults to None.
 
@@ -188,44 +365,34 @@ class SolutionsController:
             Response: A response with a 404 status if the solution ID doesn't exist.
         """
         
-        template = TEMPLATES.get_template('templates/solution_details.html')
-
-        if not is_valid_uuid(id) and puzzle is not None:
-            solutions = SolutionService.get_current_averages(puzzle, db)[id]['solutions']
-            details = []
-            for solution in solutions:
-                details.append({
-                    'scramble': solution.scramble.replace('_', ' '),
-                    'time_str': float_to_timestr(solution.time)
-                })
-
-            html = template.render({'details': details})
-            return HTMLResponse(html)
-
-
-        solution: PersonalBest | None = get_model_by_id(PersonalBest, id, db)
-
-        if solution is not None:
-            details = []
-            for pb in solution.personal_bests:
-                details.append({
-                    'scramble': pb.solution.scramble.replace('_', ' '),
-                    'time_str': float_to_timestr(pb.solution.time)
-                })
+        if not is_valid_uuid(id):
+            if puzzle is None:
+                return Response(content='That ID doesn\'t exist.', status_code=status.HTTP_404_NOT_FOUND)
+
+            solutions = SolutionService.get_current_window(puzzle, id, user_id, db)
+        else:
+            solutions = SolutionService.get_personal_best_solutions(id, user_id, db)
+
+            if len(solutions) == 0:
+                solution: Solution | None = get_model_by_id(Solution, id, db, user_id)
+
+                if solution is None:
+                    return Response(content='That ID doesn\'t exist.', status_code=status.HTTP_404_NOT_FOUND)
+
+                # every solve of the same scramble, usually just this one
+                solutions = [solution]
+                if len(solution.scramble) > 0:
+                    solutions = SolutionService.get_solutions_by_scramble(solution.scramble, solution.puzzle, user_id, db)
+
+        details = []
+        time_strs = floats_to_timestrs([solution.time for solution in solutions])
+        for solution, time_str in zip(solutions, time_strs):
+            details.append({
+                'scramble': ' '.join(ScrambleService.decode(solution.scramble)),
+                'time_str': time_str
+            })
 
-            html = template.render({'details': details})
-            return HTMLResponse(html)
-        
-        solution: Solution | None = get_model_by_id(Solution, id, db)
+        html = TEMPLATES.get_template('templates/solution_details.html').render({'details': details})
+        db.rollback()
 
-        if solution is None:
-            return Response(content='That ID doesn\'t exist.', status_code=status.HTTP_404_NOT_FOUND)
-        
-        html = template.render({
-            'details': [{
-                'scramble': solution.scramble.replace('_', ' '),
-                'time_str': float_to_timestr(solution.time)
-            }]
-        })
-        
-        return HTMLResponse(html)
\ No newline at end of file
+        return HTMLResponse(html)
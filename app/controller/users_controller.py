@@ -0,0 +1,56 @@
+from fastapi import status
+from fastapi.responses import RedirectResponse
+from sqlmodel import Session
+from app.constants import USER_COOKIE, USER_COOKIE_MAX_AGE
+from app.model.user import User
+from app.services.user_service import UserService
+
+
+class UsersController:
+    @classmethod
+    def register(cls, name: str, password: str, db: Session):
+        """
+        Creates a new user account, logs the user in and redirects to the index page.
+
+        Args:
+            name (str): The name of the new user.
+            password (str): The password of the new user.
+            db (Session): The database session.
+
+        Returns:
+            RedirectResponse: A redirect to the index page with the session cookie set.
+        """
+
+        user = UserService.create_user(name, password, db)
+        return cls._login_response(user)
+
+    @classmethod
+    def login(cls, name: str, password: str, db: Session):
+        """
+        Logs an existing user in and redirects to the index page.
+
+        Args:
+            name (str): The name of the user.
+            password (str): The password of the user.
+            db (Session): The database session.
+
+        Returns:
+            RedirectResponse: A redirect to the index page with the session cookie set.
+        """
+
+        user = UserService.authenticate(name, password, db)
+        return cls._login_response(user)
+
+    @classmethod
+    def logout(cls):
+        response = RedirectResponse('/', status_code=status.HTTP_303_SEE_OTHER)
+        response.delete_cookie(USER_COOKIE)
+
+        return response
+
+    @classmethod
+    def _login_response(cls, user: User):
+        response = RedirectResponse('/', status_code=status.HTTP_303_SEE_OTHER)
+        response.set_cookie(USER_COOKIE, UserService.create_session_cookie(user), max_age=USER_COOKIE_MAX_AGE, httponly=True, samesite='lax')
+
+        return response
@@ -1,10 +1,16 @@
+from uuid import UUID
 from sqlalchemy import select
 from sqlmodel import SQLModel, Session
 
 
-def get_model_by_id(model: type[SQLModel], id: str, db: Session):
+def get_model_by_id(model: type[SQLModel], id: str, db: Session, user_id: UUID | None = None):
     if not isinstance(model, type) or not issubclass(model, SQLModel):
         raise ValueError(f"You must pass a valid SQLModel")
     
-    model = db.execute(select(model).where(model.id == id)).scalar_one_or_none()
-    return model
\ No newline at end of file
+    statement = select(model).where(model.id == id)
+
+    if user_id is not None:
+        statement = statement.where(model.user_id == user_id)
+
+    model = db.execute(statement).scalar_one_or_none()
+    return model
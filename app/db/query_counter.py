@@ -0,0 +1,82 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import getenv
+from typing import List
+from sqlalchemy import event
+
+from app.db.database import engine, replica_engine
+
+# off in production, the tests turn it on (tests/conftest.py), set QUERY_BUDGETS=1 to check the budgets in development too
+QUERY_BUDGETS = getenv('QUERY_BUDGETS') == '1'
+
+_statements: ContextVar[List[str] | None] = ContextVar('query_counter_statements', default=None)
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+
+for _engine in {engine, replica_engine}:
+    event.listen(_engine, 'before_cursor_execute', _record_statement)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL statements executed inside the block by the current request (or thread),
+    on both the primary and the replica. Nested blocks count towards the outer ones too.
+
+    Yields:
+        List[str]: The statements, filled while the block runs.
+    """
+    outer = _statements.get()
+    statements: List[str] = []
+    token = _statements.set(statements)
+    try:
+        yield statements
+    finally:
+        _statements.reset(token)
+        if outer is not None:
+            outer.extend(statements)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = 'block'):
+    """
+    Fail if the block executes more than `limit` statements, e.g. because of a lazy load per row.
+
+    Raises:
+        AssertionError: With the executed statements, if there were too many.
+    """
+    with count_queries() as statements:
+        yield statements
+
+    if len(statements) > limit:
+        listing = '\n'.join(f'    {statement}' for statement in statements)
+        raise AssertionError(f'{label} executed {len(statements)} queries, expected at most {limit}:\n{listing}')
+
+
+def max_queries(limit: int):
+    """
+    Query budget of a controller method, checked by `assert_max_queries` when QUERY_BUDGETS is on.
+    Goes below @classmethod:
+
+        @classmethod
+        @max_queries(2)
+        def get_view(cls, ...):
+    """
+    def decorator(fn):
+        if not QUERY_BUDGETS:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with assert_max_queries(limit, fn.__qualname__):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,62 @@
+import time
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.constants import READ_PRIMARY_COOKIE, READ_YOUR_WRITES_WINDOW
+from app.db.database import ReadSessionLocal, SessionLocal
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def reads_from_primary(request: Request) -> bool:
+    """
+    Whether the client wrote something within the last `READ_YOUR_WRITES_WINDOW` seconds,
+    so the replica might not show it yet.
+    """
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session(primary: bool):
+    """
+    A session on the primary or on the replica, for the read dependencies.
+    """
+    db = SessionLocal() if primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """
+    The session dependency of read only endpoints, bound to the replica unless the client
+    has to see its own recent writes.
+    """
+    yield from read_session(reads_from_primary(request))
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sets the read-from-primary cookie on every successful non GET response, the cookie travels
+    with the client, so it works no matter which worker handles the following reads.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message):
+            if message['type'] == 'http.response.start' and message['status'] < 400:
+                until = time.time() + READ_YOUR_WRITES_WINDOW
+                headers = MutableHeaders(scope=message)
+                headers.append('set-cookie', f'{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={READ_YOUR_WRITES_WINDOW}; Path=/; HttpOnly; SameSite=lax')
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
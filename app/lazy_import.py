@@ -0,0 +1,34 @@
+import importlib, threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Stands in for a heavy module (e.g. NumPy) and imports it on the first attribute access,
+    so importing the app stays cheap and the import cost is paid by the warm-up instead.
+
+    Modules using it need `from __future__ import annotations`, otherwise annotations
+    like `np.ndarray` are evaluated at import time and load the module right away.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType | None = None
+        self._lock = threading.Lock()
+
+    # private names only, anything public would shadow the attribute of the module (e.g. numpy.load)
+    @property
+    def _is_loaded(self) -> bool:
+        return self._module is not None
+
+    def _import(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._import(), attr)
+
+    def __repr__(self) -> str:
+        return f'<lazy module {self._name!r}{"" if self._is_loaded else " (not loaded)"}>'
@@ -0,0 +1,11 @@
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel, Field
+
+class PendingPbUpdate(SQLModel, table = True):
+    __tablename__ = 'pending_pb_updates'
+
+    user_id: UUID = Field(foreign_key='users.id', primary_key=True)
+    puzzle: str = Field(primary_key=True)
+    # created_at of the oldest solution whose windows weren't checked for a new PB yet
+    since: datetime = Field(...)
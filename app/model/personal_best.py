@@ -1,15 +1,19 @@
 from datetime import datetime
 from uuid import UUID
 from sqlmodel import Relationship, SQLModel, Field
-from sqlalchemy import text
+from sqlalchemy import Index, text
 
 class PersonalBest(SQLModel, table = True):
     __tablename__ = 'personal_bests'
+    __table_args__ = (
+        Index('ix_personal_bests_user_id_puzzle_created_at', 'user_id', 'puzzle', 'created_at'),
+    )
 
     id: UUID = Field(default=text('uuid_generate_v4()'), primary_key=True)
+    user_id: UUID = Field(foreign_key='users.id')
     time: float = Field(...)
     puzzle: str = Field(...)
     avg_of: int = Field(...)
     created_at: datetime = Field(default=text('NOW()'), nullable=False)
 
-    personal_bests: list["SolutionPersonalBest"] = Relationship(back_populates="personal_best", passive_deletes=True) # type: ignore
\ No newline at end of file
+    personal_bests: list["SolutionPersonalBest"] = Relationship(back_populates="personal_best", passive_deletes=True) # type: ignore
@@ -0,0 +1,34 @@
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+
+class PracticeSession(SQLModel, table = True):
+    __tablename__ = 'practice_sessions'
+    __table_args__ = (
+        Index('ix_practice_sessions_user_id_puzzle_created_at', 'user_id', 'puzzle', 'created_at'),
+        # at most one active session per puzzle, concurrent first solves would start one each otherwise
+        Index('ux_practice_sessions_active', 'user_id', 'puzzle', unique=True, postgresql_where=text('is_active')),
+    )
+
+    id: UUID = Field(default=text('uuid_generate_v4()'), primary_key=True)
+    user_id: UUID = Field(foreign_key='users.id')
+    puzzle: str = Field(...)
+    name: str = Field(...)
+    is_active: bool = Field(default=True)
+    created_at: datetime = Field(default=text('NOW()'), nullable=False)
+    closed_at: datetime | None = Field(default=None)
+    # aggregates maintained by the write path of SolutionService
+    solve_count: int = Field(default=0)
+    dnf_count: int = Field(default=0)
+    time_sum: float = Field(default=0)
+    best_single: float | None = Field(default=None)
+    best_avg_five: float | None = Field(default=None)
+    best_avg_twelve: float | None = Field(default=None)
+
+    @property
+    def mean(self) -> float | None:
+        finished_count = self.solve_count - self.dnf_count
+        if finished_count == 0:
+            return None
+        return self.time_sum / finished_count
@@ -0,0 +1,49 @@
+import math
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel, Field
+from sqlalchemy import text
+
+class PuzzleSummary(SQLModel, table = True):
+    __tablename__ = 'puzzle_summary'
+
+    user_id: UUID = Field(foreign_key='users.id', primary_key=True)
+    puzzle: str = Field(primary_key=True)
+    solve_count: int = Field(default=0)
+    dnf_count: int = Field(default=0)
+    # sums over finished (non DNF) solves, enough for mean and standard deviation
+    time_sum: float = Field(default=0)
+    time_sum_sq: float = Field(default=0)
+    best_single: float | None = Field(default=None)
+    # latest values, the same ones get_current_averages computes
+    single: float | None = Field(default=None)
+    single_id: UUID | None = Field(default=None)
+    avg_five: float | None = Field(default=None)
+    avg_five_window_start_id: UUID | None = Field(default=None)
+    avg_twelve: float | None = Field(default=None)
+    avg_twelve_window_start_id: UUID | None = Field(default=None)
+    mean_hundred: float | None = Field(default=None)
+    mean_hundred_window_start_id: UUID | None = Field(default=None)
+    updated_at: datetime = Field(default=text('NOW()'), nullable=False)
+    # bumped by every change of the puzzle and by every change of its personal bests, they never
+    # go back (see SummaryService.rebuild), see InvalidationService
+    version: int = Field(default=0)
+    pb_version: int = Field(default=0)
+
+    @property
+    def finished_count(self) -> int:
+        return self.solve_count - self.dnf_count
+
+    @property
+    def mean(self) -> float | None:
+        if self.finished_count == 0:
+            return None
+        return self.time_sum / self.finished_count
+
+    @property
+    def standard_deviation(self) -> float | None:
+        if self.finished_count < 2:
+            return None
+
+        variance = (self.time_sum_sq - self.time_sum ** 2 / self.finished_count) / (self.finished_count - 1)
+        return math.sqrt(max(variance, 0))
@@ -1,20 +1,39 @@
 from uuid import UUID
 from sqlmodel import Relationship, SQLModel, Field
-from sqlalchemy import text
+from sqlalchemy import BigInteger, DateTime, Index, desc, text
 from datetime import datetime
 
 class Solution(SQLModel, table = True):
     __tablename__ = 'solutions'
+    __table_args__ = (
+        Index('ix_solutions_user_id_puzzle_created_at', 'user_id', 'puzzle', 'created_at'),
+        Index('ix_solutions_session_id_created_at', 'session_id', 'created_at'),
+        Index('ux_solutions_user_id_client_key', 'user_id', 'client_key', unique=True),
+        Index('ix_solutions_scramble_hash', 'scramble_hash'),
+    )
 
     id: UUID = Field(default=text('uuid_generate_v4()'), primary_key=True)
+    user_id: UUID = Field(foreign_key='users.id')
+    session_id: UUID | None = Field(default=None, foreign_key='practice_sessions.id')
     time: float = Field(...)
     penalty: bool = Field(default=False)
     dnf: bool = Field(default=False)
     puzzle: str = Field(...)
-    scramble: str = Field(...)
-    created_at: datetime = Field(default=text('NOW()'))
+    # one byte per move, see ScrambleService.encode
+    scramble: bytes = Field(...)
+    scramble_hash: int = Field(sa_type=BigInteger)
+    # timestamptz, solve times sent by offline clients are instants, whatever the session time zone
+    created_at: datetime = Field(default=text('NOW()'), sa_type=DateTime(timezone=True))
+    # idempotency key generated by an offline client, replays of the same key are ignored
+    client_key: UUID | None = Field(default=None)
 
     solutions: list["SolutionPersonalBest"] = Relationship(back_populates="solution", passive_deletes=True) # type: ignore
 
     class Config:
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+
+
+# the order of every list, window and cursor of solutions, a batch can store several solutions with the
+# same created_at and the id keeps them in one order everywhere (ArchiveService sorts the archive the same way)
+NEWEST_FIRST = (desc(Solution.created_at), desc(Solution.id))
+OLDEST_FIRST = (Solution.created_at, Solution.id)
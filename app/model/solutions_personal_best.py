@@ -11,6 +11,7 @@ class SolutionPersonalBest(SQLModel, table = True):
 
     id: UUID = Field(default=text('uuid_generate_v4()'), primary_key=True)
     created_at: datetime = Field(default=text('NOW()'), nullable=False)
+    user_id: UUID = Field(foreign_key='users.id', index=True)
     solution_id: UUID = Field(foreign_key='solutions.id')
     personal_best_id: UUID = Field(foreign_key='personal_bests.id')
 
@@ -0,0 +1,13 @@
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel, Field
+from sqlalchemy import text
+
+class TimeDistribution(SQLModel, table = True):
+    __tablename__ = 'time_distributions'
+
+    user_id: UUID = Field(foreign_key='users.id', primary_key=True)
+    puzzle: str = Field(primary_key=True)
+    # serialized TimeSketch, a few hundred bytes per puzzle and about 2 KB at most
+    data: bytes = Field(...)
+    updated_at: datetime = Field(default=text('NOW()'), nullable=False)
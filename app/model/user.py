@@ -0,0 +1,12 @@
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel, Field
+from sqlalchemy import text
+
+class User(SQLModel, table = True):
+    __tablename__ = 'users'
+
+    id: UUID = Field(default=text('uuid_generate_v4()'), primary_key=True)
+    name: str = Field(..., unique=True)
+    password_hash: str = Field(...)
+    created_at: datetime = Field(default=text('NOW()'), nullable=False)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header
 from app.controller.pages_controller import PagesController
-from app.db.database import get_db
+from app.db.read_routing import get_read_db
+from app.services.user_service import get_optional_user_id
+from app.services.version_service import get_versioned_read_db
 
 
 router = APIRouter()
 
 
 @router.get('/')
-async def read_root(db = Depends(get_db)):
-    return PagesController.serve_index_file(db)
+async def read_root(user_id: UUID | None = Depends(get_optional_user_id), if_none_match: str | None = Header(None), db = Depends(get_versioned_read_db)):
+    if user_id is None:
+        return PagesController.serve_login_file()
+    return PagesController.serve_index_file(user_id, db, if_none_match)
 
 @router.get("/{puzzle}")
-async def serve_file(puzzle: str, db = Depends(get_db)):
-    return PagesController.serve_cubing_file(puzzle, db)
+async def serve_file(puzzle: str, user_id: UUID | None = Depends(get_optional_user_id), db = Depends(get_read_db)):
+    if user_id is None:
+        return PagesController.serve_login_file()
+    return PagesController.serve_cubing_file(puzzle, user_id, db)
@@ -0,0 +1,21 @@
+from uuid import UUID
+from fastapi import APIRouter, Depends, Form, Query
+from sqlmodel import Session
+
+from app.controller.sessions_controller import SessionsController
+from app.db.database import get_db
+from app.services.user_service import get_user_id
+
+router = APIRouter()
+
+@router.get('/sessions')
+async def get_session(puzzle: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SessionsController.get_session_view(puzzle, user_id, db)
+
+@router.post('/sessions')
+async def create_session(puzzle: str = Query(...), name: str | None = Form(None), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SessionsController.create_session(puzzle, name, user_id, db)
+
+@router.patch('/sessions')
+async def update_session(id: str = Form(...), action: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SessionsController.update_session(id, action, user_id, db)
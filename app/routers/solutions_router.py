@@ -1,36 +1,58 @@
-from fastapi import APIRouter, Depends, Form, Query
+from typing import List
+from uuid import UUID
+from fastapi import APIRouter, Body, Depends, Form, Header, Query, Request
 from sqlmodel import Session
 
 from app.controller.solutions_controller import SolutionsController
 from app.db.database import get_db
+from app.db.read_routing import get_read_db
 from app.services.solution_service import SolutionService
+from app.services.user_service import get_user_id
+from app.services.version_service import get_versioned_read_db
+from app.types.batch import BatchSolution
 
 router = APIRouter()
 
 @router.get('/solutions')
-async def get_solutions(puzzle: str = Query(...), cursor: str | None = Query(None), limit: int = Query(20), db: Session = Depends(get_db)):
-    return SolutionsController.get_solutions_view(puzzle, db, cursor, limit)
+async def get_solutions(puzzle: str = Query(...), cursor: str | None = Query(None), limit: int = Query(20), user_id: UUID = Depends(get_user_id), if_none_match: str | None = Header(None), db: Session = Depends(get_versioned_read_db)):
+    return SolutionsController.get_solutions_view(puzzle, user_id, db, cursor, limit, if_none_match)
 
 @router.post('/solutions')
-async def create_solution(solution_time: str = Form(...), puzzle: str = Query(...), scramble: str = Form(...), db: Session = Depends(get_db)):
-    return SolutionsController.create_solution(solution_time, puzzle, scramble, db)
+async def create_solution(solution_time: str = Form(...), puzzle: str = Query(...), scramble: str = Form(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionsController.create_solution(solution_time, puzzle, scramble, user_id, db)
+
+@router.post('/solutions/batch')
+async def create_solutions(solutions: List[BatchSolution] = Body(...), puzzle: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionsController.create_solutions(solutions, puzzle, user_id, db)
 
 @router.patch('/solutions')
-async def update_solution(id: str = Query(...), action: str = Query(...), db: Session = Depends(get_db)):
-    return SolutionsController.update_solution(id, action, db)
+async def update_solution(id: str = Query(...), action: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionsController.update_solution(id, action, user_id, db)
 
 @router.delete('/solutions')
-async def delete_solution(id: str = Query(...), db: Session = Depends(get_db)):
-    return SolutionService.delete_solution(id, db)
+async def delete_solution(id: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionService.delete_solution(id, user_id, db)
 
 @router.get('/solutions/current')
-async def get_current_solutions(puzzle: str = Query(...), db: Session = Depends(get_db)):
-    return SolutionsController.get_current_averages_view(puzzle, db)
+async def get_current_solutions(puzzle: str = Query(...), user_id: UUID = Depends(get_user_id), if_none_match: str | None = Header(None), db: Session = Depends(get_versioned_read_db)):
+    return SolutionsController.get_current_averages_view(puzzle, user_id, db, if_none_match)
 
 @router.get('/solutions/best')
-async def get_best_solutions(puzzle: str = Query(...), db: Session = Depends(get_db)):
-    return SolutionsController.get_personal_best_view(puzzle, db)
+async def get_best_solutions(puzzle: str = Query(...), user_id: UUID = Depends(get_user_id), if_none_match: str | None = Header(None), db: Session = Depends(get_versioned_read_db)):
+    return SolutionsController.get_personal_best_view(puzzle, user_id, db, if_none_match)
+
+@router.get('/solutions/history')
+async def get_history(puzzle: str = Query(...), metric: str = Query('single'), points: int = Query(500), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionsController.get_history(puzzle, metric, points, user_id, db)
+
+@router.get('/solutions/distribution')
+async def get_distribution(puzzle: str = Query(...), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_db)):
+    return SolutionsController.get_distribution_view(puzzle, user_id, db)
+
+@router.get('/solutions/events')
+async def get_events(request: Request, puzzle: str = Query(...), user_id: UUID = Depends(get_user_id)):
+    return SolutionsController.get_events(puzzle, user_id, request)
 
 @router.get('/solutions/details')
-async def get_solution_details(id: str = Query(...), puzzle: str | None = Query(None), db: Session = Depends(get_db)):
-    return SolutionsController.get_solution_details_view(id, db, puzzle)
\ No newline at end of file
+async def get_solution_details(id: str = Query(...), puzzle: str | None = Query(None), user_id: UUID = Depends(get_user_id), db: Session = Depends(get_read_db)):
+    return SolutionsController.get_solution_details_view(id, user_id, db, puzzle)
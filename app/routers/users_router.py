@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Form
+from sqlmodel import Session
+
+from app.controller.users_controller import UsersController
+from app.db.database import get_db
+
+router = APIRouter()
+
+@router.post('/users/register')
+async def register(name: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+    return UsersController.register(name, password, db)
+
+@router.post('/users/login')
+async def login(name: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+    return UsersController.login(name, password, db)
+
+@router.post('/users/logout')
+async def logout():
+    return UsersController.logout()
@@ -0,0 +1,60 @@
+"""
+Moves old solutions out of the solutions table into the columnar archive, see ArchiveService.
+
+Usage:
+    python -m app.scripts.archive_solutions [--older-than 120] [--user <name>]
+
+Meant to run periodically (e.g. nightly), every user and puzzle is moved in its own transaction.
+The archived solutions disappear from the lists, so the workers are notified like after any other change.
+"""
+import argparse, sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+
+from app.constants import SOLUTIONS_ARCHIVE_AFTER_DAYS
+from app.db.database import SessionLocal
+from app.model.solution import Solution
+from app.services.archive_service import ArchiveService
+from app.services.invalidation_service import InvalidationService
+from app.services.user_service import UserService
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(description='Move old solutions into the columnar archive.')
+    parser.add_argument('--older-than', type=float, default=SOLUTIONS_ARCHIVE_AFTER_DAYS, help='age in days')
+    parser.add_argument('--user', help='only archive the solutions of this user')
+    args = parser.parse_args(argv)
+
+    before = datetime.now(timezone.utc) - timedelta(days=args.older_than)
+
+    db = SessionLocal()
+    try:
+        statement = select(Solution.user_id, Solution.puzzle).where(Solution.created_at < before).distinct()
+
+        if args.user is not None:
+            user = UserService.get_user_by_name(args.user, db)
+            if user is None:
+                print(f'User {args.user} not found')
+                return 1
+            statement = statement.where(Solution.user_id == user.id)
+
+        candidates = db.execute(statement).all()
+        db.rollback()
+
+        total = 0
+        for user_id, puzzle in candidates:
+            archived = ArchiveService.archive(puzzle, user_id, before, db)
+            if archived > 0:
+                # after the commit of the archive, ArchiveService is a dependency of InvalidationService (through the history)
+                InvalidationService.publish(puzzle, user_id, db)
+                db.commit()
+            total += archived
+
+        print(f'Archived {total} solutions of {len(candidates)} puzzles')
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""
+Micro-benchmark of the scalar and batch time formatting and parsing on 1M values.
+
+Usage:
+    python -m app.scripts.bench_timestr [count]
+"""
+import sys, time
+import numpy as np
+
+from app.utils import float_to_timestr, floats_to_timestrs, timestr_to_float, timestrs_to_floats
+
+
+def measure(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f'{label:<28}{time.perf_counter() - start:8.3f}s')
+    return result
+
+
+def main(argv: list[str]):
+    count = int(argv[0]) if len(argv) > 0 else 1_000_000
+    rng = np.random.default_rng(0)
+    # typed in times have up to 3 decimals, which puts plenty of them right on a rounding tie
+    values = np.round(rng.uniform(1, 3600, count), 3)
+
+    scalar = measure('float_to_timestr', lambda: [float_to_timestr(v) for v in values.tolist()])
+    batch = measure('floats_to_timestrs', lambda: floats_to_timestrs(values))
+
+    if scalar != batch.tolist():
+        print('floats_to_timestrs output differs from float_to_timestr')
+        return 1
+
+    time_strs = [f'{int(v // 60)}:{v % 60:06.3f}' if v >= 60 else f'{v:.3f}' for v in values.tolist()]
+    parsed_scalar = measure('timestr_to_float', lambda: [timestr_to_float(s) for s in time_strs])
+    parsed_batch = measure('timestrs_to_floats', lambda: timestrs_to_floats(time_strs))
+
+    if not np.array_equal(np.array(parsed_scalar, dtype=np.float64), parsed_batch, equal_nan=True):
+        print('timestrs_to_floats output differs from timestr_to_float')
+        return 1
+
+    print(f'{count} values, identical output')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
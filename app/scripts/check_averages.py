@@ -0,0 +1,67 @@
+"""
+Cross-checks the two averaging engines (see AVERAGES_ENGINE): computes the latest single, ao5, ao12
+and mo100 of every puzzle with both and reports every difference and the time each engine took.
+
+Usage:
+    python -m app.scripts.check_averages            # every user
+    python -m app.scripts.check_averages <name>     # a single user
+
+Exits with 1 if the engines disagree.
+"""
+import math, sys, time
+from sqlalchemy import select
+
+from app.constants import PUZZLES
+from app.db.database import SessionLocal
+from app.model.user import User
+from app.services.averages_service import AveragesService
+from app.services.user_service import UserService
+
+
+def main(argv: list[str]):
+    db = SessionLocal()
+    try:
+        if len(argv) > 0:
+            user = UserService.get_user_by_name(argv[0], db)
+            if user is None:
+                print(f'User {argv[0]} not found')
+                return 1
+            user_ids = [user.id]
+        else:
+            user_ids = db.execute(select(User.id)).scalars().all()
+
+        timings = {'python': 0.0, 'sql': 0.0}
+        mismatches = 0
+
+        for user_id in user_ids:
+            results = {}
+            for engine in timings:
+                start = time.perf_counter()
+                results[engine] = AveragesService.get_latest(PUZZLES, user_id, db, engine)
+                timings[engine] += time.perf_counter() - start
+
+            for puzzle in PUZZLES:
+                for key, expected in results['python'][puzzle].items():
+                    actual = results['sql'][puzzle][key]
+
+                    same_time = (
+                        expected['time'] is None and actual['time'] is None
+                        or expected['time'] is not None and actual['time'] is not None
+                        # the sum is added up in a different order, only the last bits may differ
+                        and math.isclose(expected['time'], actual['time'], rel_tol=1e-9)
+                    )
+                    if not same_time or expected['window_start_id'] != actual['window_start_id']:
+                        mismatches += 1
+                        print(f'{user_id} {puzzle} {key}: python {expected} != sql {actual}')
+
+            db.rollback()
+
+        print(f'Checked {len(user_ids)} users, python {timings["python"]:.3f}s, sql {timings["sql"]:.3f}s')
+        print(f'{mismatches} mismatches')
+        return 1 if mismatches > 0 else 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Migrates the solutions table from text scrambles to packed ones (see ScrambleService.encode):
+the text column is renamed to scramble_text, the packed scramble and its hash are filled in batches,
+then the text column is dropped and scramble_hash gets its index. Rows whose text can't be parsed
+are listed and the text column is kept, so nothing is lost. It can be run again after fixing them.
+
+Usage:
+    python -m app.scripts.encode_scrambles
+"""
+import sys
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.services.scramble_service import ScrambleService
+
+BATCH_SIZE = 5000
+
+
+def main():
+    with engine.begin() as connection:
+        columns = dict(connection.execute(text(
+            "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'solutions'"
+        )).all())
+
+        if 'scramble_text' not in columns:
+            if columns['scramble'] == 'bytea':
+                print('Scrambles are already packed')
+                return 0
+
+            connection.execute(text('ALTER TABLE solutions RENAME COLUMN scramble TO scramble_text'))
+            connection.execute(text('ALTER TABLE solutions ADD COLUMN scramble bytea, ADD COLUMN scramble_hash bigint'))
+
+    select = text(
+        'SELECT id, scramble_text FROM solutions WHERE scramble IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+    )
+    update = text('UPDATE solutions SET scramble = :scramble, scramble_hash = :scramble_hash WHERE id = :id')
+
+    converted, failed, last_id = 0, [], '00000000-0000-0000-0000-000000000000'
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(select, {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+
+            if len(rows) == 0:
+                break
+
+            params = []
+            for id, scramble_text in rows:
+                try:
+                    packed = ScrambleService.encode(ScrambleService.parse(scramble_text))
+                except ValueError:
+                    failed.append(id)
+                    continue
+                params.append({'id': id, 'scramble': packed, 'scramble_hash': ScrambleService.hash(packed)})
+
+            if len(params) > 0:
+                connection.execute(update, params)
+
+            converted += len(params)
+            last_id = rows[-1].id
+
+    print(f'Packed {converted} scrambles')
+
+    if len(failed) > 0:
+        print(f'{len(failed)} scrambles could not be parsed, scramble_text is kept:')
+        for id in failed:
+            print(f'    {id}')
+        return 1
+
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE solutions ALTER COLUMN scramble SET NOT NULL, ALTER COLUMN scramble_hash SET NOT NULL'))
+        connection.execute(text('ALTER TABLE solutions DROP COLUMN scramble_text'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_solutions_scramble_hash ON solutions (scramble_hash)'))
+
+    print('Dropped scramble_text')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Load generator simulating many members timing at once against a running app and database.
+
+Every virtual user registers, opens the page of a puzzle and fetches a scramble, then keeps
+submitting a solve every 10-60s (scaled by --think-scale), now and then gives one a +2 or deletes
+it and pages through the list with "Show More". After each concurrency level the throughput,
+the p50/p95/p99 latency and the error rate of every route are printed.
+
+Usage:
+    python -m app.scripts.load_test [--users 50,100,200] [--duration 60] [--think-scale 1.0]
+                                    [--base-url http://127.0.0.1:8000] [--puzzle 3x3x3]
+                                    [--start [--workers 4]]
+
+With --start the app is started with uvicorn on the port of --base-url and stopped afterwards,
+otherwise it has to be running already (e.g. `uvicorn main:app --workers 4`).
+"""
+import argparse, asyncio, math, os, random, re, secrets, subprocess, sys, time, uuid
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+import httpx
+
+SCRAMBLE_PATTERN = re.compile(r'name="scramble" value="([^"]*)"')
+SOLUTION_ID_PATTERN = re.compile(r'/solutions\?id=([0-9a-f-]{36})')
+# mean and spread of the simulated times in seconds
+SOLVE_TIMES = {
+    '2x2x2': (5, 1.5), '3x3x3': (15, 3), '4x4x4': (50, 8), '5x5x5': (95, 12),
+    '6x6x6': (170, 20), '7x7x7': (250, 25), '8x8x8': (400, 40), '9x9x9': (550, 50)
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[route].append(time.perf_counter() - start)
+            self.errors[route] += 1
+            return None
+
+        self.latencies[route].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+            return None
+
+        return response
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if len(sorted_values) == 0:
+        return math.nan
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+async def simulate_user(base_url: str, puzzle: str, deadline: float, think_scale: float, recorder: Recorder):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        name = f'load-{uuid.uuid4().hex[:12]}'
+        response = await recorder.request(client, 'POST /users/register', 'POST', '/users/register', data={'name': name, 'password': name})
+        if response is None:
+            return
+
+        await recorder.request(client, 'GET /{puzzle}', 'GET', f'/{puzzle}')
+
+        response = await recorder.request(client, 'GET /scramble', 'GET', '/scramble', params={'puzzle': puzzle})
+        scramble = SCRAMBLE_PATTERN.search(response.text).group(1) if response is not None else ''
+
+        solution_ids: List[str] = []
+        mean, spread = SOLVE_TIMES.get(puzzle, (30, 5))
+
+        while True:
+            await asyncio.sleep(random.uniform(10, 60) * think_scale)
+            if time.monotonic() >= deadline:
+                return
+
+            solve_time = max(0.5, random.gauss(mean, spread))
+            response = await recorder.request(
+                client, 'POST /solutions', 'POST', '/solutions',
+                params={'puzzle': puzzle}, data={'solution_time': f'{solve_time:.2f}', 'scramble': scramble}
+            )
+            if response is None:
+                continue
+
+            match = SOLUTION_ID_PATTERN.search(response.text)
+            if match is not None:
+                solution_ids.append(match.group(1))
+
+            match = SCRAMBLE_PATTERN.search(response.text)
+            if match is not None:
+                scramble = match.group(1)
+
+            roll = random.random()
+            if roll < 0.05 and len(solution_ids) > 0:
+                await recorder.request(client, 'DELETE /solutions', 'DELETE', '/solutions', params={'id': solution_ids.pop()})
+            elif roll < 0.15 and len(solution_ids) > 0:
+                await recorder.request(client, 'PATCH /solutions', 'PATCH', '/solutions', params={'id': solution_ids[-1], 'action': 'penalty'})
+            elif roll < 0.25 and len(solution_ids) > 0:
+                await recorder.request(client, 'GET /solutions (show more)', 'GET', '/solutions', params={'puzzle': puzzle, 'cursor': solution_ids[0]})
+
+
+async def run_level(users: int, args: argparse.Namespace) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+
+    async def delayed_user(delay: float):
+        await asyncio.sleep(delay)
+        await simulate_user(args.base_url, args.puzzle, deadline, args.think_scale, recorder)
+
+    # spread the arrivals over the first tenth of the run instead of a thundering herd
+    ramp = args.duration / 10
+    await asyncio.gather(*(delayed_user(ramp * i / users) for i in range(users)))
+
+    return recorder, time.monotonic() - start
+
+
+def report(users: int, recorder: Recorder, elapsed: float):
+    print(f'\n{users} users, {elapsed:.1f}s')
+    print(f'{"route":<28}{"requests":>9}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>9}')
+
+    for route in sorted(recorder.latencies):
+        latencies = sorted(recorder.latencies[route])
+        count = len(latencies)
+        error_rate = recorder.errors[route] / count if count > 0 else 0
+        print(
+            f'{route:<28}{count:>9}{count / elapsed:>9.1f}'
+            f'{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}'
+            f'{error_rate:>8.1%}'
+        )
+
+
+def start_server(base_url: str, workers: int) -> subprocess.Popen:
+    url = urlparse(base_url)
+    # the workers have to sign the session cookies with the same key
+    env = {**os.environ, 'SESSION_SECRET': os.getenv('SESSION_SECRET') or secrets.token_hex(32)}
+    server = subprocess.Popen([
+        sys.executable, '-m', 'uvicorn', 'main:app',
+        '--host', url.hostname, '--port', str(url.port or 80), '--workers', str(workers), '--log-level', 'warning'
+    ], env=env)
+
+    for _ in range(100):
+        try:
+            httpx.get(f'{base_url}/', timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f'The app did not start on {base_url}')
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(description='Simulate many live timers against the app.')
+    parser.add_argument('--users', default='50,100,200', help='comma separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=60, help='seconds per concurrency level')
+    parser.add_argument('--think-scale', type=float, default=1.0, help='factor applied to the 10-60s between solves')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--puzzle', default='3x3x3')
+    parser.add_argument('--start', action='store_true', help='start the app with uvicorn for the run')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers when using --start')
+    args = parser.parse_args(argv)
+
+    server = start_server(args.base_url, args.workers) if args.start else None
+    try:
+        failed = False
+        for users in [int(level) for level in args.users.split(',')]:
+            recorder, elapsed = asyncio.run(run_level(users, args))
+            report(users, recorder, elapsed)
+            failed |= any(count > 0 for count in recorder.errors.values())
+
+        return 1 if failed else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
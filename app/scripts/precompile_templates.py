@@ -0,0 +1,20 @@
+"""
+Compiles every template into the bytecode cache, meant to run once per deploy before the workers start.
+
+Usage:
+    python -m app.scripts.precompile_templates
+"""
+import sys
+
+from app.constants import TEMPLATE_CACHE_DIR
+from app.startup import precompile_templates
+
+
+def main():
+    count = precompile_templates()
+    print(f'Compiled {count} templates into {TEMPLATE_CACHE_DIR}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
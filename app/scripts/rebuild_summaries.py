@@ -0,0 +1,38 @@
+"""
+Regenerates the puzzle_summary and time_distributions tables from the solutions table.
+
+Usage:
+    python -m app.scripts.rebuild_summaries            # every user
+    python -m app.scripts.rebuild_summaries <name>     # a single user
+"""
+import sys
+
+from app.db.database import SessionLocal
+from app.services.distribution_service import DistributionService
+from app.services.summary_service import SummaryService
+from app.services.user_service import UserService
+
+
+def main(argv: list[str]):
+    db = SessionLocal()
+    try:
+        user_id = None
+        if len(argv) > 0:
+            user = UserService.get_user_by_name(argv[0], db)
+            if user is None:
+                print(f'User {argv[0]} not found')
+                return 1
+            user_id = user.id
+
+        count = SummaryService.rebuild(db, user_id)
+        print(f'Rebuilt {count} puzzle summaries')
+
+        count = DistributionService.rebuild(db, user_id)
+        print(f'Rebuilt {count} time distributions')
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""
+Measures the cold start of a worker and fails if it's over budget: importing the app,
+the warm-up and the first requests of the login page and a scramble afterwards.
+NumPy must not be imported by the app import itself.
+
+Usage:
+    python -m app.scripts.startup_budget
+
+Also run by tests/test_startup.py.
+"""
+import sys, time
+
+
+def measure(label: str, budget: float, fn):
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+
+    ok = seconds <= budget
+    print(f'{label:<28}{seconds:8.3f}s  (budget {budget:.3f}s) {"ok" if ok else "OVER BUDGET"}')
+    return ok
+
+
+def main():
+    start = time.perf_counter()
+    import main as app_module
+    import_seconds = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+    from app.constants import STARTUP_FIRST_REQUEST_BUDGET, STARTUP_IMPORT_BUDGET, STARTUP_WARM_UP_BUDGET
+    from app.startup import warm_up
+
+    ok = import_seconds <= STARTUP_IMPORT_BUDGET
+    print(f'{"import main":<28}{import_seconds:8.3f}s  (budget {STARTUP_IMPORT_BUDGET:.3f}s) {"ok" if ok else "OVER BUDGET"}')
+
+    if 'numpy' in sys.modules:
+        print('numpy was imported by the app import')
+        ok = False
+
+    ok &= measure('warm-up', STARTUP_WARM_UP_BUDGET, warm_up)
+
+    # no lifespan here, the warm-up above already ran and the database may not be reachable
+    client = TestClient(app_module.app)
+
+    def request(url: str):
+        response = client.get(url)
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+
+    ok &= measure('first GET /', STARTUP_FIRST_REQUEST_BUDGET, lambda: request('/'))
+    ok &= measure('first GET /scramble', STARTUP_FIRST_REQUEST_BUDGET, lambda: request('/scramble?puzzle=3x3x3'))
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
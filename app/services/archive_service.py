@@ -0,0 +1,385 @@
+from __future__ import annotations
+import os, shutil
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from uuid import UUID
+from sqlalchemy import delete, exists, select
+from sqlmodel import Session
+
+from app.constants import SOLUTIONS_ARCHIVE_DIR, SOLUTIONS_ARCHIVE_KEEP_GENERATIONS, SOLUTIONS_ARCHIVE_KEEP_LATEST
+from app.lazy_import import LazyModule
+from app.model.puzzle_summary import PuzzleSummary
+from app.model.solution import NEWEST_FIRST, OLDEST_FIRST, Solution
+from app.model.solutions_personal_best import SolutionPersonalBest
+
+np = LazyModule('numpy')
+
+# column name -> dtype, uuids are stored as their 16 raw bytes (all zero for None)
+_COLUMNS = {
+    'id': 'S16',
+    'time': 'float64',
+    'created_at': 'float64',     # unix timestamp
+    'penalty': 'bool',
+    'dnf': 'bool',
+    'session_id': 'S16',
+    'client_key': 'S16',
+    # the packed scrambles back to back, scramble i is scrambles[scramble_offsets[i]:scramble_offsets[i + 1]]
+    'scramble_offsets': 'int64',
+    'scrambles': 'uint8'
+}
+
+
+class SolutionArchive:
+    """
+    The archived solutions of one user and puzzle, every column a memory-mapped array sorted by created_at and id.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in _COLUMNS
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns['time'])
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class SolutionColumns:
+    """
+    Times, unix timestamps and DNF flags of solutions in chronological order.
+    """
+    def __init__(self, times: np.ndarray, timestamps: np.ndarray, dnf: np.ndarray):
+        self.times = times
+        self.timestamps = timestamps
+        self.dnf = dnf
+
+
+class ArchiveService:
+    """
+    Moves old solutions out of the solutions table into one directory of `.npy` files per user and
+    puzzle. They are only read for statistics, so the reads below union the archive with the live
+    rows and everything else (lists, edits, PB details) only ever sees the live rows.
+
+    Every archive run writes a new generation directory and publishes it with an atomic rename
+    before the rows are deleted, the previous generation stays for the readers still using it. A run that fails in between leaves a solution in both places,
+    which is why the history and the rebuilds drop archived solutions that are still live. The
+    best single doesn't have to, a minimum is the same with or without the duplicates.
+    """
+    @classmethod
+    def load(cls, puzzle: str, user_id: UUID) -> SolutionArchive | None:
+        """
+        Memory-map the current generation of an archive, None if nothing was archived yet.
+        """
+        generation = cls._current_generation(cls._directory(puzzle, user_id))
+        if generation is None:
+            return None
+
+        return SolutionArchive(generation)
+
+    @classmethod
+    def get_columns(cls, puzzle: str, user_id: UUID, db: Session, session_id: UUID | None = None) -> SolutionColumns:
+        """
+        Retrieve the full history of a puzzle, live and archived solutions together.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying the live solutions.
+            session_id (UUID | None): Only the solutions of this session, defaults to all solutions.
+
+        Returns:
+            SolutionColumns: The solutions in chronological order.
+        """
+        statement = (
+            select(Solution.id, Solution.time, Solution.created_at, Solution.dnf)
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle)
+            .order_by(*OLDEST_FIRST)
+        )
+        if session_id is not None:
+            statement = statement.where(Solution.session_id == session_id)
+        rows = db.execute(statement).all()
+
+        live = SolutionColumns(
+            np.fromiter((row.time for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((row.created_at.timestamp() for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((row.dnf for row in rows), dtype=np.bool_, count=len(rows))
+        )
+
+        archive = cls.load(puzzle, user_id)
+        if archive is None:
+            return live
+
+        # the session first, usually none of its solutions are archived and the ids aren't compared at all
+        mask = archive.session_id == session_id.bytes if session_id is not None else np.ones(len(archive), dtype=np.bool_)
+        live_ids = np.array([row.id.bytes for row in rows], dtype='S16')
+        if mask.any():
+            mask &= ~np.isin(archive.id, live_ids)
+
+        if not mask.any():
+            return live
+
+        timestamps = np.concatenate([archive.created_at[mask], live.timestamps])
+        order = cls._chronological(np.concatenate([archive.id[mask], live_ids]), timestamps)
+
+        return SolutionColumns(
+            np.concatenate([archive.time[mask], live.times])[order],
+            timestamps[order],
+            np.concatenate([archive.dnf[mask], live.dnf])[order]
+        )
+
+    @classmethod
+    def get_finished_times(cls, puzzle: str, user_id: UUID, db: Session) -> np.ndarray:
+        """
+        Retrieve the archived times of finished solves that aren't live anymore, for the rebuilds,
+        which read the live rows themselves.
+        """
+        archive = cls.load(puzzle, user_id)
+        if archive is None:
+            return np.empty(0, dtype=np.float64)
+
+        mask = ~archive.dnf & cls._not_live(archive, puzzle, user_id, db)
+        return np.array(archive.time[mask])
+
+    @classmethod
+    def get_best_single(cls, puzzle: str, user_id: UUID) -> float | None:
+        """
+        The best archived time of a finished solve, None if there is none. Doesn't query the live rows,
+        a solution left in both places by a failed run has the same time in both.
+        """
+        archive = cls.load(puzzle, user_id)
+        if archive is None:
+            return None
+
+        times = archive.time[~archive.dnf]
+        return float(times.min()) if len(times) > 0 else None
+
+    @classmethod
+    def get_counts(cls, puzzle: str, user_id: UUID, db: Session) -> Tuple[int, int]:
+        """
+        Returns:
+            Tuple[int, int]: The number of archived solves that aren't live anymore and how many of them are DNFs.
+        """
+        archive = cls.load(puzzle, user_id)
+        if archive is None:
+            return 0, 0
+
+        mask = cls._not_live(archive, puzzle, user_id, db)
+        return int(mask.sum()), int(archive.dnf[mask].sum())
+
+    @classmethod
+    def iter_archives(cls, user_id: UUID | None = None) -> Iterator[Tuple[UUID, str]]:
+        """
+        Yields the user and puzzle of every archive, used by the rebuilds.
+        """
+        users = [str(user_id)] if user_id is not None else cls._listdir(SOLUTIONS_ARCHIVE_DIR)
+
+        for user in users:
+            for puzzle in cls._listdir(os.path.join(SOLUTIONS_ARCHIVE_DIR, user)):
+                if cls.load(puzzle, UUID(user)) is not None:
+                    yield UUID(user), puzzle
+
+    @classmethod
+    def archive(cls, puzzle: str, user_id: UUID, before: datetime, db: Session) -> int:
+        """
+        Move the solutions of a puzzle created before a point in time into the archive and commit.
+        The newest SOLUTIONS_ARCHIVE_KEEP_LATEST solutions always stay, so the current averages and
+        the PB windows are computed from live rows only, and so do solutions that are part of a PB,
+        they stay until a better PB replaces them.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            before (datetime): Only solutions created before this are archived.
+            db (Session): The database session to use.
+
+        Returns:
+            int: The number of archived solutions.
+        """
+        # the summary row lock makes solutions of the puzzle wait, so none of the rows changes meanwhile
+        statement = (
+            select(PuzzleSummary)
+            .where(PuzzleSummary.user_id == user_id, PuzzleSummary.puzzle == puzzle)
+            .with_for_update()
+        )
+        db.execute(statement)
+
+        newest = (
+            select(Solution.created_at)
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle)
+            .order_by(*NEWEST_FIRST)
+            .offset(SOLUTIONS_ARCHIVE_KEEP_LATEST - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        statement = (
+            select(Solution)
+            .where(
+                Solution.user_id == user_id,
+                Solution.puzzle == puzzle,
+                Solution.created_at < before,
+                Solution.created_at < newest,
+                ~exists().where(SolutionPersonalBest.solution_id == Solution.id)
+            )
+            .order_by(*OLDEST_FIRST)
+        )
+        solutions: List[Solution] = db.execute(statement).scalars().all()
+
+        if len(solutions) == 0:
+            db.rollback()
+            return 0
+
+        directory = cls._directory(puzzle, user_id)
+        current = cls._current_generation(directory)
+        columns = cls._to_columns(solutions)
+
+        if current is not None:
+            archive = SolutionArchive(current)
+            # left over by a run that failed after publishing
+            columns = cls._drop(columns, np.isin(columns['id'], archive.id))
+            columns = cls._concatenate(archive, columns)
+
+        cls._publish(directory, columns)
+
+        db.execute(delete(Solution).where(Solution.id.in_([solution.id for solution in solutions])))
+        db.commit()
+
+        cls._prune(directory)
+        return len(solutions)
+
+    @classmethod
+    def _to_columns(cls, solutions: List[Solution]) -> Dict[str, np.ndarray]:
+        lengths = np.fromiter((len(solution.scramble) for solution in solutions), dtype=np.int64, count=len(solutions))
+
+        return {
+            'id': np.array([solution.id.bytes for solution in solutions], dtype='S16'),
+            'time': np.array([solution.time for solution in solutions], dtype=np.float64),
+            'created_at': np.array([solution.created_at.timestamp() for solution in solutions], dtype=np.float64),
+            'penalty': np.array([solution.penalty for solution in solutions], dtype=np.bool_),
+            'dnf': np.array([solution.dnf for solution in solutions], dtype=np.bool_),
+            'session_id': np.array([cls._uuid_bytes(solution.session_id) for solution in solutions], dtype='S16'),
+            'client_key': np.array([cls._uuid_bytes(solution.client_key) for solution in solutions], dtype='S16'),
+            'scramble_offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            'scrambles': np.frombuffer(b''.join(solution.scramble for solution in solutions), dtype=np.uint8)
+        }
+
+    @classmethod
+    def _drop(cls, columns: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, np.ndarray]:
+        if not mask.any():
+            return columns
+
+        keep = ~mask
+        offsets = columns['scramble_offsets']
+        lengths = np.diff(offsets)[keep]
+        scrambles = [columns['scrambles'][start:end] for start, end, kept in zip(offsets[:-1], offsets[1:], keep) if kept]
+
+        result = {name: columns[name][keep] for name in _COLUMNS if name not in ('scramble_offsets', 'scrambles')}
+        result['scramble_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        result['scrambles'] = np.concatenate(scrambles) if len(scrambles) > 0 else np.empty(0, dtype=np.uint8)
+        return result
+
+    @classmethod
+    def _concatenate(cls, archive: SolutionArchive, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Append new columns to an archive, keeping the rows sorted by created_at and id.
+        """
+        offsets = np.concatenate([archive.scramble_offsets, columns['scramble_offsets'][1:] + archive.scramble_offsets[-1]])
+        scrambles = np.concatenate([archive.scrambles, columns['scrambles']])
+        merged = {
+            name: np.concatenate([archive.columns[name], columns[name]])
+            for name in _COLUMNS if name not in ('scramble_offsets', 'scrambles')
+        }
+
+        order = cls._chronological(merged['id'], merged['created_at'])
+        if np.all(order[1:] > order[:-1]):
+            merged['scramble_offsets'] = offsets
+            merged['scrambles'] = scrambles
+            return merged
+
+        # solutions replayed by offline clients can be older than the ones archived before
+        merged = {name: values[order] for name, values in merged.items()}
+        lengths = np.diff(offsets)[order]
+        merged['scramble_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        merged['scrambles'] = np.concatenate([scrambles[offsets[i]:offsets[i + 1]] for i in order])
+        return merged
+
+    @classmethod
+    def _chronological(cls, ids: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+        """
+        The order of OLDEST_FIRST, created_at and the id for solutions created at the same time. The raw uuid
+        bytes sort like uuids in Postgres.
+        """
+        return np.lexsort((ids, timestamps))
+
+    @classmethod
+    def _publish(cls, directory: str, columns: Dict[str, np.ndarray]):
+        """
+        Write a new generation next to the current one and make it current with an atomic rename.
+        Readers that memory-mapped the previous generation keep reading it until they are done.
+        """
+        current = cls._current_generation(directory)
+        generation = int(os.path.basename(current)) + 1 if current is not None else 1
+
+        temporary = os.path.join(directory, f'{generation}.tmp')
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        for name, dtype in _COLUMNS.items():
+            with open(os.path.join(temporary, f'{name}.npy'), 'wb') as file:
+                np.save(file, np.ascontiguousarray(columns[name], dtype=dtype))
+                file.flush()
+                os.fsync(file.fileno())
+
+        os.rename(temporary, os.path.join(directory, str(generation)))
+
+    @classmethod
+    def _prune(cls, directory: str):
+        """
+        Delete all but the SOLUTIONS_ARCHIVE_KEEP_GENERATIONS newest generations and the leftovers of failed runs.
+        A reader that listed the directory just before the rename may still be opening or reading the previous
+        generation, on a shared filesystem its files can't go away under the memory maps. Archive runs are far
+        apart, by the next one nobody reads the previous generation anymore.
+        """
+        names = cls._listdir(directory)
+        generations = sorted((int(name) for name in names if name.isdigit()), reverse=True)
+        kept = {str(generation) for generation in generations[:SOLUTIONS_ARCHIVE_KEEP_GENERATIONS]}
+
+        for name in names:
+            if name not in kept:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def _current_generation(cls, directory: str) -> str | None:
+        generations = [int(name) for name in cls._listdir(directory) if name.isdigit()]
+        return os.path.join(directory, str(max(generations))) if len(generations) > 0 else None
+
+    @classmethod
+    def _directory(cls, puzzle: str, user_id: UUID) -> str:
+        return os.path.join(SOLUTIONS_ARCHIVE_DIR, str(user_id), puzzle)
+
+    @classmethod
+    def _listdir(cls, directory: str) -> List[str]:
+        try:
+            return os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+    @classmethod
+    def _not_live(cls, archive: SolutionArchive, puzzle: str, user_id: UUID, db: Session) -> np.ndarray:
+        """
+        Mask of the archived solutions that aren't still in the solutions table as well.
+        """
+        # a second of slack, the timestamps lose their last microsecond digits as floats
+        latest = datetime.fromtimestamp(float(archive.created_at[-1]) + 1, timezone.utc)
+        statement = select(Solution.id).where(Solution.user_id == user_id, Solution.puzzle == puzzle, Solution.created_at <= latest)
+        live_ids = np.array([id.bytes for id in db.execute(statement).scalars()], dtype='S16')
+
+        return ~np.isin(archive.id, live_ids)
+
+    @classmethod
+    def _uuid_bytes(cls, value: UUID | None) -> bytes:
+        return value.bytes if value is not None else bytes(16)
@@ -0,0 +1,116 @@
+from typing import Dict, List
+from uuid import UUID
+from sqlalchemy import String, case, cast, column, func, select, true, values
+from sqlmodel import Session
+
+from app.constants import AVERAGES_ENGINE, HISTORY_METRICS
+from app.model.solution import NEWEST_FIRST, Solution
+from app.types.averages import LatestAverage
+from app.utils import get_avg_of
+
+# the largest window, mo100
+_LATEST_LIMIT = max(n for n, _ in HISTORY_METRICS.values())
+
+
+class AveragesService:
+    @classmethod
+    def get_latest(cls, puzzles: List[str], user_id: UUID, db: Session, engine: str | None = None) -> Dict[str, Dict[str, LatestAverage]]:
+        """
+        Compute the latest single, ao5, ao12 and mo100 of several puzzles, only the aggregates and
+        the start of each window, not the solutions themselves.
+
+        Args:
+            puzzles (List[str]): The types of puzzle.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+            engine (str | None): "python" or "sql", defaults to AVERAGES_ENGINE.
+
+        Returns:
+            Dict[str, Dict[str, LatestAverage]]: Per puzzle the average of every key of HISTORY_METRICS,
+                the time is None if the puzzle has fewer solutions than the window.
+        """
+        engine = engine if engine is not None else AVERAGES_ENGINE
+
+        if engine == 'sql':
+            return cls._get_latest_sql(puzzles, user_id, db)
+        if engine == 'python':
+            return {puzzle: cls._get_latest_python(puzzle, user_id, db) for puzzle in puzzles}
+
+        raise ValueError(f'Unknown averages engine {engine}')
+
+    @classmethod
+    def _get_latest_python(cls, puzzle: str, user_id: UUID, db: Session) -> Dict[str, LatestAverage]:
+        statement = (
+            select(Solution)
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle)
+            .order_by(*NEWEST_FIRST)
+            .limit(_LATEST_LIMIT)
+        )
+        latest: List[Solution] = db.execute(statement).scalars().all()
+
+        result = {}
+        for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+            average = get_avg_of(n, latest, omit_best_worst)
+            result[key] = {
+                'time': float(average['time']) if average['time'] is not None else None,
+                'window_start_id': average['solutions'][-1].id if average['solutions'] is not None else None
+            }
+
+        return result
+
+    @classmethod
+    def _get_latest_sql(cls, puzzles: List[str], user_id: UUID, db: Session) -> Dict[str, Dict[str, LatestAverage]]:
+        """
+        One query for all puzzles: a LATERAL subquery reads the newest 100 solutions of every puzzle
+        through the (user_id, puzzle, created_at) index and numbers them with row_number() in the same
+        order as the query (ties broken by id, otherwise the numbering could disagree with the LIMIT), then
+        each window is aggregated over the rows numbered up to its size.
+        """
+        if len(puzzles) == 0:
+            return {}
+
+        puzzle_list = values(column('puzzle', String), name='puzzle_list').data([(puzzle,) for puzzle in puzzles])
+        latest = (
+            select(
+                Solution.id,
+                Solution.time,
+                func.row_number().over(order_by=NEWEST_FIRST).label('position')
+            )
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle_list.c.puzzle)
+            .order_by(*NEWEST_FIRST)
+            .limit(_LATEST_LIMIT)
+            .lateral('latest')
+        )
+
+        columns = [puzzle_list.c.puzzle]
+        for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+            in_window = latest.c.position <= n
+            total = func.sum(latest.c.time).filter(in_window)
+            if omit_best_worst:
+                total = total - func.max(latest.c.time).filter(in_window) - func.min(latest.c.time).filter(in_window)
+                size = n - 2
+            else:
+                size = n
+
+            columns.append(case((func.count().filter(in_window) == n, total / float(size)), else_=None).label(key))
+            # uuid has no min/max aggregate, and exactly one row is at that position anyway
+            columns.append(func.min(cast(latest.c.id, String)).filter(latest.c.position == n).label(f'{key}_start'))
+
+        statement = (
+            select(*columns)
+            .select_from(puzzle_list.join(latest, true()))
+            .group_by(puzzle_list.c.puzzle)
+        )
+
+        # puzzles without solutions have no row
+        result = {puzzle: {key: {'time': None, 'window_start_id': None} for key in HISTORY_METRICS} for puzzle in puzzles}
+        for row in db.execute(statement).mappings():
+            result[row['puzzle']] = {
+                key: {
+                    'time': row[key],
+                    'window_start_id': UUID(row[f'{key}_start']) if row[key] is not None else None
+                }
+                for key in HISTORY_METRICS
+            }
+
+        return result
@@ -0,0 +1,372 @@
+from __future__ import annotations
+import math, struct
+from collections import defaultdict
+from typing import Dict, List
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+
+from app.constants import DISTRIBUTION_BUCKETS, DISTRIBUTION_MAX_BUCKETS, DISTRIBUTION_QUANTILES, DISTRIBUTION_RELATIVE_ACCURACY, PUZZLES
+from app.lazy_import import LazyModule
+from app.model.solution import Solution
+from app.model.time_distribution import TimeDistribution
+from app.services.archive_service import ArchiveService
+from app.types.distribution import Distribution
+from app.utils import floats_to_timestrs
+
+np = LazyModule('numpy')
+
+
+class TimeSketch:
+    """
+    A mergeable summary of solve times that supports deletes.
+
+    It keeps two sets of counters:
+        - a DDSketch style quantile sketch, where a time x lands in bucket ceil(log_gamma(x)) with
+          gamma = (1 + a) / (1 - a). Every estimated quantile is within a relative error of a
+          (`DISTRIBUTION_RELATIVE_ACCURACY`) of the exact lower quantile, e.g. with a = 1% a real
+          median of 12.00s is reported somewhere between 11.88s and 12.12s.
+        - a fixed width histogram starting at 0, whose counts are exact.
+
+    Both are plain counters, so removing a time is just decrementing the counter it was added to.
+
+    Each keeps at most `DISTRIBUTION_MAX_BUCKETS` buckets. Like the collapsing DDSketch, when the times
+    span more the highest buckets are merged into the last one, so a forgotten timer doesn't grow the
+    sketch. Quantiles and sub-N counts stay exact (within a) below the merged bucket, and anything above
+    it is reported as its lower bound. The highest buckets are merged rather than the lowest, because
+    the fast end is what matters for solve times.
+    """
+    _HEADER = struct.Struct('<Bdqiii')
+    _VERSION = 1
+
+    def __init__(self, bucket_width: float, relative_accuracy: float = DISTRIBUTION_RELATIVE_ACCURACY, max_buckets: int = DISTRIBUTION_MAX_BUCKETS):
+        self.bucket_width = bucket_width
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.zero_count = 0
+        self.sketch_offset = 0
+        self.sketch_counts = np.zeros(0, dtype=np.int32)
+        self.histogram_counts = np.zeros(0, dtype=np.int32)
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.sketch_counts.sum())
+
+    def add(self, time: float, count: int = 1):
+        """
+        Add a time to the sketch, a negative count removes it again.
+        """
+        if time <= 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(time) / self._log_gamma)
+            self._grow_sketch(index)
+            self.sketch_counts[self._sketch_position(index)] += count
+
+        bucket = min(int(max(time, 0) // self.bucket_width), self.max_buckets - 1)
+        if bucket >= len(self.histogram_counts):
+            self.histogram_counts = np.pad(self.histogram_counts, (0, bucket + 1 - len(self.histogram_counts)))
+        self.histogram_counts[bucket] += count
+
+    def remove(self, time: float):
+        self.add(time, -1)
+
+    def add_many(self, times: np.ndarray):
+        """
+        Add an array of times at once, used when building a sketch from scratch.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        positive = times[times > 0]
+        self.zero_count += len(times) - len(positive)
+
+        if len(positive) > 0:
+            indices = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            self._grow_sketch(int(indices.min()))
+            self._grow_sketch(int(indices.max()))
+            positions = np.minimum(indices - self.sketch_offset, len(self.sketch_counts) - 1)
+            np.add.at(self.sketch_counts, positions, 1)
+
+        if len(times) > 0:
+            buckets = np.minimum(np.maximum(times, 0) // self.bucket_width, self.max_buckets - 1).astype(np.int64)
+            counts = np.bincount(buckets).astype(np.int32)
+            if len(counts) > len(self.histogram_counts):
+                self.histogram_counts = np.pad(self.histogram_counts, (0, len(counts) - len(self.histogram_counts)))
+            self.histogram_counts[:len(counts)] += counts
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate the lower q-quantile, the time at rank floor(q * (count - 1)) of the sorted times.
+
+        Returns:
+            float | None: The estimate, or None if the sketch is empty.
+        """
+        count = self.count
+        if count == 0:
+            return None
+
+        rank = math.floor(q * (count - 1))
+        if rank < self.zero_count:
+            return 0.0
+
+        cumulative = np.cumsum(self.sketch_counts)
+        position = int(np.searchsorted(cumulative, rank - self.zero_count, side='right'))
+        index = position + self.sketch_offset
+
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def count_below(self, threshold: float) -> int:
+        """
+        Count the times strictly below `threshold`, exact when the threshold is a multiple of the bucket width.
+        """
+        buckets = math.ceil(threshold / self.bucket_width)
+        return int(self.histogram_counts[:buckets].sum())
+
+    def histogram(self) -> List[tuple[float, float, int]]:
+        """
+        The non empty part of the histogram as (start, end, count) tuples, the end of the last
+        bucket is infinite when it holds every time above the histogram.
+        """
+        nonzero = np.nonzero(self.histogram_counts)[0]
+        if len(nonzero) == 0:
+            return []
+
+        buckets = []
+        for i in range(nonzero[0], nonzero[-1] + 1):
+            end = (i + 1) * self.bucket_width if i < self.max_buckets - 1 else math.inf
+            buckets.append((i * self.bucket_width, end, int(self.histogram_counts[i])))
+
+        return buckets
+
+    def to_bytes(self) -> bytes:
+        header = self._HEADER.pack(
+            self._VERSION,
+            self.bucket_width,
+            self.zero_count,
+            self.sketch_offset,
+            len(self.sketch_counts),
+            len(self.histogram_counts)
+        )
+        return header + self.sketch_counts.astype('<i4').tobytes() + self.histogram_counts.astype('<i4').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TimeSketch":
+        version, bucket_width, zero_count, sketch_offset, sketch_length, histogram_length = cls._HEADER.unpack_from(data)
+
+        if version != cls._VERSION:
+            raise ValueError(f'Unsupported sketch version {version}')
+
+        sketch = cls(bucket_width)
+        sketch.zero_count = zero_count
+        sketch.sketch_offset = sketch_offset
+
+        start = cls._HEADER.size
+        sketch.sketch_counts = np.frombuffer(data, dtype='<i4', count=sketch_length, offset=start).astype(np.int32)
+        start += 4 * sketch_length
+        sketch.histogram_counts = np.frombuffer(data, dtype='<i4', count=histogram_length, offset=start).astype(np.int32)
+        # stored before there was a limit
+        sketch.sketch_counts = sketch._collapse(sketch.sketch_counts)
+        sketch.histogram_counts = sketch._collapse(sketch.histogram_counts)
+
+        return sketch
+
+    def _grow_sketch(self, index: int):
+        if len(self.sketch_counts) == 0:
+            self.sketch_offset = index
+            self.sketch_counts = np.zeros(1, dtype=np.int32)
+        elif index < self.sketch_offset:
+            self.sketch_counts = self._collapse(np.pad(self.sketch_counts, (self.sketch_offset - index, 0)))
+            self.sketch_offset = index
+        elif index >= self.sketch_offset + len(self.sketch_counts):
+            length = min(index + 1 - self.sketch_offset, self.max_buckets)
+            self.sketch_counts = np.pad(self.sketch_counts, (0, length - len(self.sketch_counts)))
+
+    def _sketch_position(self, index: int) -> int:
+        """
+        The position of the counter of sketch bucket `index`, the last one for every bucket merged into it.
+        """
+        return min(index - self.sketch_offset, len(self.sketch_counts) - 1)
+
+    def _collapse(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Merge the buckets above `max_buckets` into the last one kept.
+        """
+        if len(counts) <= self.max_buckets:
+            return counts
+
+        collapsed = counts[:self.max_buckets].copy()
+        collapsed[-1] += counts[self.max_buckets:].sum()
+        return collapsed
+
+
+class DistributionService:
+    @classmethod
+    def get_distribution(cls, puzzle: str, user_id: UUID, db: Session) -> Distribution:
+        """
+        Retrieve the distribution of times of a puzzle from its persisted sketch, DNFs excluded.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            Distribution: The estimated quantiles, exact sub-N counts and the histogram.
+
+        Raises:
+            HTTPException: If the puzzle is not supported.
+        """
+        if puzzle not in PUZZLES:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
+
+        row = db.get(TimeDistribution, (user_id, puzzle))
+        sketch = TimeSketch.from_bytes(row.data) if row is not None else cls._new_sketch(puzzle)
+
+        quantile_times = [sketch.quantile(q) for q in DISTRIBUTION_QUANTILES]
+        quantiles = []
+        for q, time, time_str in zip(DISTRIBUTION_QUANTILES, quantile_times, floats_to_timestrs(quantile_times)):
+            quantiles.append({'quantile': q, 'time': time, 'time_str': str(time_str)})
+
+        threshold_times = DISTRIBUTION_BUCKETS[puzzle]['thresholds']
+        thresholds = []
+        for threshold, threshold_str in zip(threshold_times, floats_to_timestrs(threshold_times)):
+            thresholds.append({
+                'threshold': threshold,
+                'threshold_str': str(threshold_str),
+                'count': sketch.count_below(threshold)
+            })
+
+        buckets = sketch.histogram()
+        start_strs = floats_to_timestrs([start for start, _, _ in buckets])
+        # the open end of the last bucket isn't shown
+        end_strs = floats_to_timestrs([end if end != math.inf else None for _, end, _ in buckets])
+        histogram = []
+        for (start, end, count), start_str, end_str in zip(buckets, start_strs, end_strs):
+            histogram.append({
+                'start': start,
+                'end': end,
+                'count': count,
+                'range_str': f'{start_str} - {end_str}' if end != math.inf else f'{start_str}+'
+            })
+
+        return {
+            'count': sketch.count,
+            'relative_accuracy': sketch.relative_accuracy,
+            'quantiles': quantiles,
+            'thresholds': thresholds,
+            'histogram': histogram
+        }
+
+    @classmethod
+    def on_solution_created(cls, solution: Solution, db: Session):
+        """
+        Add a new solution to the sketch of its puzzle. Doesn't commit.
+        """
+        cls.on_solutions_created([solution], db)
+
+    @classmethod
+    def on_solutions_created(cls, solutions: List[Solution], db: Session):
+        """
+        Add a batch of new solutions of one user and puzzle to their sketch. Doesn't commit.
+        """
+        times = [solution.time for solution in solutions if not solution.dnf]
+        if len(times) == 0:
+            return
+
+        row, sketch = cls._lock_sketch(solutions[0].puzzle, solutions[0].user_id, db)
+        for time in times:
+            sketch.add(time)
+        cls._save(row, sketch)
+
+    @classmethod
+    def on_solution_updated(cls, solution: Solution, old_time: float, old_dnf: bool, db: Session):
+        """
+        Move an updated solution to its new bucket, or drop it when it became a DNF. Doesn't commit.
+        """
+        row, sketch = cls._lock_sketch(solution.puzzle, solution.user_id, db)
+
+        if not old_dnf:
+            sketch.remove(old_time)
+        if not solution.dnf:
+            sketch.add(solution.time)
+
+        cls._save(row, sketch)
+
+    @classmethod
+    def on_solution_deleted(cls, solution: Solution, db: Session):
+        """
+        Remove a deleted solution from the sketch of its puzzle. Doesn't commit.
+        """
+        if solution.dnf:
+            return
+
+        row, sketch = cls._lock_sketch(solution.puzzle, solution.user_id, db)
+        sketch.remove(solution.time)
+        cls._save(row, sketch)
+
+    @classmethod
+    def rebuild(cls, db: Session, user_id: UUID | None = None) -> int:
+        """
+        Regenerate the sketches from scratch out of the solutions table and the archive and commit them.
+
+        Args:
+            db (Session): The database session to use.
+            user_id (UUID | None): Only rebuild the sketches of this user, defaults to all users.
+
+        Returns:
+            int: The number of rebuilt sketches.
+        """
+        statement = select(Solution.user_id, Solution.puzzle, Solution.time).where(Solution.dnf == False)
+        clear_statement = delete(TimeDistribution)
+
+        if user_id is not None:
+            statement = statement.where(Solution.user_id == user_id)
+            clear_statement = clear_statement.where(TimeDistribution.user_id == user_id)
+
+        times: Dict[tuple[UUID, str], List[float]] = defaultdict(list)
+        for owner, puzzle, time in db.execute(statement):
+            times[(owner, puzzle)].append(time)
+
+        for owner, puzzle in ArchiveService.iter_archives(user_id):
+            times[(owner, puzzle)].extend(ArchiveService.get_finished_times(puzzle, owner, db).tolist())
+
+        db.execute(clear_statement)
+
+        for (owner, puzzle), values in times.items():
+            sketch = cls._new_sketch(puzzle)
+            sketch.add_many(np.array(values))
+            db.add(TimeDistribution(user_id=owner, puzzle=puzzle, data=sketch.to_bytes()))
+
+        db.commit()
+        return len(times)
+
+    @classmethod
+    def _new_sketch(cls, puzzle: str) -> TimeSketch:
+        return TimeSketch(DISTRIBUTION_BUCKETS[puzzle]['width'])
+
+    @classmethod
+    def _lock_sketch(cls, puzzle: str, user_id: UUID, db: Session) -> tuple[TimeDistribution, TimeSketch]:
+        """
+        Fetch the sketch row with a row lock, creating an empty one first if it doesn't exist.
+        """
+        empty = cls._new_sketch(puzzle).to_bytes()
+        db.execute(insert(TimeDistribution).values(user_id=user_id, puzzle=puzzle, data=empty).on_conflict_do_nothing())
+
+        statement = (
+            select(TimeDistribution)
+            .where(TimeDistribution.user_id == user_id, TimeDistribution.puzzle == puzzle)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        row = db.execute(statement).scalar_one()
+
+        return row, TimeSketch.from_bytes(row.data)
+
+    @classmethod
+    def _save(cls, row: TimeDistribution, sketch: TimeSketch):
+        row.data = sketch.to_bytes()
+        row.updated_at = func.now()
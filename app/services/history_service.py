@@ -0,0 +1,168 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Dict, Set, Tuple
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlmodel import Session
+
+from app.constants import HISTORY_CACHE_SIZE, HISTORY_MAX_POINTS, HISTORY_METRICS, PUZZLES
+from app.lazy_import import LazyModule
+from app.model.solution import Solution
+from app.services.archive_service import ArchiveService
+from app.types.history import History
+from app.utils import downsample_lttb, get_rolling_avg_of
+
+np = LazyModule('numpy')
+
+
+class _PuzzleHistory:
+    """
+    The cached times of one user and puzzle in chronological order, plus the rolling series
+    and downsampled results computed from them.
+    """
+    def __init__(self, times: np.ndarray, timestamps: np.ndarray):
+        self.times = times
+        self.timestamps = timestamps
+        self.series: Dict[str, np.ndarray] = {}
+        self.downsampled: Dict[Tuple[str, int], History] = {}
+
+
+class HistoryService:
+    _cache: "OrderedDict[Tuple[UUID, str], _PuzzleHistory]" = OrderedDict()
+    # bumped on every change, so a history loaded while a solve was being written isn't cached
+    _generations: Dict[Tuple[UUID, str], int] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_history(cls, puzzle: str, metric: str, points: int, user_id: UUID, db: Session) -> History:
+        """
+        Compute the progress series of a metric and downsample it to a fixed point budget.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            metric (str): One of "single", "avg_five", "avg_twelve" or "mean_hundred".
+            points (int): The maximum number of points to return.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying, only touched on a cache miss.
+
+        Returns:
+            History: The downsampled series, x values are unix timestamps of the last solve of each window.
+
+        Raises:
+            HTTPException: If the puzzle or metric isn't supported or the point budget is out of range.
+        """
+        if puzzle not in PUZZLES:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
+
+        if metric not in HISTORY_METRICS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Unknown metric {metric}')
+
+        if not 3 <= points <= HISTORY_MAX_POINTS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Points have to be between 3 and {HISTORY_MAX_POINTS}')
+
+        history = cls._get_puzzle_history(puzzle, user_id, db)
+
+        with cls._lock:
+            cached = history.downsampled.get((metric, points))
+            if cached is not None:
+                return cached
+
+            series = cls._get_series(history, metric)
+            x = history.timestamps[len(history.timestamps) - len(series):]
+
+            indices = downsample_lttb(x, series, points) if len(series) > 0 else np.empty(0, dtype=np.int64)
+            result: History = {
+                'puzzle': puzzle,
+                'metric': metric,
+                'total': len(series),
+                'x': x[indices].tolist(),
+                'y': series[indices].tolist()
+            }
+            history.downsampled[(metric, points)] = result
+
+        return result
+
+    @classmethod
+    def on_solution_created(cls, solution: Solution):
+        """
+        Append a new solution to the cached history. The rolling series only get their newest
+        windows computed, everything else stays cached.
+        """
+        key = (solution.user_id, solution.puzzle)
+
+        with cls._lock:
+            cls._generations[key] = cls._generations.get(key, 0) + 1
+
+            history = cls._cache.get(key)
+            if history is None:
+                return
+
+            timestamp = solution.created_at.timestamp()
+
+            # not newer than the cached solves: replayed from an offline client, or already in the history
+            # because it was loaded after the commit but before this hook ran, recompute everything next time
+            if len(history.timestamps) > 0 and timestamp <= history.timestamps[-1]:
+                del cls._cache[key]
+                return
+
+            history.times = np.append(history.times, solution.time)
+            history.timestamps = np.append(history.timestamps, timestamp)
+            history.downsampled.clear()
+
+            for metric, series in history.series.items():
+                n, omit_best_worst = HISTORY_METRICS[metric]
+                tail = get_rolling_avg_of(n, history.times[-n:], omit_best_worst)
+                history.series[metric] = np.append(series, tail)
+
+    @classmethod
+    def invalidate(cls, puzzle: str, user_id: UUID):
+        """
+        Drop the cached history of a puzzle, used when a solution in the middle of the history changes.
+        """
+        key = (user_id, puzzle)
+
+        with cls._lock:
+            cls._generations[key] = cls._generations.get(key, 0) + 1
+            cls._cache.pop(key, None)
+
+    @classmethod
+    def get_cached_keys(cls) -> Set[Tuple[UUID, str]]:
+        with cls._lock:
+            return set(cls._cache)
+
+    @classmethod
+    def _get_puzzle_history(cls, puzzle: str, user_id: UUID, db: Session) -> _PuzzleHistory:
+        key = (user_id, puzzle)
+
+        with cls._lock:
+            history = cls._cache.get(key)
+            if history is not None:
+                cls._cache.move_to_end(key)
+                return history
+
+            generation = cls._generations.get(key, 0)
+
+        columns = ArchiveService.get_columns(puzzle, user_id, db)
+        history = _PuzzleHistory(columns.times, columns.timestamps)
+
+        with cls._lock:
+            if cls._generations.get(key, 0) != generation:
+                return history
+
+            cls._cache[key] = history
+            while len(cls._cache) > HISTORY_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+        return history
+
+    @classmethod
+    def _get_series(cls, history: _PuzzleHistory, metric: str) -> np.ndarray:
+        series = history.series.get(metric)
+
+        if series is None:
+            n, omit_best_worst = HISTORY_METRICS[metric]
+            series = get_rolling_avg_of(n, history.times, omit_best_worst)
+            history.series[metric] = series
+
+        return series
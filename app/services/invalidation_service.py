@@ -0,0 +1,234 @@
+import json, logging, secrets, threading, time
+import select as io_select
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Tuple
+from uuid import UUID
+from sqlalchemy import func, select, tuple_, update
+from sqlmodel import Session
+
+from app.constants import INVALIDATION_FALLBACK_INTERVAL, INVALIDATION_RECONNECT_DELAY, INVALIDATION_SEEN_SIZE, PUZZLES
+from app.db.database import SessionLocal, engine
+from app.model.puzzle_summary import PuzzleSummary
+from app.services.history_service import HistoryService
+from app.services.version_service import VersionService
+
+logger = logging.getLogger(__name__)
+
+CHANGED = 'changed'
+NEW_PB = 'new_pb'
+# a version changed that this worker never saw before, it could have been any of them
+UNKNOWN = 'unknown'
+
+
+class InvalidationService:
+    """
+    Keeps the in-process state (recent changes, cached histories, PB event streams) of every worker
+    in sync. Every mutation bumps `puzzle_summary.version` and sends a NOTIFY on the channel of its
+    puzzle in the same transaction, so the notification goes out exactly when the change is committed.
+    Every worker runs a thread that LISTENs on all channels and drops what a change made stale.
+
+    While the listener is not connected (e.g. the database restarted), the thread compares the versions
+    of everything this worker has cached against the database every INVALIDATION_FALLBACK_INTERVAL
+    seconds instead, and once more after reconnecting for the notifications missed in between.
+    `puzzle_summary.pb_version` tells which of the missed changes were new personal bests.
+    """
+    # notifications of this process were already applied locally
+    _origin = secrets.token_hex(8)
+    # the last (version, pb_version) this process applied, per user and puzzle, least recently changed first
+    _seen: "OrderedDict[Tuple[UUID, str], Tuple[int, int]]" = OrderedDict()
+    _listeners: List[Callable[[str, UUID, str], None]] = []
+    _lock = threading.Lock()
+    _thread: threading.Thread | None = None
+    _stop = threading.Event()
+
+    @classmethod
+    def publish(cls, puzzle: str, user_id: UUID, db: Session, event: str = CHANGED):
+        """
+        Bump the version of a puzzle and notify the other workers when the transaction commits.
+        Has to be called before the commit of the mutation, the local caches are updated by the caller after it.
+
+        Args:
+            puzzle (str): The type of puzzle that changed.
+            user_id (UUID): The owner of the changed data.
+            db (Session): The database session of the mutation.
+            event (str): CHANGED for any change of the solutions, NEW_PB when a personal best changed.
+        """
+        values = {'version': PuzzleSummary.version + 1}
+        if event == NEW_PB:
+            values['pb_version'] = PuzzleSummary.pb_version + 1
+
+        statement = (
+            update(PuzzleSummary)
+            .where(PuzzleSummary.user_id == user_id, PuzzleSummary.puzzle == puzzle)
+            .values(**values)
+            .returning(PuzzleSummary.version, PuzzleSummary.pb_version)
+        )
+        version, pb_version = db.execute(statement).one_or_none() or (0, 0)
+
+        payload = json.dumps({
+            'user_id': str(user_id),
+            'version': version,
+            'pb_version': pb_version,
+            'event': event,
+            'origin': cls._origin
+        })
+        # _seen isn't updated, the transaction could still roll back and the version be handed out again
+        db.execute(select(func.pg_notify(cls._channel(puzzle), payload)))
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[str, UUID, str], None]):
+        """
+        Register a function called with the puzzle, user and event of every change made by another worker.
+        """
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    def watch(cls, puzzle: str, user_id: UUID):
+        """
+        Start keeping track of the versions of a puzzle right away instead of with the next version check,
+        so the new personal bests of other workers are told apart from other changes even if their
+        notifications are missed. Call it when a stream of PB events is opened.
+        """
+        with cls._lock:
+            if (user_id, puzzle) in cls._seen:
+                return
+
+        if not cls._check_versions({(user_id, puzzle)}):
+            return
+
+        with cls._lock:
+            # no summary yet, the first change of any kind bumps the version past 0
+            cls._seen.setdefault((user_id, puzzle), (0, 0))
+
+    @classmethod
+    def start(cls):
+        if cls._thread is not None:
+            return
+
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, name='cache-invalidation', daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def shutdown(cls):
+        cls._stop.set()
+
+        if cls._thread is not None:
+            cls._thread.join()
+            cls._thread = None
+
+    @classmethod
+    def _run(cls):
+        while not cls._stop.is_set():
+            try:
+                cls._listen()
+            except Exception:
+                logger.exception('Cache invalidation listener failed, checking versions until it reconnects')
+
+            reconnect_at = time.monotonic() + INVALIDATION_RECONNECT_DELAY
+            while time.monotonic() < reconnect_at and not cls._stop.wait(INVALIDATION_FALLBACK_INTERVAL):
+                cls._check_versions()
+
+    @classmethod
+    def _listen(cls):
+        # a connection of its own, taken out of the pool for as long as the worker runs
+        connection = engine.raw_connection()
+        connection.detach()
+        try:
+            listener = connection.driver_connection
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                for puzzle in PUZZLES:
+                    cursor.execute(f'LISTEN "{cls._channel(puzzle)}"')
+
+            cls._check_versions()
+
+            while not cls._stop.is_set():
+                if io_select.select([listener], [], [], INVALIDATION_FALLBACK_INTERVAL) == ([], [], []):
+                    continue
+
+                listener.poll()
+                while listener.notifies:
+                    notification = listener.notifies.pop(0)
+                    cls._on_notification(notification.channel, notification.payload)
+        finally:
+            connection.close()
+
+    @classmethod
+    def _on_notification(cls, channel: str, payload: str):
+        puzzle = channel.removeprefix('solutions_')
+        message = json.loads(payload)
+
+        if message['origin'] == cls._origin:
+            return
+
+        cls._apply(puzzle, UUID(message['user_id']), message['version'], message['pb_version'], message['event'])
+
+    @classmethod
+    def _apply(cls, puzzle: str, user_id: UUID, version: int, pb_version: int, event: str):
+        key = (user_id, puzzle)
+
+        with cls._lock:
+            seen = cls._seen.get(key)
+            # versions only go up, this one was already applied through a notification or a version check
+            if seen is not None and version <= seen[0]:
+                return
+
+            cls._seen[key] = (version, pb_version)
+            cls._seen.move_to_end(key)
+            while len(cls._seen) > INVALIDATION_SEEN_SIZE:
+                cls._seen.popitem(last=False)
+
+        # more than one change since the last applied one, or no idea which
+        missed = seen is None and event == UNKNOWN or seen is not None and version > seen[0] + 1
+        if seen is not None and event == UNKNOWN:
+            event = NEW_PB if pb_version > seen[1] else CHANGED
+
+        VersionService.mark_changed(user_id)
+        # a new PB alone leaves the history as it is, the other missed changes could have been anything
+        if event != NEW_PB or missed:
+            HistoryService.invalidate(puzzle, user_id)
+
+        for listener in cls._listeners:
+            listener(puzzle, user_id, event)
+
+    @classmethod
+    def _check_versions(cls, keys: Iterable[Tuple[UUID, str]] | None = None) -> bool:
+        """
+        The fallback for lost notifications, compares the versions of everything cached in this
+        process (or of the given keys) with the database in one query.
+
+        Returns:
+            bool: False if the database could not be reached.
+        """
+        if keys is None:
+            with cls._lock:
+                keys = set(cls._seen)
+            keys |= HistoryService.get_cached_keys()
+        else:
+            keys = set(keys)
+
+        if len(keys) == 0:
+            return True
+
+        db = SessionLocal()
+        try:
+            statement = select(PuzzleSummary.user_id, PuzzleSummary.puzzle, PuzzleSummary.version, PuzzleSummary.pb_version).where(
+                tuple_(PuzzleSummary.user_id, PuzzleSummary.puzzle).in_(list(keys))
+            )
+            rows = db.execute(statement).all()
+        except Exception:
+            logger.warning('Version check failed, the database is not reachable')
+            return False
+        finally:
+            db.close()
+
+        for user_id, puzzle, version, pb_version in rows:
+            cls._apply(puzzle, user_id, version, pb_version, UNKNOWN)
+
+        return True
+
+    @classmethod
+    def _channel(cls, puzzle: str) -> str:
+        return f'solutions_{puzzle}'
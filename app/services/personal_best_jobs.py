@@ -0,0 +1,190 @@
+import asyncio, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set, Tuple
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app.constants import PB_JOB_WORKERS
+from app.db.database import SessionLocal
+from app.model.pending_pb_update import PendingPbUpdate
+from app.services.invalidation_service import NEW_PB, InvalidationService
+from app.services.solution_service import SolutionService
+from app.services.version_service import VersionService
+
+logger = logging.getLogger(__name__)
+
+_QUEUED = 'queued'
+_RUNNING = 'running'
+# a new solution came in while the job was running, so it has to run once more
+_RERUN = 'rerun'
+
+
+class PersonalBestJobs:
+    """
+    Updates the personal bests of a puzzle in a background thread after a solution got stored.
+
+    The work itself is described by the `pending_pb_updates` marker written in the same transaction
+    as the solution, so a job is idempotent and jobs that were lost on a restart are picked up again
+    by `resume_pending`. At most one job per user and puzzle is queued or running in this process,
+    any number of new solutions in the meantime coalesce into a single rerun.
+    """
+    _executor: ThreadPoolExecutor | None = None
+    _states: Dict[Tuple[UUID, str], str] = {}
+    _subscribers: Dict[Tuple[UUID, str], Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+            cls._states.clear()
+
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @classmethod
+    def enqueue(cls, puzzle: str, user_id: UUID):
+        """
+        Schedule a PB update of a puzzle, unless one is already waiting to run.
+        """
+        key = (user_id, puzzle)
+
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=PB_JOB_WORKERS, thread_name_prefix='pb-job')
+
+            state = cls._states.get(key)
+            if state == _RUNNING:
+                cls._states[key] = _RERUN
+                return
+            if state is not None:
+                return
+
+            cls._states[key] = _QUEUED
+            cls._executor.submit(cls._run, key)
+
+    @classmethod
+    def resume_pending(cls) -> int:
+        """
+        Enqueue a job for every marker left behind, e.g. by solutions stored right before a restart.
+        A database that isn't reachable yet is only logged, like in the warm-up, the markers stay
+        and their jobs run with the next solution of the puzzle or the next start.
+
+        Returns:
+            int: The number of enqueued jobs.
+        """
+        db = SessionLocal()
+        try:
+            markers = db.execute(select(PendingPbUpdate.user_id, PendingPbUpdate.puzzle)).all()
+        except OperationalError as e:
+            logger.warning('Resuming the pending PB updates failed: %s', e)
+            return 0
+        finally:
+            db.close()
+
+        for user_id, puzzle in markers:
+            cls.enqueue(puzzle, user_id)
+
+        return len(markers)
+
+    @classmethod
+    def subscribe(cls, puzzle: str, user_id: UUID) -> asyncio.Queue:
+        """
+        Register a queue that receives the name of an event whenever a job of the puzzle finished
+        with a new PB. Has to be called from the event loop that reads the queue.
+        """
+        queue = asyncio.Queue()
+
+        with cls._lock:
+            cls._subscribers.setdefault((user_id, puzzle), set()).add((asyncio.get_running_loop(), queue))
+
+        return queue
+
+    @classmethod
+    def unsubscribe(cls, puzzle: str, user_id: UUID, queue: asyncio.Queue):
+        key = (user_id, puzzle)
+
+        with cls._lock:
+            subscribers = cls._subscribers.get(key, set())
+            subscribers.difference_update({item for item in subscribers if item[1] is queue})
+            if len(subscribers) == 0:
+                cls._subscribers.pop(key, None)
+
+    @classmethod
+    def on_remote_event(cls, puzzle: str, user_id: UUID, event: str):
+        """
+        Pass on the new PBs found by the jobs of other workers to the streams connected to this one.
+        Changes missed while the listener was disconnected arrive as NEW_PB too, once the version check
+        after reconnecting found a higher `pb_version` (see InvalidationService.watch).
+        """
+        if event == NEW_PB:
+            cls._notify((user_id, puzzle), NEW_PB)
+
+    @classmethod
+    def _run(cls, key: Tuple[UUID, str]):
+        user_id, puzzle = key
+
+        while True:
+            with cls._lock:
+                cls._states[key] = _RUNNING
+
+            try:
+                if cls._update_personal_best(puzzle, user_id):
+                    VersionService.mark_changed(user_id)
+                    cls._notify(key, NEW_PB)
+            except Exception:
+                # the marker stays, so the update is retried with the next solution or restart
+                logger.exception('Personal best update of %s for user %s failed', puzzle, user_id)
+
+            with cls._lock:
+                if cls._states.get(key) != _RERUN:
+                    cls._states.pop(key, None)
+                    return
+
+    @classmethod
+    def _update_personal_best(cls, puzzle: str, user_id: UUID) -> bool:
+        """
+        Check the windows of all unchecked solutions of a puzzle for new PBs and clear the marker,
+        all in one transaction. The marker row stays locked until the commit, so jobs of other
+        processes wait for this one, and a solution stored meanwhile writes a new marker afterwards.
+
+        Returns:
+            bool: True if any personal best changed.
+        """
+        db = SessionLocal()
+        try:
+            statement = (
+                select(PendingPbUpdate)
+                .where(PendingPbUpdate.user_id == user_id, PendingPbUpdate.puzzle == puzzle)
+                .with_for_update()
+            )
+            marker: PendingPbUpdate | None = db.execute(statement).scalar_one_or_none()
+
+            if marker is None:
+                db.rollback()
+                return False
+
+            candidates = SolutionService.get_best_new_averages(puzzle, user_id, marker.since, db)
+            pbs = SolutionService.get_personal_best(puzzle, user_id, db)
+            changed = SolutionService.update_personal_best(pbs, candidates, db)
+            if changed:
+                InvalidationService.publish(puzzle, user_id, db, NEW_PB)
+
+            db.delete(marker)
+            db.commit()
+
+            return changed
+        finally:
+            db.close()
+
+    @classmethod
+    def _notify(cls, key: Tuple[UUID, str], event: str):
+        with cls._lock:
+            subscribers = list(cls._subscribers.get(key, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:    # the loop of a disconnected client is already closed
+                pass
@@ -1,7 +1,69 @@
-import random
+import hashlib, random
+from typing import Dict, List
 from app.constants import MODIFIERS, MOVES, OPPOSITE_FACES, WCA_SCRAMBLE_LENGTHS
 
+
+def _build_move_codes() -> Dict[str, int]:
+    """
+    Every move the generators produce, packed into a byte: bits 0-2 are the face (index in MOVES),
+    bits 3-4 the modifier (index in MODIFIERS) and bits 5-7 the layer, 0 for an outer face turn,
+    1 for a wide turn ("Rw") and 2-7 for a numbered slice ("3R").
+    """
+    codes = {}
+    for face_code, face in enumerate(MOVES):
+        for modifier_code, modifier in enumerate(MODIFIERS):
+            for layer_code in range(8):
+                prefix = str(layer_code) if layer_code >= 2 else ''
+                wide = 'w' if layer_code == 1 else ''
+                codes[f'{prefix}{face}{wide}{modifier}'] = face_code | modifier_code << 3 | layer_code << 5
+
+    return codes
+
+
 class ScrambleService:
+    _MOVE_CODES = _build_move_codes()
+    _MOVE_STRS = {code: move for move, code in _MOVE_CODES.items()}
+
+    @classmethod
+    def parse(cls, scramble: str) -> List[str]:
+        """
+        Split a scramble as submitted by the form (moves joined by "_") or typed with spaces into moves.
+        """
+        return scramble.replace('_', ' ').split()
+
+    @classmethod
+    def encode(cls, moves: List[str]) -> bytes:
+        """
+        Pack a scramble into one byte per move, a 9x9x9 scramble takes 140 bytes instead of ~420 characters.
+
+        Raises:
+            ValueError: If a move can't be produced by the scramble generators.
+        """
+        try:
+            return bytes(cls._MOVE_CODES[move] for move in moves)
+        except KeyError as e:
+            raise ValueError(f'Unsupported move {e.args[0]}')
+
+    @classmethod
+    def decode(cls, data: bytes) -> List[str]:
+        """
+        Unpack a scramble packed by `encode`.
+
+        Raises:
+            ValueError: If a byte isn't the code of a move, e.g. face 6 or 7 or modifier 3.
+        """
+        try:
+            return [cls._MOVE_STRS[code] for code in data]
+        except KeyError as e:
+            raise ValueError(f'Unsupported move code {e.args[0]}')
+
+    @classmethod
+    def hash(cls, data: bytes) -> int:
+        """
+        A signed 64 bit hash of a packed scramble, stored in the indexed `scramble_hash` column.
+        """
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
     @classmethod
     def generate_scramble(cls, puzzle: str = '3x3x3'):
         """
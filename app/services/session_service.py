@@ -0,0 +1,379 @@
+from datetime import datetime, timezone
+from typing import List, Tuple
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import desc, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.constants import PUZZLES, SESSION_BEST_AVERAGES
+from app.db.db_helpers import get_model_by_id
+from app.lazy_import import LazyModule
+from app.model.practice_session import PracticeSession
+from app.model.solution import NEWEST_FIRST, OLDEST_FIRST, Solution
+from app.services.archive_service import ArchiveService
+from app.types.sessions import SessionDetails
+from app.utils import float_to_timestr, get_rolling_avg_of
+
+np = LazyModule('numpy')
+
+# solutions before and after a changed one that can share a window with it
+_NEIGHBOURS = max(SESSION_BEST_AVERAGES) - 1
+
+
+class SessionService:
+    @classmethod
+    def get_sessions(cls, puzzle: str, user_id: UUID, db: Session, limit: int = 20) -> List[PracticeSession]:
+        """
+        Retrieve the latest sessions of a puzzle that are not closed.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the sessions.
+            db (Session): The database session to use for querying.
+            limit (int): The maximum number of sessions to retrieve. Defaults to 20.
+
+        Returns:
+            List[PracticeSession]: The open sessions, newest first.
+        """
+        statement = (
+            select(PracticeSession)
+            .where(PracticeSession.user_id == user_id, PracticeSession.puzzle == puzzle, PracticeSession.closed_at == None)
+            .order_by(desc(PracticeSession.created_at))
+            .limit(limit)
+        )
+        return db.execute(statement).scalars().all()
+
+    @classmethod
+    def get_active_session(cls, puzzle: str, user_id: UUID, db: Session) -> PracticeSession | None:
+        statement = select(PracticeSession).where(
+            PracticeSession.user_id == user_id,
+            PracticeSession.puzzle == puzzle,
+            PracticeSession.is_active == True
+        )
+        return db.execute(statement).scalars().first()
+
+    @classmethod
+    def create_session(cls, puzzle: str, name: str | None, user_id: UUID, db: Session) -> PracticeSession:
+        """
+        Create a new session and make it the active one of its puzzle.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            name (str | None): The name of the session, defaults to the current date and time.
+            user_id (UUID): The owner of the session.
+            db (Session): The database session to use for inserting the session.
+
+        Returns:
+            PracticeSession: The created session.
+
+        Raises:
+            HTTPException: If the puzzle is not supported.
+        """
+        if puzzle not in PUZZLES:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
+
+        session = cls._insert_active_session(puzzle, name, user_id, db)
+        if session is None:
+            # another request started one in the meantime, it's visible to the next statements, replace it
+            session = cls._insert_active_session(puzzle, name, user_id, db)
+        if session is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Another session was started at the same time')
+
+        db.commit()
+        db.refresh(session)
+
+        return session
+
+    @classmethod
+    def switch_session(cls, id: str, user_id: UUID, db: Session) -> PracticeSession:
+        """
+        Make an open session the active one of its puzzle.
+
+        Raises:
+            HTTPException: If the session doesn't exist or is already closed.
+        """
+        session = cls._get_open_session(id, user_id, db)
+
+        cls._deactivate_sessions(session.puzzle, user_id, db)
+        session.is_active = True
+        try:
+            db.commit()
+        except IntegrityError:
+            # another session was activated at the same time, see ux_practice_sessions_active
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Another session was activated at the same time')
+        db.refresh(session)
+
+        return session
+
+    @classmethod
+    def close_session(cls, id: str, user_id: UUID, db: Session) -> PracticeSession:
+        """
+        Close a session, new solutions of its puzzle then start a new session.
+
+        Raises:
+            HTTPException: If the session doesn't exist or is already closed.
+        """
+        session = cls._get_open_session(id, user_id, db)
+
+        session.is_active = False
+        session.closed_at = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(session)
+
+        return session
+
+    @classmethod
+    def lock_active_session(cls, puzzle: str, user_id: UUID, db: Session) -> PracticeSession:
+        """
+        Fetch the active session of a puzzle with a row lock, starting a new one if there is none.
+        Doesn't commit, it's meant to run in the same transaction as the new solution.
+        """
+        statement = (
+            select(PracticeSession)
+            .where(PracticeSession.user_id == user_id, PracticeSession.puzzle == puzzle, PracticeSession.is_active == True)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        session = db.execute(statement).scalars().first()
+
+        if session is None:
+            session = cls._insert_active_session(puzzle, None, user_id, db)
+        if session is None:
+            # a concurrent request started it, the insert waited for that transaction to commit
+            session = db.execute(statement).scalars().one()
+
+        return session
+
+    @classmethod
+    def on_solution_created(cls, session: PracticeSession, solution: Solution, db: Session):
+        """
+        Add a new (flushed) solution to the aggregates of its locked session. Only the latest
+        12 solutions of the session are read, so it takes the same time no matter the history size.
+        """
+        cls.on_solutions_created(session, [solution], db)
+
+    @classmethod
+    def on_solutions_created(cls, session: PracticeSession, solutions: List[Solution], db: Session):
+        """
+        Add new (flushed) solutions to the aggregates of their locked session. If they are the newest
+        solutions of the session, only they and the 11 solutions before them are read. A batch replayed by an
+        offline client can land anywhere in the session though, then the whole session is read again.
+        Doesn't commit.
+        """
+        statement = (
+            select(Solution)
+            .where(Solution.session_id == session.id)
+            .order_by(*NEWEST_FIRST)
+            .limit(len(solutions) + _NEIGHBOURS)
+        )
+        latest: List[Solution] = db.execute(statement).scalars().all()[::-1]
+
+        appended = latest[len(latest) - len(solutions):]
+        if {solution.id for solution in appended} != {solution.id for solution in solutions}:
+            cls._recompute(session, db)
+            return
+
+        for i in range(len(latest) - len(solutions), len(latest)):
+            cls._apply_delta(session, latest[max(i - _NEIGHBOURS, 0):i], [], None, (latest[i].time, latest[i].dnf))
+
+    @classmethod
+    def on_solution_updated(cls, solution: Solution, old_time: float, old_dnf: bool, db: Session):
+        """
+        Apply a penalty or a DNF of a (flushed) solution to the aggregates of its session. Only the solutions
+        sharing a window with it are read, unless it was the best single or part of a best average, a best
+        can't be taken back without reading the whole session again.
+        Doesn't commit.
+        """
+        session = cls._lock_session(solution.session_id, db)
+        if session is None:
+            return
+
+        older, newer = cls._get_neighbours(solution, db)
+        old, new = (old_time, old_dnf), (solution.time, solution.dnf)
+        if not cls._has_windows(session, older, newer) or not cls._apply_delta(session, older, newer, old, new):
+            cls._recompute(session, db)
+
+    @classmethod
+    def on_solution_deleted(cls, solution: Solution, db: Session):
+        """
+        Remove a deleted (flushed) solution from the aggregates of its session. Deleting the newest solution
+        of the session (e.g. a mistimed solve) only reads the 11 solutions before it, one from the middle
+        joins new windows, then the whole session is read again, like when it was a best.
+        Doesn't commit.
+        """
+        session = cls._lock_session(solution.session_id, db)
+        if session is None:
+            return
+
+        older, newer = cls._get_neighbours(solution, db)
+        if len(newer) > 0 or not cls._has_windows(session, older, newer) or not cls._apply_delta(session, older, newer, (solution.time, solution.dnf), None):
+            cls._recompute(session, db)
+
+    @classmethod
+    def _lock_session(cls, session_id: UUID | None, db: Session) -> PracticeSession | None:
+        if session_id is None:
+            return None
+
+        statement = select(PracticeSession).where(PracticeSession.id == session_id).with_for_update().execution_options(populate_existing=True)
+        return db.execute(statement).scalar_one_or_none()
+
+    @classmethod
+    def _get_neighbours(cls, solution: Solution, db: Session) -> Tuple[List[Solution], List[Solution]]:
+        """
+        The live solutions of the session that can share a window with the given one, before and after it, oldest first.
+        """
+        position = tuple_(Solution.created_at, Solution.id)
+        before = (
+            select(Solution)
+            .where(Solution.session_id == solution.session_id, Solution.id != solution.id, position < (solution.created_at, solution.id))
+            .order_by(*NEWEST_FIRST)
+            .limit(_NEIGHBOURS)
+        )
+        after = (
+            select(Solution)
+            .where(Solution.session_id == solution.session_id, Solution.id != solution.id, position > (solution.created_at, solution.id))
+            .order_by(*OLDEST_FIRST)
+            .limit(_NEIGHBOURS)
+        )
+
+        return db.execute(before).scalars().all()[::-1], db.execute(after).scalars().all()
+
+    @classmethod
+    def _has_windows(cls, session: PracticeSession, older: List[Solution], newer: List[Solution]) -> bool:
+        """
+        Whether every window around a changed solution was read. Fewer than 11 older solutions are either the
+        start of the session or, in a session with more solutions than were read, archived ones.
+        """
+        return len(older) == _NEIGHBOURS or len(older) + len(newer) + 1 >= session.solve_count
+
+    @classmethod
+    def _apply_delta(cls, session: PracticeSession, older: List[Solution], newer: List[Solution], old: Tuple[float, bool] | None, new: Tuple[float, bool] | None) -> bool:
+        """
+        Replace the (time, dnf) of one solution between `older` and `newer` in the aggregates of a session,
+        `old` is None for a new solution and `new` for a deleted one.
+
+        Returns:
+            bool: False if the old solution was the best single or in the window of a best average, then
+                  the session has to be recomputed.
+        """
+        if old is not None:
+            old_time, old_dnf = old
+            session.solve_count -= 1
+            if old_dnf:
+                session.dnf_count -= 1
+            else:
+                session.time_sum -= old_time
+                if session.best_single is not None and old_time <= session.best_single:
+                    return False
+
+        if new is not None:
+            new_time, new_dnf = new
+            session.solve_count += 1
+            if new_dnf:
+                session.dnf_count += 1
+            else:
+                session.time_sum += new_time
+                if session.best_single is None or new_time < session.best_single:
+                    session.best_single = new_time
+
+        # DNFs count with their time, like in the averages of the puzzle
+        times = [solution.time for solution in older] + [0.0] + [solution.time for solution in newer]
+        for n, key in SESSION_BEST_AVERAGES.items():
+            best = getattr(session, key)
+            # the windows containing the replaced solution
+            first, last = max(len(older) - n + 1, 0), len(older) + 1
+
+            if old is not None:
+                times[len(older)] = old_time
+                before = get_rolling_avg_of(n, times, True)[first:last]
+                if len(before) > 0 and (best is None or np.any((before < best) | np.isclose(before, best))):
+                    return False
+
+            if new is not None:
+                times[len(older)] = new_time
+                after = get_rolling_avg_of(n, times, True)[first:last]
+                if len(after) > 0 and (best is None or after.min() < best):
+                    setattr(session, key, float(after.min()))
+
+        return True
+
+    @classmethod
+    def _recompute(cls, session: PracticeSession, db: Session):
+        """
+        Recompute the aggregates of a locked session from all of its solutions, archived ones included
+        (a long running session can have its first solutions archived already).
+        """
+        columns = ArchiveService.get_columns(session.puzzle, session.user_id, db, session.id)
+
+        finished = columns.times[~columns.dnf]
+        avg_of_5 = get_rolling_avg_of(5, columns.times, True)
+        avg_of_12 = get_rolling_avg_of(12, columns.times, True)
+
+        session.solve_count = len(columns.times)
+        session.dnf_count = len(columns.times) - len(finished)
+        session.time_sum = float(finished.sum())
+        session.best_single = float(finished.min()) if len(finished) > 0 else None
+        session.best_avg_five = float(avg_of_5.min()) if len(avg_of_5) > 0 else None
+        session.best_avg_twelve = float(avg_of_12.min()) if len(avg_of_12) > 0 else None
+
+    @classmethod
+    def to_details(cls, session: PracticeSession | None) -> SessionDetails | None:
+        """
+        Format a session for the templates.
+        """
+        if session is None:
+            return None
+
+        return {
+            'id': str(session.id),
+            'name': session.name,
+            'solve_count': session.solve_count,
+            'dnf_count': session.dnf_count,
+            'mean_str': float_to_timestr(session.mean),
+            'best_single_str': float_to_timestr(session.best_single),
+            'best_avg_five_str': float_to_timestr(session.best_avg_five),
+            'best_avg_twelve_str': float_to_timestr(session.best_avg_twelve)
+        }
+
+    @classmethod
+    def _insert_active_session(cls, puzzle: str, name: str | None, user_id: UUID, db: Session) -> PracticeSession | None:
+        """
+        Deactivate the active session of a puzzle and insert a new active one. Returns None if a concurrent
+        transaction inserted an active session first, ux_practice_sessions_active allows only one.
+        """
+        cls._deactivate_sessions(puzzle, user_id, db)
+
+        if name is None or name.strip() == '':
+            name = datetime.now().strftime('%d.%m.%Y %H:%M')
+
+        statement = (
+            insert(PracticeSession)
+            .values(user_id=user_id, puzzle=puzzle, name=name.strip())
+            .on_conflict_do_nothing(index_elements=[PracticeSession.user_id, PracticeSession.puzzle], index_where=PracticeSession.is_active == True)
+            .returning(PracticeSession)
+        )
+        return db.execute(statement).scalars().first()
+
+    @classmethod
+    def _deactivate_sessions(cls, puzzle: str, user_id: UUID, db: Session):
+        statement = (
+            update(PracticeSession)
+            .where(PracticeSession.user_id == user_id, PracticeSession.puzzle == puzzle, PracticeSession.is_active == True)
+            .values(is_active=False)
+        )
+        db.execute(statement)
+
+    @classmethod
+    def _get_open_session(cls, id: str, user_id: UUID, db: Session) -> PracticeSession:
+        session: PracticeSession | None = get_model_by_id(PracticeSession, id, db, user_id)
+
+        if session is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Session with this id was not found')
+
+        if session.closed_at is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Session is already closed')
+
+        return session
@@ -1,26 +1,39 @@
-from typing import List
+from datetime import datetime, timezone
+from typing import Dict, List
+from uuid import UUID
 from fastapi import HTTPException, Response, status
-from sqlalchemy import desc, select
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session
 
-from app.constants import PUZZLES
+from app.constants import HISTORY_METRICS, PUZZLES, SOLUTIONS_BATCH_MAX_SIZE
 from app.db.db_helpers import get_model_by_id
+from app.model.pending_pb_update import PendingPbUpdate
 from app.model.personal_best import PersonalBest
-from app.model.solution import Solution
+from app.model.solution import NEWEST_FIRST, OLDEST_FIRST, Solution
 from app.model.solutions_personal_best import SolutionPersonalBest
+from app.services.distribution_service import DistributionService
+from app.services.history_service import HistoryService
+from app.services.invalidation_service import InvalidationService
+from app.services.scramble_service import ScrambleService
+from app.services.session_service import SessionService
+from app.services.summary_service import SummaryService
+from app.services.version_service import VersionService
 from app.types.averages import AverageDetails, CurrentAverages, CurrentPBs
+from app.types.batch import BatchSolution
 from app.types.solutions import Solutions
-from app.utils import float_to_timestr, get_avg_of, timestr_to_float
+from app.utils import float_to_timestr, get_avg_of, get_rolling_avg_of, timestr_to_float
 
 
 class SolutionService:
     @classmethod
-    def get_solutions(cls, puzzle: str, db: Session, cursor: str | None = None, limit: int = 20) -> Solutions:
+    def get_solutions(cls, puzzle: str, user_id: UUID, db: Session, cursor: str | None = None, limit: int = 20) -> Solutions:
         """
         Retrieve a list of solutions for a specific puzzle.
 
         Args:
             puzzle (str): The type of puzzle for which solutions are retrieved.
+            user_id (UUID): The owner of the solutions.
             db (Session): The database session to use for querying.
             cursor (str | None): An optional cursor for pagination, representing the ID of the last retrieved solution.
             limit (int): The maximum number of solutions to retrieve. Defaults to 20.
@@ -35,12 +48,13 @@ class SolutionService:
         if puzzle not in PUZZLES:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
 
-        statement = select(Solution).where(Solution.puzzle == puzzle).order_by(desc(Solution.created_at))
+        statement = select(Solution).where(Solution.user_id == user_id, Solution.puzzle == puzzle).order_by(*NEWEST_FIRST)
 
         if cursor is not None:
-            cursor: Solution | None = get_model_by_id(Solution, cursor, db)
+            cursor: Solution | None = get_model_by_id(Solution, cursor, db, user_id)
             if cursor is not None:
-                statement = statement.where(Solution.created_at < cursor.created_at)
+                # the id too, solutions stored at the same time as the cursor would be skipped otherwise
+                statement = statement.where(tuple_(Solution.created_at, Solution.id) < tuple_(cursor.created_at, cursor.id))
 
         # db.execute is deprecated and the doc says i should use "exec" method, but the exec method dont fuckin exist on the db object
         solutions: List[Solution] = db.execute(statement.limit(limit)).scalars().all()
@@ -51,21 +65,23 @@ class SolutionService:
         }
 
     @classmethod
-    def create_solution(cls, solution_time: str, puzzle: str, scramble: str, db: Session):
+    def create_solution(cls, solution_time: str, puzzle: str, scramble: str, user_id: UUID, db: Session):
         """
-        Create a new solution record in the database.
+        Create a new solution record in the database, as part of the active session of the puzzle.
+        Personal bests aren't checked here, a pending_pb_updates marker is left for `PersonalBestJobs` instead.
 
         Args:
             solution_time (str): The time taken to solve the puzzle, formatted as a string (e.g., "12.34").
             puzzle (str): The type of puzzle solved.
             scramble (str): The scramble associated with the solution.
+            user_id (UUID): The owner of the solution.
             db (Session): The database session to use for inserting the solution.
 
         Returns:
             Solution: The created solution object.
 
         Raises:
-            HTTPException: If the puzzle is not supported or the solution time format is invalid.
+            HTTPException: If the puzzle is not supported or the solution time or scramble format is invalid.
         """
         if puzzle not in PUZZLES:       # mozno radsej raise value error
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
@@ -74,16 +90,124 @@ class SolutionService:
 
         if time_val is None:            # tuto mozno tiez radsej value error
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid time format')
-        
-        solution = Solution(time=time_val, puzzle=puzzle, scramble=scramble)
+
+        packed = cls._encode_scramble(scramble)
+        session = SessionService.lock_active_session(puzzle, user_id, db)
+
+        solution = Solution(
+            time=time_val,
+            puzzle=puzzle,
+            scramble=packed,
+            scramble_hash=ScrambleService.hash(packed),
+            user_id=user_id,
+            session_id=session.id
+        )
         db.add(solution)
+        db.flush()
+
+        SummaryService.on_solution_created(solution, db)
+        DistributionService.on_solution_created(solution, db)
+        SessionService.on_solution_created(session, solution, db)
+        cls._mark_pending_pb_update(puzzle, user_id, db)
+        InvalidationService.publish(puzzle, user_id, db)
         db.commit()
         db.refresh(solution)
 
+        HistoryService.on_solution_created(solution)
+        VersionService.mark_changed(user_id)
+
         return solution
     
     @classmethod
-    def update_solution(cls, id: str, action: str, db: Session):
+    def create_solutions(cls, items: List[BatchSolution], puzzle: str, user_id: UUID, db: Session) -> List[Solution]:
+        """
+        Store a batch of solutions queued by an offline client in a single transaction. Items whose
+        key was already stored (a replayed batch) are skipped, the summary, distribution and session
+        are updated once for the whole batch and a single PB update is left for `PersonalBestJobs`.
+
+        Args:
+            items (List[BatchSolution]): The queued solutions, each with a client generated idempotency key.
+            puzzle (str): The type of puzzle solved.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for inserting the solutions.
+
+        Returns:
+            List[Solution]: The newly stored solutions, newest first. Empty if all of them were replays.
+
+        Raises:
+            HTTPException: If the puzzle is not supported, the batch is too large or a time or scramble format is invalid.
+        """
+        if puzzle not in PUZZLES:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Puzzle {puzzle} not supported')
+
+        if len(items) > SOLUTIONS_BATCH_MAX_SIZE:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'A batch can have at most {SOLUTIONS_BATCH_MAX_SIZE} solutions')
+
+        rows = {}
+        for i, item in enumerate(items):
+            time_val = timestr_to_float(item.solution_time)
+
+            if time_val is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Invalid time format of solution {i}')
+
+            packed = cls._encode_scramble(item.scramble)
+            created_at = item.created_at
+            if created_at is not None and created_at.tzinfo is None:
+                # clients without an offset send UTC, like the timestamps this app renders
+                created_at = created_at.replace(tzinfo=timezone.utc)
+
+            rows[item.key] = {
+                'time': time_val + 2 if item.penalty else time_val,
+                'penalty': item.penalty,
+                'dnf': item.dnf,
+                'puzzle': puzzle,
+                'scramble': packed,
+                'scramble_hash': ScrambleService.hash(packed),
+                'user_id': user_id,
+                'client_key': item.key,
+                # clock_timestamp() instead of NOW(), so solves without a time keep their order
+                'created_at': created_at if created_at is not None else func.clock_timestamp()
+            }
+
+        if len(rows) == 0:
+            return []
+
+        session = SessionService.lock_active_session(puzzle, user_id, db)
+        for row in rows.values():
+            row['session_id'] = session.id
+
+        statement = (
+            insert(Solution)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(index_elements=[Solution.user_id, Solution.client_key])
+            .returning(Solution)
+        )
+        solutions: List[Solution] = db.execute(statement).scalars().all()
+
+        if len(solutions) == 0:
+            db.rollback()
+            return []
+
+        SummaryService.on_solutions_created(solutions, db)
+        DistributionService.on_solutions_created(solutions, db)
+        SessionService.on_solutions_created(session, solutions, db)
+        cls._mark_pending_pb_update(puzzle, user_id, db, min(solution.created_at for solution in solutions))
+        InvalidationService.publish(puzzle, user_id, db)
+
+        solutions = sorted(solutions, key=lambda solution: (solution.created_at, solution.id), reverse=True)
+        # detached, the commit would expire them and rendering would reload them one by one
+        for solution in solutions:
+            db.expunge(solution)
+        db.commit()
+
+        # replayed solves may land anywhere in the history
+        HistoryService.invalidate(puzzle, user_id)
+        VersionService.mark_changed(user_id)
+
+        return solutions
+
+    @classmethod
+    def update_solution(cls, id: str, action: str, user_id: UUID, db: Session):
         """
         Update an existing solution with a specific action.
 
@@ -92,6 +216,7 @@ class SolutionService:
             action (str): The action to apply to the solution. Supported actions are:
                           - "penalty": Add a 2-second penalty to the solution.
                           - "dnf": Mark the solution as "Did Not Finish" (DNF).
+            user_id (UUID): The owner of the solution.
             db (Session): The database session to use for updating the solution.
 
         Returns:
@@ -100,11 +225,13 @@ class SolutionService:
         Raises:
             HTTPException: If the solution with the given ID is not found or the action is invalid.
         """
-        solution: Solution | None = get_model_by_id(Solution, id, db)
+        solution: Solution | None = get_model_by_id(Solution, id, db, user_id)
 
         if solution is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Solution with this id was not found')
         
+        old_time, old_dnf = solution.time, solution.dnf
+
         if action == 'penalty':
             solution.penalty = True
             solution.time += 2
@@ -115,17 +242,26 @@ class SolutionService:
         else:    
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid action')
         
+        db.flush()
+        SummaryService.on_solution_updated(solution, old_time, old_dnf, db)
+        DistributionService.on_solution_updated(solution, old_time, old_dnf, db)
+        SessionService.on_solution_updated(solution, old_time, old_dnf, db)
+        InvalidationService.publish(solution.puzzle, user_id, db)
         db.commit()
+
+        HistoryService.invalidate(solution.puzzle, user_id)
+        VersionService.mark_changed(user_id)
         
         return solution
     
     @classmethod
-    def delete_solution(cls, id: str, db: Session):
+    def delete_solution(cls, id: str, user_id: UUID, db: Session):
         """
         Delete an existing solution from the database.
 
         Args:
             id (str): The ID of the solution to delete.
+            user_id (UUID): The owner of the solution.
             db (Session): The database session to use for deleting the solution.
 
         Returns:
@@ -134,25 +270,37 @@ class SolutionService:
         Raises:
             HTTPException: If the solution with the given ID is not found.
         """
-        solution: Solution | None = get_model_by_id(Solution, id, db)
+        solution: Solution | None = get_model_by_id(Solution, id, db, user_id)
 
         if solution is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solution with this id wasn't found.")
 
+        puzzle = solution.puzzle
         db.delete(solution)
+        db.flush()
+
+        SummaryService.on_solution_deleted(solution, db)
+        DistributionService.on_solution_deleted(solution, db)
+        SessionService.on_solution_deleted(solution, db)
+        InvalidationService.publish(puzzle, user_id, db)
         db.commit()
 
+        HistoryService.invalidate(puzzle, user_id)
+        VersionService.mark_changed(user_id)
+
         headers = {"HX-Trigger": "new_current"}
         return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
 
 
     @classmethod 
-    def get_current_averages(cls, puzzle: str, db: Session) -> CurrentAverages:
+    def get_current_averages(cls, puzzle: str, user_id: UUID, db: Session) -> CurrentAverages:
         """
         Calculate the current averages for a specific puzzle based on the most recent solutions.
+        Only the latest 100 solutions are loaded, that's the largest window.
 
         Args:
             puzzle (str): The type of puzzle to calculate averages for.
+            user_id (UUID): The owner of the solutions.
             db (Session): The database session to use for querying.
 
         Returns:
@@ -162,7 +310,7 @@ class SolutionService:
                 - "avg_twelve": The average of the latest twelve solutions.
                 - "mean_hundred": The mean of the latest hundred solutions.
         """
-        statement = select(Solution).where(Solution.puzzle == puzzle).order_by(desc(Solution.created_at))
+        statement = select(Solution).where(Solution.user_id == user_id, Solution.puzzle == puzzle).order_by(*NEWEST_FIRST).limit(100)
         latest: List[Solution] = db.execute(statement).scalars().all()
 
         mean_of_100 = get_avg_of(100, latest)
@@ -178,12 +326,65 @@ class SolutionService:
         }
     
     @classmethod
-    def get_personal_best(cls, puzzle: str, db: Session) -> CurrentPBs:
+    def get_current_window(cls, puzzle: str, key: str, user_id: UUID, db: Session) -> List[Solution]:
+        """
+        Retrieve the solutions of one current window, e.g. the latest 12 for "avg_twelve".
+
+        Args:
+            puzzle (str): The type of puzzle.
+            key (str): One of "single", "avg_five", "avg_twelve" or "mean_hundred".
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            List[Solution]: The solutions of the window, newest first. Empty if there aren't enough solutions yet.
+
+        Raises:
+            HTTPException: If the key isn't a known window.
+        """
+        if key not in HISTORY_METRICS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Unknown average {key}')
+
+        n, _ = HISTORY_METRICS[key]
+        statement = (
+            select(Solution)
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle)
+            .order_by(*NEWEST_FIRST)
+            .limit(n)
+        )
+        solutions: List[Solution] = db.execute(statement).scalars().all()
+
+        return solutions if len(solutions) == n else []
+
+    @classmethod
+    def get_personal_best_solutions(cls, id: str, user_id: UUID, db: Session) -> List[Solution]:
+        """
+        Retrieve the solutions of a personal best with a single joined query.
+
+        Args:
+            id (str): The ID of the personal best.
+            user_id (UUID): The owner of the personal best.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            List[Solution]: The solutions, newest first. Empty if there is no such personal best.
+        """
+        statement = (
+            select(Solution)
+            .join(SolutionPersonalBest, SolutionPersonalBest.solution_id == Solution.id)
+            .where(SolutionPersonalBest.personal_best_id == id, SolutionPersonalBest.user_id == user_id)
+            .order_by(*NEWEST_FIRST)
+        )
+        return db.execute(statement).scalars().all()
+
+    @classmethod
+    def get_personal_best(cls, puzzle: str, user_id: UUID, db: Session) -> CurrentPBs:
         """
         Retrieve the personal bests (PBs) for a specific puzzle.
 
         Args:
             puzzle (str): The type of puzzle to retrieve personal bests for.
+            user_id (UUID): The owner of the personal bests.
             db (Session): The database session to use for querying.
 
         Returns:
@@ -194,9 +395,28 @@ class SolutionService:
                 - "mean_hundred": The best mean of a hundred solutions.
               Each entry includes the PB object and a time string representation.
         """
-        statement = select(PersonalBest).where(PersonalBest.puzzle == puzzle)
+        statement = select(PersonalBest).where(PersonalBest.user_id == user_id, PersonalBest.puzzle == puzzle)
+        PBs: List[PersonalBest] = db.execute(statement).scalars().all()
+
+        return cls._to_current_pbs(PBs)
+
+    @classmethod
+    def get_personal_bests(cls, puzzles: List[str], user_id: UUID, db: Session) -> Dict[str, CurrentPBs]:
+        """
+        Retrieve the personal bests of several puzzles with a single query, e.g. for the index page.
+
+        Returns:
+            Dict[str, CurrentPBs]: The personal bests of every puzzle, as returned by `get_personal_best`.
+        """
+        statement = select(PersonalBest).where(PersonalBest.user_id == user_id, PersonalBest.puzzle.in_(puzzles))
         PBs: List[PersonalBest] = db.execute(statement).scalars().all()
 
+        return {
+            puzzle: cls._to_current_pbs([pb for pb in PBs if pb.puzzle == puzzle]) for puzzle in puzzles
+        }
+
+    @classmethod
+    def _to_current_pbs(cls, PBs: List[PersonalBest]) -> CurrentPBs:
         pbs_dict = {
             pb.avg_of: pb for pb in PBs
         }
@@ -223,7 +443,7 @@ class SolutionService:
     @classmethod
     def set_new_personal_best(cls, old: PersonalBest, new: AverageDetails, db: Session):
         """
-        Set a new personal best (PB) for a specific puzzle and update the database.
+        Set a new personal best (PB) for a specific puzzle and update the database. Doesn't commit.
 
         Args:
             old (PersonalBest): The current personal best to be replaced. Can be None if no PB exists.
@@ -234,28 +454,29 @@ class SolutionService:
             PersonalBest: The newly created personal best record.
         """
         puzzle = new['solutions'][0].puzzle
+        user_id = new['solutions'][0].user_id
         avg_of = len(new['solutions'])
 
         if old is not None:
             db.delete(old)
 
-        pb = PersonalBest(time=new['time'], puzzle=puzzle, avg_of=avg_of)
+        pb = PersonalBest(time=new['time'], puzzle=puzzle, avg_of=avg_of, user_id=user_id)
         db.add(pb)
-        db.commit()
-        db.refresh(pb)
+        db.flush()
 
         for solution in new['solutions']:
-            item = SolutionPersonalBest(solution=solution, personal_best=pb)
+            item = SolutionPersonalBest(solution=solution, personal_best=pb, user_id=user_id)
             db.add(item)
 
-        db.commit()
+        db.flush()
         return pb
     
 
     @classmethod
     def update_personal_best(cls, pbs: CurrentPBs, current: CurrentAverages, db: Session):
         """
-        Update personal bests for a specific puzzle if current averages are better.
+        Update personal bests for a specific puzzle if current averages are better. Doesn't commit,
+        so all the PBs of a puzzle change in a single transaction of the caller.
 
         Args:
             pbs (CurrentPBs): The existing personal bests for the puzzle.
@@ -274,4 +495,99 @@ class SolutionService:
                 cls.set_new_personal_best(pbs[key]['pb'], value, db)
                 trigger_UI_change = True
 
-        return trigger_UI_change
\ No newline at end of file
+        return trigger_UI_change
+
+    @classmethod
+    def get_best_new_averages(cls, puzzle: str, user_id: UUID, since: datetime, db: Session) -> CurrentAverages:
+        """
+        Find the best single, ao5, ao12 and mo100 among the windows that end at a solution created
+        at or after `since`, i.e. the PB candidates of solutions that weren't checked yet.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            since (datetime): The created_at of the oldest unchecked solution.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            CurrentAverages: The best window of every kind in the same shape `get_current_averages` returns.
+        """
+        statement = select(func.count()).select_from(Solution).where(
+            Solution.user_id == user_id,
+            Solution.puzzle == puzzle,
+            Solution.created_at >= since
+        )
+        new_count: int = db.execute(statement).scalar_one()
+
+        statement = (
+            select(Solution)
+            .where(Solution.user_id == user_id, Solution.puzzle == puzzle)
+            .order_by(*NEWEST_FIRST)
+            .limit(new_count + 99)
+        )
+        latest: List[Solution] = db.execute(statement).scalars().all()
+        chronological = [s.time for s in reversed(latest)]
+
+        result = {}
+        for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+            averages = get_rolling_avg_of(n, chronological, omit_best_worst)
+            # averages[j] is the window ending at the (j + n)-th oldest solution
+            first = max(0, len(latest) - n - new_count + 1)
+
+            if first >= len(averages):
+                result[key] = get_avg_of(n, [], omit_best_worst)
+                continue
+
+            best = first + int(averages[first:].argmin())
+            result[key] = get_avg_of(n, latest[len(latest) - n - best:], omit_best_worst)
+
+        return result
+
+    @classmethod
+    def get_solutions_by_scramble(cls, scramble: bytes, puzzle: str, user_id: UUID, db: Session) -> List[Solution]:
+        """
+        Retrieve all solutions of a user done on the same scramble, through the scramble_hash index.
+
+        Args:
+            scramble (bytes): The packed scramble.
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            List[Solution]: The solutions, oldest first.
+        """
+        statement = (
+            select(Solution)
+            .where(
+                Solution.scramble_hash == ScrambleService.hash(scramble),
+                # the hash only narrows it down, compare the moves too in case of a collision
+                Solution.scramble == scramble,
+                Solution.user_id == user_id,
+                Solution.puzzle == puzzle
+            )
+            .order_by(*OLDEST_FIRST)
+        )
+        return db.execute(statement).scalars().all()
+
+    @classmethod
+    def _encode_scramble(cls, scramble: str) -> bytes:
+        try:
+            return ScrambleService.encode(ScrambleService.parse(scramble))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid scramble format')
+
+    @classmethod
+    def _mark_pending_pb_update(cls, puzzle: str, user_id: UUID, db: Session, since: datetime | None = None):
+        """
+        Remember that the windows of new solutions still have to be checked for PBs. The marker keeps
+        the oldest unchecked created_at, `since` defaults to NOW(), the created_at of solutions inserted
+        in this transaction.
+        """
+        since = since if since is not None else func.now()
+        statement = insert(PendingPbUpdate).values(user_id=user_id, puzzle=puzzle, since=since)
+        statement = statement.on_conflict_do_update(
+            index_elements=[PendingPbUpdate.user_id, PendingPbUpdate.puzzle],
+            set_={'since': func.least(PendingPbUpdate.since, statement.excluded.since)}
+        )
+        db.execute(statement)
@@ -0,0 +1,291 @@
+from collections import defaultdict
+from typing import Dict, List
+from uuid import UUID
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+
+from app.model.puzzle_summary import PuzzleSummary
+from app.model.solution import Solution
+from app.services.archive_service import ArchiveService
+from app.services.averages_service import AveragesService
+from app.types.averages import CurrentAverages, LatestAverage
+from app.types.summary import SummaryDetails
+from app.utils import float_to_timestr
+
+
+class SummaryService:
+    @classmethod
+    def get_summary(cls, puzzle: str, user_id: UUID, db: Session) -> PuzzleSummary | None:
+        """
+        Retrieve the materialized summary of a puzzle.
+
+        Args:
+            puzzle (str): The type of puzzle.
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            PuzzleSummary | None: The summary row, or None if the user has no solutions of that puzzle yet.
+        """
+        return db.get(PuzzleSummary, (user_id, puzzle))
+
+    @classmethod
+    def get_summaries(cls, user_id: UUID, db: Session) -> Dict[str, PuzzleSummary]:
+        """
+        Retrieve the summaries of all puzzles of a user in a single query.
+
+        Args:
+            user_id (UUID): The owner of the solutions.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            dict: The summaries keyed by puzzle, puzzles without solutions are missing.
+        """
+        statement = select(PuzzleSummary).where(PuzzleSummary.user_id == user_id)
+        summaries: List[PuzzleSummary] = db.execute(statement).scalars().all()
+
+        return {summary.puzzle: summary for summary in summaries}
+
+    @classmethod
+    def to_current_averages(cls, summary: PuzzleSummary | None) -> CurrentAverages:
+        """
+        Turn the latest values stored in a summary into the same shape `get_current_averages` returns.
+        The solutions of the windows aren't loaded, so `solutions` is always None.
+        """
+        def details(time: float | None):
+            return {
+                'time_str': float_to_timestr(time),
+                'time': time,
+                'solutions': None
+            }
+
+        if summary is None:
+            return {key: details(None) for key in ('single', 'avg_five', 'avg_twelve', 'mean_hundred')}
+
+        return {
+            'single': details(summary.single),
+            'avg_five': details(summary.avg_five),
+            'avg_twelve': details(summary.avg_twelve),
+            'mean_hundred': details(summary.mean_hundred)
+        }
+
+    @classmethod
+    def to_details(cls, summary: PuzzleSummary | None) -> SummaryDetails:
+        """
+        Format a summary for the templates.
+        """
+        if summary is None:
+            return {
+                'solve_count': 0,
+                'dnf_count': 0,
+                'mean_str': float_to_timestr(None),
+                'deviation_str': float_to_timestr(None),
+                'best_single_str': float_to_timestr(None)
+            }
+
+        return {
+            'solve_count': summary.solve_count,
+            'dnf_count': summary.dnf_count,
+            'mean_str': float_to_timestr(summary.mean),
+            'deviation_str': float_to_timestr(summary.standard_deviation),
+            'best_single_str': float_to_timestr(summary.best_single)
+        }
+
+    @classmethod
+    def on_solution_created(cls, solution: Solution, db: Session):
+        """
+        Add a freshly inserted (and flushed) solution to its summary. Doesn't commit, so the summary
+        is written in the same transaction as the solution.
+        """
+        cls.on_solutions_created([solution], db)
+
+    @classmethod
+    def on_solutions_created(cls, solutions: List[Solution], db: Session):
+        """
+        Add a batch of inserted solutions of one user and puzzle to their summary, the latest
+        averages are recomputed once for the whole batch. Doesn't commit.
+        """
+        summary = cls._lock_summary(solutions[0].puzzle, solutions[0].user_id, db)
+
+        for solution in solutions:
+            summary.solve_count += 1
+            if solution.dnf:
+                summary.dnf_count += 1
+            else:
+                cls._add_time(summary, solution.time)
+
+        cls._refresh_latest(summary, db)
+
+    @classmethod
+    def on_solution_updated(cls, solution: Solution, old_time: float, old_dnf: bool, db: Session):
+        """
+        Apply a penalty or DNF change of a flushed solution to its summary. Doesn't commit.
+
+        Args:
+            solution (Solution): The solution after the update.
+            old_time (float): The time of the solution before the update.
+            old_dnf (bool): The DNF flag of the solution before the update.
+            db (Session): The database session used for the update.
+        """
+        summary = cls._lock_summary(solution.puzzle, solution.user_id, db)
+
+        if not old_dnf:
+            cls._remove_time(summary, old_time)
+        if not solution.dnf:
+            cls._add_time(summary, solution.time)
+
+        summary.dnf_count += int(solution.dnf) - int(old_dnf)
+
+        if not old_dnf and old_time == summary.best_single:
+            cls._refresh_best_single(summary, db)
+
+        cls._refresh_latest(summary, db)
+
+    @classmethod
+    def on_solution_deleted(cls, solution: Solution, db: Session):
+        """
+        Remove a deleted (and flushed) solution from its summary. Doesn't commit.
+        """
+        summary = cls._lock_summary(solution.puzzle, solution.user_id, db)
+
+        summary.solve_count -= 1
+        if solution.dnf:
+            summary.dnf_count -= 1
+        else:
+            cls._remove_time(summary, solution.time)
+
+            if solution.time == summary.best_single:
+                cls._refresh_best_single(summary, db)
+
+        cls._refresh_latest(summary, db)
+
+    @classmethod
+    def rebuild(cls, db: Session, user_id: UUID | None = None) -> int:
+        """
+        Regenerate the summaries from scratch out of the solutions table and the archive and commit them.
+
+        Args:
+            db (Session): The database session to use.
+            user_id (UUID | None): Only rebuild the summaries of this user, defaults to all users.
+
+        Returns:
+            int: The number of rebuilt summaries.
+        """
+        finished_time = case((Solution.dnf == False, Solution.time), else_=None)
+        statement = select(
+            Solution.user_id,
+            Solution.puzzle,
+            func.count(),
+            func.count().filter(Solution.dnf == True),
+            func.coalesce(func.sum(finished_time), 0),
+            func.coalesce(func.sum(finished_time * finished_time), 0),
+            func.min(finished_time)
+        ).group_by(Solution.user_id, Solution.puzzle)
+
+        clear_statement = delete(PuzzleSummary).returning(PuzzleSummary.user_id, PuzzleSummary.puzzle, PuzzleSummary.version, PuzzleSummary.pb_version)
+
+        if user_id is not None:
+            statement = statement.where(Solution.user_id == user_id)
+            clear_statement = clear_statement.where(PuzzleSummary.user_id == user_id)
+
+        # the versions carry over (and count the rebuild as a change), a version handed out again
+        # would look like one the workers already applied
+        summaries: Dict[tuple[UUID, str], PuzzleSummary] = {
+            (owner, puzzle): PuzzleSummary(user_id=owner, puzzle=puzzle, version=version + 1, pb_version=pb_version)
+            for owner, puzzle, version, pb_version in db.execute(clear_statement)
+        }
+
+        for owner, puzzle, solve_count, dnf_count, time_sum, time_sum_sq, best_single in db.execute(statement):
+            summary = summaries.setdefault((owner, puzzle), PuzzleSummary(user_id=owner, puzzle=puzzle))
+            summary.solve_count = solve_count
+            summary.dnf_count = dnf_count
+            summary.time_sum = time_sum
+            summary.time_sum_sq = time_sum_sq
+            summary.best_single = best_single
+
+        for owner, puzzle in ArchiveService.iter_archives(user_id):
+            summary = summaries.setdefault((owner, puzzle), PuzzleSummary(user_id=owner, puzzle=puzzle))
+            solve_count, dnf_count = ArchiveService.get_counts(puzzle, owner, db)
+            times = ArchiveService.get_finished_times(puzzle, owner, db)
+
+            summary.solve_count += solve_count
+            summary.dnf_count += dnf_count
+            summary.time_sum += float(times.sum())
+            summary.time_sum_sq += float((times * times).sum())
+            if len(times) > 0 and (summary.best_single is None or times.min() < summary.best_single):
+                summary.best_single = float(times.min())
+
+        puzzles: Dict[UUID, List[str]] = defaultdict(list)
+        for summary in summaries.values():
+            db.add(summary)
+            puzzles[summary.user_id].append(summary.puzzle)
+
+        # one query per user with the sql engine
+        for owner, owner_puzzles in puzzles.items():
+            latest = AveragesService.get_latest(owner_puzzles, owner, db)
+            for puzzle in owner_puzzles:
+                cls._set_latest(summaries[(owner, puzzle)], latest[puzzle])
+
+        db.commit()
+        return len(summaries)
+
+    @classmethod
+    def _lock_summary(cls, puzzle: str, user_id: UUID, db: Session) -> PuzzleSummary:
+        """
+        Fetch the summary row with a row lock, creating it first if it doesn't exist,
+        so concurrent writes of the same user and puzzle apply their changes one after another.
+        """
+        db.execute(insert(PuzzleSummary).values(user_id=user_id, puzzle=puzzle).on_conflict_do_nothing())
+
+        statement = (
+            select(PuzzleSummary)
+            .where(PuzzleSummary.user_id == user_id, PuzzleSummary.puzzle == puzzle)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return db.execute(statement).scalar_one()
+
+    @classmethod
+    def _add_time(cls, summary: PuzzleSummary, time: float):
+        summary.time_sum += time
+        summary.time_sum_sq += time ** 2
+
+        if summary.best_single is None or time < summary.best_single:
+            summary.best_single = time
+
+    @classmethod
+    def _remove_time(cls, summary: PuzzleSummary, time: float):
+        summary.time_sum -= time
+        summary.time_sum_sq -= time ** 2
+
+    @classmethod
+    def _refresh_best_single(cls, summary: PuzzleSummary, db: Session):
+        statement = select(func.min(Solution.time)).where(
+            Solution.user_id == summary.user_id,
+            Solution.puzzle == summary.puzzle,
+            Solution.dnf == False
+        )
+        best_single = db.execute(statement).scalar_one_or_none()
+
+        archived = ArchiveService.get_best_single(summary.puzzle, summary.user_id)
+        if archived is not None and (best_single is None or archived < best_single):
+            best_single = archived
+
+        summary.best_single = best_single
+
+    @classmethod
+    def _refresh_latest(cls, summary: PuzzleSummary, db: Session):
+        """
+        Recompute the latest single, ao5, ao12 and mo100 from the newest 100 solutions only.
+        """
+        latest = AveragesService.get_latest([summary.puzzle], summary.user_id, db)
+        cls._set_latest(summary, latest[summary.puzzle])
+
+    @classmethod
+    def _set_latest(cls, summary: PuzzleSummary, latest: Dict[str, LatestAverage]):
+        for key, average in latest.items():
+            setattr(summary, key, average['time'])
+            setattr(summary, 'single_id' if key == 'single' else f'{key}_window_start_id', average['window_start_id'])
+
+        summary.updated_at = func.now()
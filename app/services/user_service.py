@@ -0,0 +1,143 @@
+import hashlib, hmac, secrets
+from uuid import UUID
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlmodel import Session
+
+from app.constants import PASSWORD_HASH_ITERATIONS, SESSION_SECRET, USER_COOKIE
+from app.db.read_routing import get_read_db
+from app.model.user import User
+from app.utils import is_valid_uuid
+
+
+class UserService:
+    @classmethod
+    def create_user(cls, name: str, password: str, db: Session) -> User:
+        """
+        Create a new user account.
+
+        Args:
+            name (str): The unique name of the user.
+            password (str): The plain text password, only its salted hash is stored.
+            db (Session): The database session to use for inserting the user.
+
+        Returns:
+            User: The created user object.
+
+        Raises:
+            HTTPException: If the name is empty or already taken.
+        """
+        name = name.strip()
+
+        if name == '' or password == '':
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Name and password are required')
+
+        if cls.get_user_by_name(name, db) is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'User {name} already exists')
+
+        user = User(name=name, password_hash=cls._hash_password(password))
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        return user
+
+    @classmethod
+    def authenticate(cls, name: str, password: str, db: Session) -> User:
+        """
+        Check the credentials of a user.
+
+        Args:
+            name (str): The name of the user.
+            password (str): The plain text password to verify.
+            db (Session): The database session to use for querying.
+
+        Returns:
+            User: The authenticated user.
+
+        Raises:
+            HTTPException: If the user doesn't exist or the password doesn't match.
+        """
+        user = cls.get_user_by_name(name.strip(), db)
+
+        if user is None or not cls._verify_password(password, user.password_hash):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid name or password')
+
+        return user
+
+    @classmethod
+    def get_user_by_name(cls, name: str, db: Session) -> User | None:
+        return db.execute(select(User).where(User.name == name)).scalar_one_or_none()
+
+    @classmethod
+    def exists(cls, user_id: UUID, db: Session) -> bool:
+        return db.execute(select(User.id).where(User.id == user_id)).scalar_one_or_none() is not None
+
+    @classmethod
+    def create_session_cookie(cls, user: User) -> str:
+        """
+        The value of the session cookie of a user, the id and its HMAC as "id.signature",
+        so the id can't be swapped for somebody else's.
+        """
+        return f'{user.id}.{cls._sign(str(user.id))}'
+
+    @classmethod
+    def read_session_cookie(cls, value: str | None) -> UUID | None:
+        """
+        The user id of a session cookie created by `create_session_cookie`, None if the cookie
+        is missing, malformed or its signature doesn't match.
+        """
+        if value is None:
+            return None
+
+        user_id, _, signature = value.partition('.')
+
+        if not is_valid_uuid(user_id) or not hmac.compare_digest(cls._sign(user_id), signature):
+            return None
+
+        return UUID(user_id)
+
+    @classmethod
+    def _sign(cls, value: str) -> str:
+        return hmac.new(SESSION_SECRET.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def _hash_password(cls, password: str, salt: bytes | None = None) -> str:
+        """
+        Hash a password with PBKDF2, the result is stored as "salt$hash" in hex.
+        """
+        salt = salt if salt is not None else secrets.token_bytes(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+
+        return f'{salt.hex()}${digest.hex()}'
+
+    @classmethod
+    def _verify_password(cls, password: str, password_hash: str) -> bool:
+        salt, _ = password_hash.split('$', 1)
+        return hmac.compare_digest(cls._hash_password(password, bytes.fromhex(salt)), password_hash)
+
+
+def get_optional_user_id(request: Request, db: Session = Depends(get_read_db, scope='function')) -> UUID | None:
+    """
+    Reads the id of the logged in user from the signed session cookie, returns None if there is none
+    or the user doesn't exist anymore (a stale cookie would fail on the first write otherwise).
+
+    The session is closed as soon as the endpoint returns, a streaming response (the PB events)
+    would hold on to its connection for as long as the client stays connected otherwise.
+    """
+    user_id = UserService.read_session_cookie(request.cookies.get(USER_COOKIE))
+
+    if user_id is None or not UserService.exists(user_id, db):
+        return None
+
+    return user_id
+
+
+def get_user_id(user_id: UUID | None = Depends(get_optional_user_id)) -> UUID:
+    """
+    Same as `get_optional_user_id`, but responds with 401 when nobody is logged in.
+    """
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='You need to log in first')
+
+    return user_id
@@ -0,0 +1,131 @@
+import hashlib, threading, time
+from collections import OrderedDict
+from typing import Dict, List
+from uuid import UUID
+from fastapi import Depends, Request, Response, status
+from sqlalchemy import select
+from sqlmodel import Session
+
+from app.constants import READ_YOUR_WRITES_WINDOW, TEMPLATES
+from app.db.read_routing import read_session, reads_from_primary
+from app.model.puzzle_summary import PuzzleSummary
+from app.services.user_service import get_optional_user_id
+
+
+class VersionService:
+    """
+    Read endpoints derive their ETags from the persisted versions of `puzzle_summary` that every
+    mutation bumps (see InvalidationService.publish), so a conditional GET is answered with one primary
+    key lookup before the data is read or Jinja runs, by any worker.
+
+    The only state of the worker is when each user last changed something, committed by this worker or
+    reported by a NOTIFY of InvalidationService, to route the reads of recently changed data to the primary.
+    """
+    # time.monotonic() of the last change per user, oldest first, see get_versioned_read_db
+    _changed_at: "OrderedDict[UUID, float]" = OrderedDict()
+    _lock = threading.Lock()
+    # digest of the template sources, part of every ETag so a deploy with other templates never answers 304
+    _templates_digest: str | None = None
+
+    @classmethod
+    def mark_changed(cls, user_id: UUID):
+        """
+        Remember that data of the user changed, call it after the change is committed.
+        """
+        now = time.monotonic()
+
+        with cls._lock:
+            cls._changed_at.pop(user_id, None)
+            cls._changed_at[user_id] = now
+            # only READ_YOUR_WRITES_WINDOW is ever asked for, older changes don't matter anymore
+            while next(iter(cls._changed_at.values())) < now - READ_YOUR_WRITES_WINDOW:
+                cls._changed_at.popitem(last=False)
+
+    @classmethod
+    def changed_within(cls, user_id: UUID, seconds: float) -> bool:
+        """
+        Whether any puzzle of the user changed within the last `seconds`, in any worker.
+        Changes are only remembered for READ_YOUR_WRITES_WINDOW seconds.
+        """
+        with cls._lock:
+            changed_at = cls._changed_at.get(user_id)
+            if changed_at is not None and changed_at < time.monotonic() - seconds:
+                del cls._changed_at[user_id]
+                changed_at = None
+
+        return changed_at is not None
+
+    @classmethod
+    def get_etag(cls, user_id: UUID, puzzles: List[str], db: Session, *parts: str) -> str:
+        """
+        Build a strong ETag from the persisted versions (`puzzle_summary.version` and `pb_version`) of the
+        given puzzles, in one query. Every worker reads the same versions, so a tag issued by one of them
+        is answered with 304 by any other, also after a restart. The versions are read before the data,
+        the response is never older than its tag.
+
+        Args:
+            user_id (UUID): The logged in user, responses are per user.
+            puzzles (List[str]): The puzzles the response is rendered from.
+            db (Session): The database session the response is read with.
+            *parts (str): Anything else the response depends on, e.g. a pagination cursor.
+
+        Returns:
+            str: The quoted ETag.
+        """
+        statement = select(PuzzleSummary.puzzle, PuzzleSummary.version, PuzzleSummary.pb_version).where(
+            PuzzleSummary.user_id == user_id,
+            PuzzleSummary.puzzle.in_(puzzles)
+        )
+        # no summary yet, the first change of any kind bumps the version past 0
+        persisted = {puzzle: (version, pb_version) for puzzle, version, pb_version in db.execute(statement).all()}
+        versions = ','.join(f'{puzzle}:{":".join(map(str, persisted.get(puzzle, (0, 0))))}' for puzzle in puzzles)
+
+        digest = hashlib.blake2b(f'{cls._get_templates_digest()}|{user_id}|{versions}|{"|".join(parts)}'.encode(), digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    @classmethod
+    def _get_templates_digest(cls) -> str:
+        # computed on first use, not at import, see STARTUP_IMPORT_BUDGET
+        if cls._templates_digest is None:
+            loader = TEMPLATES.env.loader
+            digest = hashlib.blake2b(digest_size=8)
+            for name in loader.list_templates():
+                if not name.endswith('.html'):
+                    continue
+                digest.update(name.encode())
+                digest.update(loader.get_source(TEMPLATES.env, name)[0].encode())
+            cls._templates_digest = digest.hexdigest()
+
+        return cls._templates_digest
+
+    @classmethod
+    def is_not_modified(cls, etag: str, if_none_match: str | None) -> bool:
+        if if_none_match is None:
+            return False
+
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+
+    @classmethod
+    def get_cache_headers(cls, etag: str) -> Dict[str, str]:
+        return {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Vary': 'Cookie'
+        }
+
+    @classmethod
+    def not_modified_response(cls, etag: str) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cls.get_cache_headers(etag))
+
+
+def get_versioned_read_db(request: Request, user_id: UUID | None = Depends(get_optional_user_id)):
+    """
+    The session dependency of read only endpoints answering with an ETag. The ETag is read from the
+    same session as the data, so a replica that hasn't replayed a change yet answers with the old data
+    under the old ETag, never with stale data under a new one. Reads of a user whose data changed within
+    `READ_YOUR_WRITES_WINDOW` (through any client) still go to the primary, like the reads of a client
+    that just wrote something, so the other clients of the user see the change right away.
+    """
+    primary = reads_from_primary(request) or (user_id is not None and VersionService.changed_within(user_id, READ_YOUR_WRITES_WINDOW))
+    yield from read_session(primary)
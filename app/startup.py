@@ -0,0 +1,83 @@
+import logging, time
+from typing import Callable, Dict
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.constants import PUZZLES, STARTUP_DB_CONNECTIONS, TEMPLATES
+from app.db.database import engine, replica_engine
+from app.services.scramble_service import ScrambleService
+from app.utils import floats_to_timestrs, get_rolling_avg_of
+
+logger = logging.getLogger(__name__)
+
+
+def precompile_templates() -> int:
+    """
+    Compile every template under app/view, so the bytecode cache on disk holds all of them
+    and no request has to parse a template.
+
+    Returns:
+        int: The number of compiled templates.
+    """
+    names = TEMPLATES.env.list_templates(extensions=['html'])
+    for name in names:
+        TEMPLATES.get_template(name)
+
+    return len(names)
+
+
+def warm_up_numeric():
+    """
+    Import NumPy and build the lookup tables of the time formatting.
+    """
+    floats_to_timestrs([0.0])
+    get_rolling_avg_of(5, [1.0, 2.0, 3.0, 4.0, 5.0], True)
+
+
+def warm_up_scrambles():
+    for puzzle in PUZZLES:
+        ScrambleService.generate_scramble(puzzle)
+
+
+def warm_up_db_pool():
+    """
+    Open a few connections to the primary and the replica and put them back into the pools. A database that isn't
+    reachable yet is only logged, requests will connect once it's up.
+    """
+    connections = []
+    try:
+        for pool_engine in {engine, replica_engine}:
+            for _ in range(STARTUP_DB_CONNECTIONS):
+                connection = pool_engine.connect()
+                connections.append(connection)
+                connection.execute(text('SELECT 1'))
+    except OperationalError as e:
+        logger.warning('Database pool warm-up failed: %s', e)
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Do the work the first requests of a fresh worker would otherwise pay for. Meant to run
+    in the lifespan hook, before the worker accepts requests.
+
+    Returns:
+        dict: The seconds each step took, keyed by step name.
+    """
+    steps: Dict[str, Callable[[], object]] = {
+        'numeric': warm_up_numeric,
+        'templates': precompile_templates,
+        'scrambles': warm_up_scrambles,
+        'db_pool': warm_up_db_pool
+    }
+
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+
+    logger.info('Warm-up done in %.3fs (%s)', sum(timings.values()), ', '.join(f'{name} {seconds:.3f}s' for name, seconds in timings.items()))
+    return timings
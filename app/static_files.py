@@ -0,0 +1,89 @@
+import gzip, os
+from typing import Dict, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.constants import STATIC_CACHE_MAX_AGE, STATIC_COMPRESS_MIN_SIZE, STATIC_COMPRESSIBLE_SUFFIXES
+
+try:
+    import brotli
+except ImportError:     # brotli is optional, gzip alone is still a big win
+    brotli = None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that compresses the text assets once at startup and serves the brotli or gzip
+    copy to clients that accept it, with Cache-Control on every response.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # full path -> (mtime, {encoding: body})
+        self._compressed: Dict[str, Tuple[float, Dict[str, bytes]]] = {}
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                self._get_variants(full_path, os.stat(full_path))
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        variants = self._get_variants(str(full_path), stat_result)
+        encoding = self._pick_encoding(request_headers.get('accept-encoding', ''), variants)
+
+        if encoding is None or status_code != 200:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_CACHE_MAX_AGE}'
+            if variants:
+                response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        plain = FileResponse(full_path, stat_result=stat_result)
+        headers = {
+            'ETag': f'{plain.headers["etag"][:-1]}-{encoding}"',
+            'Last-Modified': plain.headers['last-modified'],
+            'Cache-Control': f'public, max-age={STATIC_CACHE_MAX_AGE}',
+            'Content-Encoding': encoding,
+            'Vary': 'Accept-Encoding'
+        }
+
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None and headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')]:
+            return NotModifiedResponse(Headers(headers))
+
+        return Response(variants[encoding], media_type=plain.media_type, headers=headers)
+
+    def _get_variants(self, full_path: str, stat_result: os.stat_result) -> Dict[str, bytes]:
+        """
+        Returns the compressed copies of a file, (re)compressing it when it changed on disk.
+        """
+        cached = self._compressed.get(full_path)
+        if cached is not None and cached[0] == stat_result.st_mtime:
+            return cached[1]
+
+        variants = {}
+        if os.path.splitext(full_path)[1] in STATIC_COMPRESSIBLE_SUFFIXES and stat_result.st_size >= STATIC_COMPRESS_MIN_SIZE:
+            with open(full_path, 'rb') as file:
+                content = file.read()
+
+            variants['gzip'] = gzip.compress(content, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(content, quality=11)
+
+        self._compressed[full_path] = (stat_result.st_mtime, variants)
+        return variants
+
+    def _pick_encoding(self, accept_encoding: str, variants: Dict[str, bytes]) -> str | None:
+        accepted = set()
+        for item in accept_encoding.split(','):
+            token, _, params = item.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(token.strip().lower())
+
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and encoding in accepted:
+                return encoding
+
+        return None
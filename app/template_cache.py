@@ -0,0 +1,13 @@
+import os
+from jinja2 import FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache that creates its directory when it writes the first template,
+    so importing the app has no side effects on the file system.
+    """
+    def dump_bytecode(self, bucket: Bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
@@ -1,4 +1,5 @@
 from typing import List, TypedDict
+from uuid import UUID
 from app.model.personal_best import PersonalBest
 from app.model.solution import Solution
 
@@ -7,6 +8,11 @@ class AverageDetails(TypedDict):
     time: float | None
     solutions: List[Solution] | None
 
+class LatestAverage(TypedDict):
+    time: float | None
+    # the oldest solution of the window
+    window_start_id: UUID | None
+
 class CurrentAverages(TypedDict):
     single: AverageDetails
     avg_five: AverageDetails
@@ -0,0 +1,12 @@
+from datetime import datetime
+from uuid import UUID
+from sqlmodel import SQLModel
+
+class BatchSolution(SQLModel):
+    key: UUID
+    solution_time: str
+    scramble: str
+    penalty: bool = False
+    dnf: bool = False
+    # when the solve happened on the client, defaults to the time it reaches the server
+    created_at: datetime | None = None
@@ -0,0 +1,24 @@
+from typing import List, TypedDict
+
+class HistogramBucket(TypedDict):
+    start: float
+    end: float
+    count: int
+    range_str: str
+
+class QuantileDetails(TypedDict):
+    quantile: float
+    time: float | None
+    time_str: str
+
+class ThresholdDetails(TypedDict):
+    threshold: float
+    threshold_str: str
+    count: int
+
+class Distribution(TypedDict):
+    count: int
+    relative_accuracy: float
+    quantiles: List[QuantileDetails]
+    thresholds: List[ThresholdDetails]
+    histogram: List[HistogramBucket]
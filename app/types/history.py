@@ -0,0 +1,8 @@
+from typing import List, TypedDict
+
+class History(TypedDict):
+    puzzle: str
+    metric: str
+    total: int
+    x: List[float]
+    y: List[float]
@@ -0,0 +1,11 @@
+from typing import TypedDict
+
+class SessionDetails(TypedDict):
+    id: str
+    name: str
+    solve_count: int
+    dnf_count: int
+    mean_str: str
+    best_single_str: str
+    best_avg_five_str: str
+    best_avg_twelve_str: str
@@ -0,0 +1,8 @@
+from typing import TypedDict
+
+class SummaryDetails(TypedDict):
+    solve_count: int
+    dnf_count: int
+    mean_str: str
+    deviation_str: str
+    best_single_str: str
@@ -1,14 +1,20 @@
-import copy
+from __future__ import annotations
+import copy, functools
 import math, re
-from decimal import Decimal
-from typing import List
+from typing import Iterable, List
 from uuid import UUID
-import numpy as np
 
 from app.constants import CUBES
+from app.lazy_import import LazyModule
 from app.model.solution import Solution
 from app.types.averages import AverageDetails
 
+np = LazyModule('numpy')
+
+
+TIME_PATTERN = re.compile(r'^(?:([1-5]?[0-9]):)?([0-5]?[0-9])(\.[0-9]{1,3})?$')
+EMPTY_TIME_STR = '--:--.--'
+
 
 def timestr_to_float(time_str: str):
     """
@@ -22,7 +28,7 @@ def timestr_to_float(time_str: str):
     """
     time_str = time_str.replace(',', '.')
 
-    match = re.match(r'^(?:([1-5]?[0-9]):)?([0-5]?[0-9])(\.[0-9]{1,3})?$', time_str)
+    match = TIME_PATTERN.match(time_str)
     if not match:
         return None
     
@@ -41,19 +47,125 @@ def float_to_timestr(val: float | None):
     Converts a float representing time in seconds into a formatted time string.
 
     Args:
-        val (float | None): The time in seconds to convert.
+        val (float | None): The time in seconds to convert, None or NaN for a missing time.
 
     Returns:
         str: A formatted time string in the format "mm:ss" or "ss.sss", where "min" or "s" is appended depending on the value.
     """
-    if val is None:
-        return '--:--.--'
+    if val is None or math.isnan(val):
+        return EMPTY_TIME_STR
 
     minutes = math.floor(val / 60)
-    seconds = val - (60 * minutes)
+    # + 0.0 turns -0.0 into 0.0, which would be formatted as "-0.00s"
+    seconds = val - (60 * minutes) + 0.0
 
+    # float formatting rounds the exact binary value half to even, just like Decimal(seconds) did
     minutes_str = f'{minutes}:' if minutes > 0 else ''
-    return f'{minutes_str}{"0" if minutes > 0 and seconds < 10 else ""}{Decimal(seconds):.2f}{"min" if minutes > 0 else "s"}'
+    return f'{minutes_str}{"0" if minutes > 0 and seconds < 10 else ""}{float(seconds):.2f}{"min" if minutes > 0 else "s"}'
+
+
+def timestrs_to_floats(time_strs: Iterable[str]) -> np.ndarray:
+    """
+    Converts many time strings at once, the batch counterpart of `timestr_to_float`.
+
+    Args:
+        time_strs (Iterable[str]): The time strings to convert.
+
+    Returns:
+        np.ndarray: The times in seconds, NaN for every invalid string.
+    """
+    match = TIME_PATTERN.match
+    result = []
+
+    for time_str in time_strs:
+        parsed = match(time_str.replace(',', '.'))
+
+        if parsed is None:
+            result.append(math.nan)
+            continue
+
+        minutes, seconds, fraction = parsed.groups()
+        result.append((60 * int(minutes) if minutes is not None else 0) + float(seconds + (fraction or '')))
+
+    return np.array(result, dtype=np.float64)
+
+
+def floats_to_timestrs(values: Iterable[float | None] | np.ndarray) -> np.ndarray:
+    """
+    Converts many times in seconds into time strings at once, byte for byte the same
+    as calling `float_to_timestr` on every value.
+
+    The rounding to hundredths is exact (half to even on the binary value, like the float
+    formatting) and done with array arithmetic, the digits come from lookup tables.
+
+    Args:
+        values (Iterable[float | None] | np.ndarray): The times in seconds, None or NaN for missing times.
+
+    Returns:
+        np.ndarray: An array of formatted time strings.
+    """
+    if not isinstance(values, np.ndarray):
+        values = np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+
+    values = values.astype(np.float64, copy=False)
+    valid = ~np.isnan(values)
+
+    vals = values[valid]
+    number_strs, minute_strs, fraction_strs = _digit_tables()
+    minutes = np.floor(vals / 60)
+    seconds = vals - 60 * minutes
+
+    hundredths = _round_hundredths(seconds)
+    # negative seconds, infinities and huge minutes are left to float_to_timestr
+    slow = (seconds < 0) | ~np.isfinite(seconds) | (minutes >= len(number_strs))
+    hundredths[slow] = 0
+
+    has_minutes = minutes > 0
+    minutes_str = np.where(has_minutes, minute_strs[np.clip(minutes, 0, len(number_strs) - 1).astype(np.int64)], '')
+    padding = np.where(has_minutes & (seconds < 10), '0', '')
+    seconds_str = np.char.add(number_strs[hundredths // 100], fraction_strs[hundredths % 100])
+    suffix = np.where(has_minutes, 'min', 's')
+
+    formatted = np.char.add(np.char.add(minutes_str, padding), np.char.add(seconds_str, suffix))
+    fallbacks = {i: float_to_timestr(float(vals[i])) for i in np.nonzero(slow)[0]}
+
+    width = max([len(EMPTY_TIME_STR), formatted.dtype.itemsize // 4] + [len(s) for s in fallbacks.values()])
+    formatted = formatted.astype(f'<U{width}')
+    for i, time_str in fallbacks.items():
+        formatted[i] = time_str
+
+    result = np.full(values.shape, EMPTY_TIME_STR, dtype=f'<U{width}')
+    result[valid] = formatted
+    return result
+
+
+def _round_hundredths(seconds: np.ndarray) -> np.ndarray:
+    """
+    Rounds non negative seconds to whole hundredths, half to even on the exact binary value.
+
+    `seconds * 100` alone can round a value just below a tie up to the tie, so the candidate is
+    compared with the exact midpoint instead: seconds is split into two halves of at most 26 bits
+    (Veltkamp), each half times 25 is exact, and the sign of
+    (hi * 25 - midpoint / 8) + lo * 25 is the sign of seconds - midpoint / 200.
+    """
+    whole = np.floor(seconds * 100)
+
+    split = 134217729.0 * seconds
+    hi = split - (split - seconds)
+    lo = seconds - hi
+    difference = (hi * 25 - (2 * whole + 1) / 8) + lo * 25
+
+    round_up = (difference > 0) | ((difference == 0) & (whole % 2 == 1))
+    return (whole + round_up).astype(np.int64)
+
+
+@functools.cache
+def _digit_tables() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The number, minute and fraction strings `floats_to_timestrs` picks its digits from, built on first use.
+    """
+    number_strs = np.array([str(i) for i in range(1000)])
+    return number_strs, np.char.add(number_strs, ':'), np.array([f'.{i:02d}' for i in range(100)])
 
 
 def get_avg_of(n: int, solutions: List[Solution], omit_best_worst: bool = False) -> AverageDetails:
@@ -93,6 +205,82 @@ def get_avg_of(n: int, solutions: List[Solution], omit_best_worst: bool = False)
 
 
 
+def get_rolling_avg_of(n: int, times: np.ndarray, omit_best_worst: bool = False) -> np.ndarray:
+    """
+    Calculates the average of every window of `n` consecutive times, the vectorized counterpart of `get_avg_of`.
+
+    Args:
+        n (int): The size of the windows.
+        times (np.ndarray): The times in chronological order (oldest first).
+        omit_best_worst (bool): Whether to omit the best and worst time of each window before calculating the mean.
+
+    Returns:
+        np.ndarray: The average of the window ending at each time, `len(times) - n + 1` values, empty if there are fewer than `n` times.
+    """
+    times = np.asarray(times, dtype=np.float64)
+
+    if len(times) < n:
+        return np.empty(0, dtype=np.float64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(times, n)
+
+    if not omit_best_worst:
+        return windows.mean(axis=1)
+
+    return (windows.sum(axis=1) - windows.max(axis=1) - windows.min(axis=1)) / (n - 2)
+
+
+def downsample_lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Picks the indices of at most `points` samples that keep the visual shape of the series,
+    using the Largest-Triangle-Three-Buckets algorithm.
+
+    Args:
+        x (np.ndarray): The x coordinates, sorted ascending.
+        y (np.ndarray): The y coordinates.
+        points (int): The point budget, at least 3.
+
+    Returns:
+        np.ndarray: The sorted indices of the selected samples, first and last sample are always included.
+
+    Raises:
+        ValueError: If the point budget is smaller than 3.
+    """
+    length = len(x)
+
+    if points < 3:
+        raise ValueError('The point budget has to be at least 3')
+
+    if points >= length:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # the first and last point get a bucket of their own
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else length)
+
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
 def is_valid_uuid(uuid_to_test: str, version=4):
     """
     Check if uuid_to_test is a valid UUID.
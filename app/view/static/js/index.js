@@ -19,3 +19,11 @@ function validateInput(puzzle) {
         return
     }
 }
+
+function listenForPersonalBests(puzzle) {
+    const events = new EventSource(`/solutions/events?puzzle=${puzzle}`)
+
+    events.addEventListener('new_pb', () => {
+        htmx.trigger(document.body, 'new_pb')
+    })
+}
@@ -1,15 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from app.db.read_routing import ReadYourWritesMiddleware
 from app.routers.solutions_router import router as solutions_router
 from app.routers.scramble_router import router as scramble_router
 from app.routers.pages_router import router as view_router
+from app.routers.sessions_router import router as sessions_router
+from app.routers.users_router import router as users_router
+from app.services.invalidation_service import InvalidationService
+from app.services.personal_best_jobs import PersonalBestJobs
+from app.startup import warm_up
+from app.static_files import PrecompressedStaticFiles
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="./app/view/static"), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up()
+    # finish the PB updates of solutions stored right before the last shutdown
+    PersonalBestJobs.resume_pending()
+    InvalidationService.add_listener(PersonalBestJobs.on_remote_event)
+    InvalidationService.start()
+    yield
+    InvalidationService.shutdown()
+    PersonalBestJobs.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
+app.mount("/static", PrecompressedStaticFiles(directory="./app/view/static"), name="static")
 
 
 app.include_router(solutions_router, tags=['solutions'])
 app.include_router(scramble_router, tags=['scramble'])
+app.include_router(users_router, tags=['users'])
+app.include_router(sessions_router, tags=['sessions'])
 
 
 # this one needs to go last
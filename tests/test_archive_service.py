@@ -0,0 +1,194 @@
+import json, os
+from datetime import datetime, timedelta, timezone
+from typing import List
+from uuid import UUID, uuid4
+import numpy as np
+import psycopg2
+import pytest
+from sqlalchemy import func, select
+
+from app.model.puzzle_summary import PuzzleSummary
+from app.model.solution import Solution
+from app.scripts import archive_solutions
+from app.services import archive_service
+from app.services.archive_service import ArchiveService, SolutionArchive
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.services.summary_service import SummaryService
+from app.types.batch import BatchSolution
+
+PUZZLE = '3x3x3'
+BEFORE = datetime.now(timezone.utc) - timedelta(days=120)
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive_service, 'SOLUTIONS_ARCHIVE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def solve(db, user, count: int, days_ago: float, first: int = 0) -> List[Solution]:
+    start = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    items = [
+        BatchSolution(
+            key=uuid4(),
+            solution_time=f'{10 + (i * 7 % 50) / 10:.2f}',
+            scramble=' '.join(ScrambleService.generate_scramble(PUZZLE)),
+            dnf=i % 10 == 9,
+            created_at=start + timedelta(seconds=i)
+        )
+        for i in range(first, first + count)
+    ]
+    return SolutionService.create_solutions(items, PUZZLE, user.id, db)
+
+
+def history(db, user):
+    columns = ArchiveService.get_columns(PUZZLE, user.id, db)
+    db.rollback()
+    return columns.times.tolist(), columns.timestamps.tolist(), columns.dnf.tolist()
+
+
+def live_count(db, user) -> int:
+    count = db.execute(select(func.count()).select_from(Solution).where(Solution.user_id == user.id)).scalar_one()
+    db.rollback()
+    return count
+
+
+def rebuilt_summary(db, user) -> PuzzleSummary:
+    SummaryService.rebuild(db, user.id)
+    return SummaryService.get_summary(PUZZLE, user.id, db)
+
+
+def test_archive_keeps_the_history(db, user):
+    solve(db, user, 150, 200)
+    expected = history(db, user)
+    summary = SummaryService.get_summary(PUZZLE, user.id, db)
+    expected_summary = (summary.solve_count, summary.dnf_count, summary.best_single, summary.time_sum)
+    db.rollback()
+
+    assert ArchiveService.archive(PUZZLE, user.id, BEFORE, db) == 50
+
+    assert live_count(db, user) == 100
+    assert len(ArchiveService.load(PUZZLE, user.id)) == 50
+    assert history(db, user) == expected
+
+    summary = rebuilt_summary(db, user)
+    assert (summary.solve_count, summary.dnf_count, summary.best_single) == expected_summary[:3]
+    assert summary.time_sum == pytest.approx(expected_summary[3])
+
+
+def test_archive_notifies_the_workers(db, user):
+    solve(db, user, 150, 200)
+    version = SummaryService.get_summary(PUZZLE, user.id, db).version
+    db.rollback()
+
+    listener = psycopg2.connect(os.environ['TEST_DATABASE_URL'])
+    listener.autocommit = True
+    try:
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN "solutions_{PUZZLE}"')
+
+        assert archive_solutions.main(['--older-than', '120']) == 0
+
+        listener.poll()
+        messages = [json.loads(notification.payload) for notification in listener.notifies]
+    finally:
+        listener.close()
+
+    assert SummaryService.get_summary(PUZZLE, user.id, db).version == version + 1
+    assert [(UUID(message['user_id']), message['version'], message['event']) for message in messages] == [(user.id, version + 1, 'changed')]
+
+
+def test_failed_run_is_retried(db, user, monkeypatch):
+    solve(db, user, 150, 200)
+    expected = history(db, user)
+
+    publish = ArchiveService._publish
+
+    def publish_and_crash(directory, columns):
+        publish(directory, columns)
+        raise RuntimeError('crashed before the rows were deleted')
+
+    monkeypatch.setattr(ArchiveService, '_publish', publish_and_crash)
+    with pytest.raises(RuntimeError):
+        ArchiveService.archive(PUZZLE, user.id, BEFORE, db)
+    db.rollback()
+    monkeypatch.setattr(ArchiveService, '_publish', publish)
+
+    # published, but nothing was deleted, every archived solution is still live
+    assert len(ArchiveService.load(PUZZLE, user.id)) == 50
+    assert live_count(db, user) == 150
+    assert history(db, user) == expected
+    assert rebuilt_summary(db, user).solve_count == 150
+
+    assert ArchiveService.archive(PUZZLE, user.id, BEFORE, db) == 50
+
+    archive = ArchiveService.load(PUZZLE, user.id)
+    assert len(archive) == 50 and len(set(archive.id.tolist())) == 50
+    assert live_count(db, user) == 100
+    assert history(db, user) == expected
+    assert rebuilt_summary(db, user).solve_count == 150
+
+
+def test_older_solutions_are_merged_in_order(db, user):
+    solutions = solve(db, user, 150, 200)
+    assert ArchiveService.archive(PUZZLE, user.id, BEFORE, db) == 50
+
+    # replayed by an offline client, older than everything archived so far
+    solutions += solve(db, user, 20, 300, first=150)
+    expected = history(db, user)
+    assert ArchiveService.archive(PUZZLE, user.id, BEFORE, db) == 20
+
+    archive = ArchiveService.load(PUZZLE, user.id)
+    assert len(archive) == 70
+    assert np.all(np.diff(archive.created_at) >= 0)
+    assert history(db, user) == expected
+
+    # every scramble moved along with its solution
+    # numpy drops the trailing zero bytes of the S16 ids
+    scrambles = {solution.id.bytes.rstrip(b'\0'): solution.scramble for solution in solutions}
+    for i, id in enumerate(archive.id):
+        start, end = archive.scramble_offsets[i], archive.scramble_offsets[i + 1]
+        assert archive.scrambles[start:end].tobytes() == scrambles[id]
+
+
+def test_deleting_the_best_single_checks_the_archive_only(db, user, monkeypatch):
+    solve(db, user, 150, 200)
+    ArchiveService.archive(PUZZLE, user.id, BEFORE, db)
+    archived_best = ArchiveService.get_best_single(PUZZLE, user.id)
+
+    # a live solve as fast as the archived best, deleting it must not lose the archived one
+    [fastest] = SolutionService.create_solutions(
+        [BatchSolution(key=uuid4(), solution_time=f'{archived_best:.2f}', scramble=' '.join(ScrambleService.generate_scramble(PUZZLE)))],
+        PUZZLE, user.id, db
+    )
+
+    def not_live(*args):
+        raise AssertionError('a single delete compared the archive with the live rows')
+
+    monkeypatch.setattr(ArchiveService, '_not_live', not_live)
+    SolutionService.delete_solution(str(fastest.id), user.id, db)
+
+    assert SummaryService.get_summary(PUZZLE, user.id, db).best_single == archived_best
+
+
+def test_readers_of_the_previous_generation_keep_it(db, user):
+    solve(db, user, 150, 200)
+    ArchiveService.archive(PUZZLE, user.id, BEFORE, db)
+    reader = ArchiveService.load(PUZZLE, user.id)
+    times = reader.time.tolist()
+
+    solve(db, user, 20, 300, first=150)
+    ArchiveService.archive(PUZZLE, user.id, BEFORE, db)
+
+    # still there after the next run, from listing the directory to the last read
+    assert os.path.isdir(reader.path)
+    assert SolutionArchive(reader.path).time.tolist() == times
+    assert len(ArchiveService.load(PUZZLE, user.id)) == 70
+
+    solve(db, user, 20, 400, first=170)
+    os.makedirs(os.path.join(ArchiveService._directory(PUZZLE, user.id), '9.tmp'))
+    ArchiveService.archive(PUZZLE, user.id, BEFORE, db)
+
+    # the oldest generation and the leftover of a failed run are gone
+    assert sorted(os.listdir(ArchiveService._directory(PUZZLE, user.id))) == ['2', '3']
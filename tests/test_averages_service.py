@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+import numpy as np
+import pytest
+
+from app.constants import HISTORY_METRICS
+from app.model.solution import Solution
+from app.services import archive_service
+from app.services.archive_service import ArchiveService
+from app.services.averages_service import AveragesService
+from app.services.solution_service import SolutionService
+
+ENGINES = ['python', 'sql']
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive_service, 'SOLUTIONS_ARCHIVE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def store(db, user, puzzle: str, times: List[float], dnf: List[bool] | None = None, same_time: bool = False, start: datetime = START) -> List[Solution]:
+    dnf = dnf if dnf is not None else [False] * len(times)
+    solutions = [
+        Solution(
+            user_id=user.id,
+            puzzle=puzzle,
+            time=time,
+            dnf=is_dnf,
+            scramble=b'',
+            scramble_hash=0,
+            # a batch of an offline client can store many solves with the same created_at
+            created_at=start if same_time else start + timedelta(seconds=i)
+        )
+        for i, (time, is_dnf) in enumerate(zip(times, dnf))
+    ]
+    db.add_all(solutions)
+    db.commit()
+    return solutions
+
+
+def expected(solutions: List[Solution]):
+    newest_first = sorted(solutions, key=lambda solution: (solution.created_at, solution.id), reverse=True)
+
+    result = {}
+    for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+        if len(newest_first) < n:
+            result[key] = {'time': None, 'window_start_id': None}
+            continue
+
+        times = np.sort([solution.time for solution in newest_first[:n]])
+        result[key] = {
+            'time': pytest.approx(float(np.mean(times[1:-1] if omit_best_worst else times))),
+            'window_start_id': newest_first[n - 1].id
+        }
+
+    return result
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_latest_averages(db, user, engine):
+    times = np.random.default_rng(1).lognormal(np.log(15), 0.2, 130).round(2).tolist()
+    solutions = store(db, user, '3x3x3', times)
+
+    assert AveragesService.get_latest(['3x3x3'], user.id, db, engine) == {'3x3x3': expected(solutions)}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_fewer_solutions_than_the_windows(db, user, engine):
+    solutions = store(db, user, '3x3x3', [12.0, 13.5, 11.25, 14.0, 10.5, 15.0, 12.75])
+
+    latest = AveragesService.get_latest(['3x3x3'], user.id, db, engine)['3x3x3']
+
+    assert latest == expected(solutions)
+    assert latest['avg_five']['time'] is not None and latest['avg_twelve']['time'] is None
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_dnfs_count_with_their_time(db, user, engine):
+    times = [10.0 + i / 4 for i in range(15)]
+    solutions = store(db, user, '3x3x3', times, [i % 4 == 0 for i in range(15)])
+
+    assert AveragesService.get_latest(['3x3x3'], user.id, db, engine)['3x3x3'] == expected(solutions)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_solutions_stored_at_the_same_time(db, user, engine):
+    solutions = store(db, user, '3x3x3', [10.0 + i for i in range(30)], same_time=True)
+
+    assert AveragesService.get_latest(['3x3x3'], user.id, db, engine)['3x3x3'] == expected(solutions)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_puzzles_without_solutions(db, user, engine):
+    store(db, user, '3x3x3', [12.0] * 5)
+
+    latest = AveragesService.get_latest(['2x2x2', '3x3x3'], user.id, db, engine)
+
+    assert latest['2x2x2'] == {key: {'time': None, 'window_start_id': None} for key in HISTORY_METRICS}
+    assert latest['3x3x3']['avg_five']['time'] == pytest.approx(12.0)
+    assert AveragesService.get_latest([], user.id, db, engine) == {}
+
+
+def test_engines_agree_on_ties(db, user):
+    # ties in created_at across the window boundaries of every metric
+    times = np.random.default_rng(2).lognormal(np.log(15), 0.2, 120).round(2).tolist()
+    store(db, user, '3x3x3', times[:60], same_time=True)
+    store(db, user, '3x3x3', times[60:], same_time=True)
+
+    python = AveragesService.get_latest(['3x3x3'], user.id, db, 'python')['3x3x3']
+    sql = AveragesService.get_latest(['3x3x3'], user.id, db, 'sql')['3x3x3']
+
+    for key in HISTORY_METRICS:
+        assert python[key]['window_start_id'] == sql[key]['window_start_id']
+        assert python[key]['time'] == pytest.approx(sql[key]['time'])
+
+
+def test_every_query_orders_ties_alike(db, user, archive_dir):
+    times = np.random.default_rng(3).lognormal(np.log(15), 0.2, 130).round(2).tolist()
+    # three groups stored at the same time each, the oldest one goes into the archive below
+    solutions = [
+        solution
+        for hours, group in [(0, times[:30]), (1, times[30:80]), (2, times[80:])]
+        for solution in store(db, user, '3x3x3', group, same_time=True, start=START + timedelta(hours=hours))
+    ]
+    newest_first = sorted(solutions, key=lambda solution: (solution.created_at, solution.id), reverse=True)
+    ids = [solution.id for solution in newest_first]
+    latest = AveragesService.get_latest(['3x3x3'], user.id, db)['3x3x3']
+
+    # every page once, none skipped or repeated at the ties
+    pages, cursor = [], None
+    while True:
+        page = SolutionService.get_solutions('3x3x3', user.id, db, cursor)
+        pages += [solution.id for solution in page['list']]
+        cursor = page['cursor']
+        if cursor is None:
+            break
+    assert pages == ids
+
+    current = SolutionService.get_current_averages('3x3x3', user.id, db)
+    for key, (n, _) in HISTORY_METRICS.items():
+        assert [solution.id for solution in current[key]['solutions']] == ids[:n]
+        assert current[key]['solutions'][-1].id == latest[key]['window_start_id']
+        assert [solution.id for solution in SolutionService.get_current_window('3x3x3', key, user.id, db)] == ids[:n]
+
+    # all of them are new, the windows are the same as the brute force over the same order
+    best = SolutionService.get_best_new_averages('3x3x3', user.id, START, db)
+    assert [solution.id for solution in best['single']['solutions']] == [min(newest_first, key=lambda solution: solution.time).id]
+    for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+        windows = [newest_first[start:start + n] for start in range(len(ids) - n + 1)]
+        averages = [float(np.mean(np.sort([s.time for s in window])[1:-1] if omit_best_worst else [s.time for s in window])) for window in windows]
+        assert best[key]['time'] == pytest.approx(min(averages))
+
+    db.rollback()
+    # the oldest 30 archived, merged back in the same order
+    assert ArchiveService.archive('3x3x3', user.id, START + timedelta(days=1), db) == 30
+    columns = ArchiveService.get_columns('3x3x3', user.id, db)
+    assert columns.times.tolist() == [solution.time for solution in reversed(newest_first)]
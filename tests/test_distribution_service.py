@@ -0,0 +1,149 @@
+import math
+import numpy as np
+import pytest
+
+from app.constants import DISTRIBUTION_MAX_BUCKETS, DISTRIBUTION_RELATIVE_ACCURACY
+from app.model.solution import Solution
+from app.services.distribution_service import DistributionService, TimeSketch
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1]
+
+
+def assert_quantiles_match(sketch: TimeSketch, times: np.ndarray, quantiles=QUANTILES):
+    for q in quantiles:
+        exact = float(np.quantile(times, q, method='lower'))
+        # a little slack for the float rounding of the bucket boundaries
+        assert sketch.quantile(q) == pytest.approx(exact, rel=DISTRIBUTION_RELATIVE_ACCURACY * 1.0001), q
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_quantiles_are_within_the_relative_accuracy(seed):
+    rng = np.random.default_rng(seed)
+    times = rng.lognormal(math.log(15), 0.3, 2000)
+
+    sketch = TimeSketch(1)
+    sketch.add_many(times)
+
+    assert sketch.count == len(times)
+    assert_quantiles_match(sketch, times)
+
+
+def test_adding_one_by_one_matches_adding_many():
+    times = np.random.default_rng(1).lognormal(math.log(40), 0.2, 500)
+
+    one_by_one = TimeSketch(5)
+    for time in times:
+        one_by_one.add(float(time))
+    many = TimeSketch(5)
+    many.add_many(times)
+
+    assert one_by_one.to_bytes() == many.to_bytes()
+
+
+def test_removed_times_leave_the_quantiles():
+    rng = np.random.default_rng(2)
+    kept = rng.lognormal(math.log(15), 0.3, 300)
+    removed = rng.lognormal(math.log(8), 0.1, 100)
+
+    sketch = TimeSketch(1)
+    sketch.add_many(np.concatenate([kept, removed]))
+    for time in removed:
+        sketch.remove(float(time))
+
+    assert sketch.count == len(kept)
+    assert_quantiles_match(sketch, kept)
+
+
+def test_zero_times():
+    sketch = TimeSketch(1)
+    sketch.add_many(np.array([0, 0, 0, 10, 20]))
+
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) == pytest.approx(20, rel=DISTRIBUTION_RELATIVE_ACCURACY)
+    assert sketch.count_below(1) == 3
+
+
+def test_empty_sketch():
+    sketch = TimeSketch(1)
+
+    assert sketch.count == 0
+    assert sketch.quantile(0.5) is None
+    assert sketch.histogram() == []
+
+
+def test_sub_n_counts_are_exact():
+    times = np.random.default_rng(3).lognormal(math.log(4), 0.4, 1000)
+
+    sketch = TimeSketch(0.5)
+    sketch.add_many(times)
+
+    for threshold in [1, 3, 5, 10]:
+        assert sketch.count_below(threshold) == int((times < threshold).sum())
+
+
+def test_forgotten_timer_does_not_grow_the_sketch():
+    rng = np.random.default_rng(4)
+    times = rng.lognormal(math.log(4), 0.3, 1000)
+    # a 2x2 timer left running for an hour
+    outlier = 3600.0
+
+    sketch = TimeSketch(0.5)
+    sketch.add_many(np.append(times, outlier))
+
+    assert len(sketch.sketch_counts) <= DISTRIBUTION_MAX_BUCKETS
+    assert len(sketch.histogram_counts) <= DISTRIBUTION_MAX_BUCKETS
+    assert len(sketch.to_bytes()) < 2.1 * 1024
+    # everything below the merged buckets is as accurate as before
+    assert_quantiles_match(sketch, np.append(times, outlier), [0, 0.1, 0.5, 0.9, 0.99])
+    assert sketch.count_below(10) == int((times < 10).sum())
+
+    start, end, count = sketch.histogram()[-1]
+    assert end == math.inf and count == 1 and start < outlier
+
+
+def test_faster_times_merge_the_highest_buckets():
+    sketch = TimeSketch(1, max_buckets=16)
+    for time in [100.0, 50.0, 20.0, 10.0]:
+        sketch.add(time)
+
+    assert len(sketch.sketch_counts) == 16
+    assert sketch.count == 4
+    assert sketch.quantile(0) == pytest.approx(10, rel=DISTRIBUTION_RELATIVE_ACCURACY)
+
+    # removing a time that was merged takes it out of the bucket it was merged into
+    sketch.remove(100.0)
+    sketch.remove(50.0)
+    assert sketch.count == 2
+    assert int(sketch.sketch_counts.min()) == 0
+
+
+def test_uncapped_sketches_are_collapsed_when_loaded():
+    uncapped = TimeSketch(0.5, max_buckets=100_000)
+    uncapped.add_many(np.array([2.0, 3.0, 4.0, 3600.0]))
+
+    sketch = TimeSketch.from_bytes(uncapped.to_bytes())
+
+    assert len(sketch.sketch_counts) <= DISTRIBUTION_MAX_BUCKETS
+    assert len(sketch.histogram_counts) <= DISTRIBUTION_MAX_BUCKETS
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == uncapped.quantile(0.5)
+
+
+def test_serialization_round_trip():
+    sketch = TimeSketch(1)
+    sketch.add_many(np.random.default_rng(5).lognormal(math.log(15), 0.3, 100))
+
+    assert TimeSketch.from_bytes(sketch.to_bytes()).to_bytes() == sketch.to_bytes()
+
+
+def test_distribution_of_a_forgotten_timer(db, user):
+    solutions = [Solution(user_id=user.id, puzzle='2x2x2', time=time, scramble=b'', scramble_hash=0) for time in [3.5, 4.25, 3600.0]]
+    DistributionService.on_solutions_created(solutions, db)
+    db.commit()
+
+    distribution = DistributionService.get_distribution('2x2x2', user.id, db)
+
+    assert distribution['count'] == 3
+    assert distribution['thresholds'][0] == {'threshold': 3, 'threshold_str': '3.00s', 'count': 0}
+    assert len(distribution['histogram']) == DISTRIBUTION_MAX_BUCKETS - 7
+    assert distribution['histogram'][-1]['range_str'] == '2:07.50min+'
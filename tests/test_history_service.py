@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import pytest
+
+from app.services import archive_service
+from app.services.history_service import HistoryService
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+
+PUZZLE = '3x3x3'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive_service, 'SOLUTIONS_ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(HistoryService, '_cache', OrderedDict())
+    monkeypatch.setattr(HistoryService, '_generations', {})
+
+
+def solve(db, user, time: float):
+    return SolutionService.create_solution(f'{time:.2f}', PUZZLE, ' '.join(ScrambleService.generate_scramble(PUZZLE)), user.id, db)
+
+
+def history(db, user, metric: str = 'avg_five'):
+    result = HistoryService.get_history(PUZZLE, metric, 500, user.id, db)
+    db.rollback()
+    return result
+
+
+def reloaded(db, user, metric: str = 'avg_five'):
+    HistoryService.invalidate(PUZZLE, user.id)
+    return history(db, user, metric)
+
+
+def test_appended_solves_match_a_reload(db, user):
+    for time in [12.0, 11.0, 13.0, 10.0]:
+        solve(db, user, time)
+    assert history(db, user)['total'] == 0
+
+    for time in [14.0, 12.5, 9.5]:
+        solve(db, user, time)
+        cached = history(db, user)
+        assert (user.id, PUZZLE) in HistoryService.get_cached_keys()
+        assert cached == reloaded(db, user)
+
+    assert cached['total'] == 3
+    assert history(db, user, 'single')['total'] == 7
+
+
+def test_a_solve_loaded_before_its_hook_is_not_added_twice(db, user, monkeypatch):
+    for time in [12.0, 11.0, 13.0, 10.0, 14.0]:
+        solve(db, user, time)
+
+    # committed, but the hook hasn't run yet when another request loads the history
+    on_solution_created = HistoryService.on_solution_created
+    monkeypatch.setattr(HistoryService, 'on_solution_created', lambda solution: None)
+    solution = solve(db, user, 9.0)
+    assert history(db, user, 'single')['total'] == 6
+
+    on_solution_created(solution)
+
+    assert history(db, user, 'single')['total'] == 6
+    assert history(db, user) == reloaded(db, user)
+
+
+def test_a_solve_older_than_the_history_drops_it(db, user):
+    for time in [12.0, 11.0, 13.0, 10.0, 14.0]:
+        solve(db, user, time)
+    history(db, user)
+
+    oldest = SolutionService.get_solutions(PUZZLE, user.id, db)['list'][-1]
+    db.rollback()
+    HistoryService.on_solution_created(oldest)
+
+    assert (user.id, PUZZLE) not in HistoryService.get_cached_keys()
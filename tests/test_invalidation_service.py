@@ -0,0 +1,191 @@
+import json, os
+from collections import OrderedDict
+from uuid import uuid4
+import psycopg2
+import pytest
+
+from app.services import invalidation_service
+from app.services.history_service import HistoryService
+from app.services.invalidation_service import CHANGED, NEW_PB, UNKNOWN, InvalidationService
+from app.services.personal_best_jobs import PersonalBestJobs
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.services.summary_service import SummaryService
+
+PUZZLE = '3x3x3'
+
+
+@pytest.fixture(autouse=True)
+def events(monkeypatch):
+    """
+    The event of every change passed on to the listeners, and 'history' for every dropped history.
+    """
+    events = []
+    monkeypatch.setattr(InvalidationService, '_seen', OrderedDict())
+    monkeypatch.setattr(InvalidationService, '_listeners', [lambda puzzle, user_id, event: events.append(event)])
+    monkeypatch.setattr(HistoryService, 'invalidate', lambda puzzle, user_id: events.append('history'))
+    return events
+
+
+def notification(user_id, version: int, pb_version: int, event: str, origin: str = 'other worker') -> str:
+    return json.dumps({'user_id': str(user_id), 'version': version, 'pb_version': pb_version, 'event': event, 'origin': origin})
+
+
+def test_every_version_is_applied_once(events):
+    user_id = uuid4()
+
+    InvalidationService._on_notification(f'solutions_{PUZZLE}', notification(user_id, 1, 0, CHANGED))
+    assert events == ['history', CHANGED]
+
+    # the same change found again by a version check, and a notification that arrived late
+    InvalidationService._apply(PUZZLE, user_id, 1, 0, UNKNOWN)
+    InvalidationService._on_notification(f'solutions_{PUZZLE}', notification(user_id, 2, 1, NEW_PB))
+    InvalidationService._on_notification(f'solutions_{PUZZLE}', notification(user_id, 1, 0, CHANGED))
+
+    assert events == ['history', CHANGED, NEW_PB]
+
+
+def test_own_notifications_are_ignored(events):
+    InvalidationService._on_notification(f'solutions_{PUZZLE}', notification(uuid4(), 1, 0, CHANGED, InvalidationService._origin))
+
+    assert events == []
+
+
+def test_missed_changes_are_told_apart(events):
+    user_id = uuid4()
+    InvalidationService._apply(PUZZLE, user_id, 3, 1, UNKNOWN)
+
+    InvalidationService._apply(PUZZLE, user_id, 5, 1, UNKNOWN)
+    InvalidationService._apply(PUZZLE, user_id, 7, 2, UNKNOWN)
+    InvalidationService._apply(PUZZLE, user_id, 8, 3, UNKNOWN)
+
+    # a PB missed along with other changes still drops the history, a PB alone doesn't
+    assert events == ['history', UNKNOWN, 'history', CHANGED, 'history', NEW_PB, NEW_PB]
+
+
+def test_a_gap_in_the_notifications_drops_the_history(events):
+    user_id = uuid4()
+    InvalidationService._apply(PUZZLE, user_id, 1, 0, CHANGED)
+    events.clear()
+
+    InvalidationService._apply(PUZZLE, user_id, 2, 1, NEW_PB)
+    InvalidationService._apply(PUZZLE, user_id, 4, 2, NEW_PB)
+
+    assert events == [NEW_PB, 'history', NEW_PB]
+
+
+def test_only_new_pbs_reach_the_streams(monkeypatch):
+    notified = []
+    monkeypatch.setattr(PersonalBestJobs, '_notify', lambda key, event: notified.append(event))
+
+    for event in [CHANGED, UNKNOWN, NEW_PB]:
+        PersonalBestJobs.on_remote_event(PUZZLE, uuid4(), event)
+
+    assert notified == [NEW_PB]
+
+
+def test_seen_versions_are_bounded(monkeypatch):
+    monkeypatch.setattr(invalidation_service, 'INVALIDATION_SEEN_SIZE', 3)
+    user_ids = [uuid4() for _ in range(5)]
+
+    for user_id in user_ids:
+        InvalidationService._apply(PUZZLE, user_id, 1, 0, CHANGED)
+
+    assert list(InvalidationService._seen) == [(user_id, PUZZLE) for user_id in user_ids[-3:]]
+
+
+def solve(db, user):
+    return SolutionService.create_solution('12.34', PUZZLE, ' '.join(ScrambleService.generate_scramble(PUZZLE)), user.id, db)
+
+
+def test_notifications_are_sent_on_commit(db, user, events):
+    solve(db, user)
+
+    listener = psycopg2.connect(os.environ['TEST_DATABASE_URL'])
+    listener.autocommit = True
+    try:
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN "solutions_{PUZZLE}"')
+
+        InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+        listener.poll()
+        assert listener.notifies == []
+
+        db.commit()
+        listener.poll()
+        [sent] = listener.notifies
+    finally:
+        listener.close()
+
+    assert json.loads(sent.payload)['pb_version'] == 1
+    # published by this process, the caller already updated its caches
+    InvalidationService._on_notification(sent.channel, sent.payload)
+    assert events == []
+
+    InvalidationService._on_notification(sent.channel, sent.payload.replace(InvalidationService._origin, 'other worker'))
+    assert events == [NEW_PB]
+
+
+def test_pbs_missed_while_disconnected_are_found(db, user, events):
+    solve(db, user)
+    InvalidationService.watch(PUZZLE, user.id)
+    events.clear()
+
+    # changes of other workers whose notifications never arrived
+    InvalidationService.publish(PUZZLE, user.id, db)
+    db.commit()
+    assert InvalidationService._check_versions()
+    assert events == ['history', CHANGED]
+
+    InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+    db.commit()
+    assert InvalidationService._check_versions()
+    assert events == ['history', CHANGED, NEW_PB]
+
+    assert InvalidationService._check_versions()
+    assert events == ['history', CHANGED, NEW_PB]
+
+
+def test_watching_a_puzzle_without_solutions(db, user, events):
+    InvalidationService.watch(PUZZLE, user.id)
+
+    solve(db, user)
+    InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+    db.commit()
+    InvalidationService._check_versions()
+
+    assert events == ['history', NEW_PB]
+
+
+def test_rebuild_never_hands_out_a_version_again(db, user, events):
+    solve(db, user)
+    InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+    db.commit()
+    InvalidationService.watch(PUZZLE, user.id)
+    before = SummaryService.get_summary(PUZZLE, user.id, db)
+    version, pb_version = before.version, before.pb_version
+    db.rollback()
+
+    SummaryService.rebuild(db, user.id)
+    after = SummaryService.get_summary(PUZZLE, user.id, db)
+    assert after.version > version and after.pb_version == pb_version
+    db.rollback()
+
+    # the next change of another worker gets a version this one hasn't applied yet
+    events.clear()
+    InvalidationService.publish(PUZZLE, user.id, db)
+    db.commit()
+    assert InvalidationService._check_versions()
+    assert events == ['history', CHANGED]
+
+
+def test_rebuild_keeps_the_versions_of_emptied_puzzles(db, user):
+    solution = solve(db, user)
+    SolutionService.delete_solution(str(solution.id), user.id, db)
+    version = SummaryService.get_summary(PUZZLE, user.id, db).version
+    db.rollback()
+
+    SummaryService.rebuild(db, user.id)
+
+    summary = SummaryService.get_summary(PUZZLE, user.id, db)
+    assert summary.solve_count == 0 and summary.version == version + 1
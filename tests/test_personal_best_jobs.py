@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+from uuid import uuid4
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.constants import HISTORY_METRICS
+from app.model.pending_pb_update import PendingPbUpdate
+from app.model.solution import Solution
+from app.services import personal_best_jobs
+from app.services.personal_best_jobs import PersonalBestJobs
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+
+PUZZLE = '3x3x3'
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        self.submitted.append(args)
+
+    def shutdown(self, wait: bool, cancel_futures: bool):
+        pass
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(PersonalBestJobs, '_executor', executor)
+    monkeypatch.setattr(PersonalBestJobs, '_states', {})
+    return executor
+
+
+def test_jobs_of_a_puzzle_coalesce(executor):
+    user_id = uuid4()
+
+    PersonalBestJobs.enqueue(PUZZLE, user_id)
+    PersonalBestJobs.enqueue(PUZZLE, user_id)
+    PersonalBestJobs.enqueue('2x2x2', user_id)
+
+    assert executor.submitted == [((user_id, PUZZLE),), ((user_id, '2x2x2'),)]
+
+
+def test_solutions_stored_while_running_rerun_the_job_once(executor, monkeypatch):
+    user_id = uuid4()
+    runs = []
+
+    def update_personal_best(puzzle, user_id):
+        runs.append(PersonalBestJobs._states[(user_id, puzzle)])
+        if len(runs) == 1:
+            # new solutions while the first run is going
+            PersonalBestJobs.enqueue(puzzle, user_id)
+            PersonalBestJobs.enqueue(puzzle, user_id)
+        return False
+
+    monkeypatch.setattr(PersonalBestJobs, '_update_personal_best', update_personal_best)
+
+    PersonalBestJobs.enqueue(PUZZLE, user_id)
+    PersonalBestJobs._run((user_id, PUZZLE))
+
+    assert runs == ['running', 'running']
+    assert len(executor.submitted) == 1
+    assert (user_id, PUZZLE) not in PersonalBestJobs._states
+
+
+def test_failed_job_keeps_no_state(executor, monkeypatch):
+    user_id = uuid4()
+
+    def update_personal_best(puzzle, user_id):
+        raise RuntimeError('deadlock detected')
+
+    monkeypatch.setattr(PersonalBestJobs, '_update_personal_best', update_personal_best)
+
+    PersonalBestJobs.enqueue(PUZZLE, user_id)
+    PersonalBestJobs._run((user_id, PUZZLE))
+
+    # the next solution enqueues a new job
+    PersonalBestJobs.enqueue(PUZZLE, user_id)
+    assert len(executor.submitted) == 2
+
+
+def test_resume_without_a_database(monkeypatch):
+    unreachable = create_engine('postgresql://nobody@/cubing?host=/nonexistent')
+    monkeypatch.setattr(personal_best_jobs, 'SessionLocal', sessionmaker(bind=unreachable))
+
+    assert PersonalBestJobs.resume_pending() == 0
+
+
+def marker_since(db, user) -> datetime:
+    since = db.execute(select(PendingPbUpdate.since).where(PendingPbUpdate.user_id == user.id)).scalar_one()
+    db.rollback()
+    return since
+
+
+def test_marker_keeps_the_oldest_unchecked_solution(db, user):
+    for since in [START + timedelta(hours=1), START, START + timedelta(hours=2)]:
+        SolutionService._mark_pending_pb_update(PUZZLE, user.id, db, since)
+        db.commit()
+
+    assert marker_since(db, user) == START
+
+
+def test_resumed_jobs_store_the_pbs(db, user):
+    for time in ['12.00', '11.00', '13.00', '10.00', '14.00']:
+        SolutionService.create_solution(time, PUZZLE, ' '.join(ScrambleService.generate_scramble(PUZZLE)), user.id, db)
+
+    assert PersonalBestJobs.resume_pending() == 1
+    PersonalBestJobs.shutdown()
+
+    pbs = SolutionService.get_personal_best(PUZZLE, user.id, db)
+    assert pbs['single']['pb'].time == 10.0
+    assert pbs['avg_five']['pb'].time == pytest.approx(12.0)
+    assert pbs['avg_twelve']['pb'] is None
+    assert db.execute(select(PendingPbUpdate)).all() == []
+
+
+def store(db, user, times: List[float]) -> List[Solution]:
+    solutions = [
+        Solution(user_id=user.id, puzzle=PUZZLE, time=time, scramble=b'', scramble_hash=0, created_at=START + timedelta(seconds=i))
+        for i, time in enumerate(times)
+    ]
+    db.add_all(solutions)
+    db.commit()
+    return solutions
+
+
+@pytest.mark.parametrize('new_count', [1, 3, 20, 150])
+def test_best_new_averages(db, user, new_count):
+    times = np.random.default_rng(new_count).lognormal(np.log(15), 0.2, 150).round(2).tolist()
+    solutions = store(db, user, times)
+    first_new = len(solutions) - new_count
+
+    best = SolutionService.get_best_new_averages(PUZZLE, user.id, solutions[first_new].created_at, db)
+
+    for key, (n, omit_best_worst) in HISTORY_METRICS.items():
+        # every window that ends at a new solution, by the index of its newest solution
+        windows = {
+            end: np.sort(times[end - n + 1:end + 1]) for end in range(max(first_new, n - 1), len(times))
+        }
+        if len(windows) == 0:
+            assert best[key]['time'] is None
+            continue
+
+        averages = {end: float(np.mean(window[1:-1] if omit_best_worst else window)) for end, window in windows.items()}
+        end = min(averages, key=averages.get)
+
+        assert best[key]['time'] == pytest.approx(averages[end]), key
+        assert [solution.id for solution in best[key]['solutions']] == [solution.id for solution in reversed(solutions[end - n + 1:end + 1])]
@@ -0,0 +1,129 @@
+"""
+The views run with QUERY_BUDGETS=1 (set in conftest.py), so every @max_queries budget raises when exceeded.
+"""
+from uuid import uuid4
+import pytest
+from markupsafe import escape
+from sqlalchemy import select, text
+
+from app.controller.pages_controller import PagesController
+from app.controller.sessions_controller import SessionsController
+from app.controller.solutions_controller import SolutionsController
+from app.db import query_counter
+from app.db.database import SessionLocal
+from app.db.query_counter import assert_max_queries, count_queries, max_queries
+from app.model.personal_best import PersonalBest
+from app.services.personal_best_jobs import PersonalBestJobs
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.types.batch import BatchSolution
+
+PUZZLE = '3x3x3'
+
+
+def rows(response) -> int:
+    # the header row aside
+    return response.body.count(b'<tr>') - 1
+
+
+@pytest.fixture
+def solutions(db, user):
+    # one scramble is solved twice, the details of either show both
+    scrambles = [' '.join(ScrambleService.generate_scramble(PUZZLE)) for _ in range(14)]
+    scrambles.append(scrambles[0])
+    items = [
+        BatchSolution(key=uuid4(), solution_time=f'{10 + i % 7}.{i:02d}', scramble=scramble)
+        for i, scramble in enumerate(scrambles)
+    ]
+    created = SolutionService.create_solutions(items, PUZZLE, user.id, db)
+
+    PersonalBestJobs.enqueue(PUZZLE, user.id)
+    # waits for the job
+    PersonalBestJobs.shutdown()
+
+    return created
+
+
+@pytest.fixture
+def view_db(database):
+    """
+    A session of its own for the view, like a request gets.
+    """
+    db = SessionLocal()
+    yield db
+    db.close()
+
+
+def test_budgets_are_enforced(view_db):
+    assert query_counter.QUERY_BUDGETS
+
+    @max_queries(1)
+    def two_queries():
+        view_db.execute(text('SELECT 1'))
+        view_db.execute(text('SELECT 2'))
+
+    with pytest.raises(AssertionError, match='executed 2 queries, expected at most 1'):
+        two_queries()
+
+
+def test_nested_blocks_count_towards_the_outer_one(view_db):
+    with count_queries() as outer:
+        with assert_max_queries(1):
+            view_db.execute(text('SELECT 1'))
+        view_db.execute(text('SELECT 2'))
+
+    assert len(outer) == 2
+
+
+def test_details_of_a_current_window(solutions, user, view_db):
+    # 15 solutions, too few for a mo100
+    for key, count in [('single', 1), ('avg_five', 5), ('avg_twelve', 12), ('mean_hundred', 0)]:
+        response = SolutionsController.get_solution_details_view(key, user.id, view_db, PUZZLE)
+        assert response.status_code == 200
+        assert rows(response) == count
+
+
+def test_details_of_a_personal_best(solutions, user, db, view_db):
+    pbs = db.execute(select(PersonalBest).where(PersonalBest.user_id == user.id)).scalars().all()
+    assert {pb.avg_of for pb in pbs} >= {1, 5, 12}
+
+    for pb in pbs:
+        response = SolutionsController.get_solution_details_view(str(pb.id), user.id, view_db)
+        assert response.status_code == 200
+        assert rows(response) == pb.avg_of
+
+
+def test_details_of_a_solution(solutions, user, view_db):
+    repeated = solutions[-1]
+
+    response = SolutionsController.get_solution_details_view(str(repeated.id), user.id, view_db)
+
+    assert response.status_code == 200
+    assert rows(response) == 2
+    assert response.body.decode().count(escape(' '.join(ScrambleService.decode(repeated.scramble)))) == 2
+
+
+def test_details_of_an_unknown_id(solutions, user, view_db):
+    assert SolutionsController.get_solution_details_view(str(uuid4()), user.id, view_db).status_code == 404
+    assert SolutionsController.get_solution_details_view('avg_five', user.id, view_db).status_code == 404
+
+
+def test_list_views(solutions, user, view_db):
+    first_page = SolutionsController.get_solutions_view(PUZZLE, user.id, view_db, None, 10)
+    cursor = str(solutions[9].id)
+    SolutionsController.get_solutions_view(PUZZLE, user.id, view_db, cursor, 10)
+    SolutionsController.get_current_averages_view(PUZZLE, user.id, view_db)
+    SolutionsController.get_personal_best_view(PUZZLE, user.id, view_db)
+
+    assert first_page.status_code == 200
+
+
+def test_pages(solutions, user, view_db):
+    assert PagesController.serve_index_file(user.id, view_db).status_code == 200
+    assert PagesController.serve_cubing_file(PUZZLE, user.id, view_db).status_code == 200
+    assert SessionsController.get_session_view(PUZZLE, user.id, view_db).status_code == 200
+
+
+def test_history_and_distribution(solutions, user, view_db):
+    assert SolutionsController.get_history(PUZZLE, 'avg_five', 500, user.id, view_db).status_code == 200
+    assert SolutionsController.get_distribution_view(PUZZLE, user.id, view_db).status_code == 200
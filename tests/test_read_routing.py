@@ -0,0 +1,81 @@
+import time
+from uuid import uuid4
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+import main
+from app.constants import READ_PRIMARY_COOKIE, READ_YOUR_WRITES_WINDOW
+from app.db import read_routing
+from app.db.database import engine
+from app.db.read_routing import get_read_db, reads_from_primary
+from app.services.version_service import VersionService, get_versioned_read_db
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # never connected, the tests only look at where the sessions are bound to
+    replica_engine = create_engine('postgresql://replica/cubing')
+    monkeypatch.setattr(read_routing, 'ReadSessionLocal', sessionmaker(bind=replica_engine))
+    return replica_engine
+
+
+def request(cookie: str | None = None) -> Request:
+    headers = [(b'cookie', cookie.encode())] if cookie is not None else []
+    return Request({'type': 'http', 'headers': headers})
+
+
+def primary_cookie(seconds: float) -> str:
+    return f'{READ_PRIMARY_COOKIE}={time.time() + seconds:.3f}'
+
+
+def bound_engine(dependency):
+    db = next(dependency)
+    try:
+        return db.get_bind()
+    finally:
+        dependency.close()
+
+
+def test_reads_from_primary_after_a_write():
+    assert reads_from_primary(request(primary_cookie(READ_YOUR_WRITES_WINDOW)))
+    assert not reads_from_primary(request(primary_cookie(-1)))
+    assert not reads_from_primary(request(f'{READ_PRIMARY_COOKIE}=garbage'))
+    assert not reads_from_primary(request())
+
+
+def test_read_db(replica):
+    assert bound_engine(get_read_db(request())) is replica
+    assert bound_engine(get_read_db(request(primary_cookie(READ_YOUR_WRITES_WINDOW)))) is engine
+
+
+def test_versioned_read_db_of_unchanged_data(replica):
+    assert bound_engine(get_versioned_read_db(request(), uuid4())) is replica
+    assert bound_engine(get_versioned_read_db(request(), None)) is replica
+
+
+def test_versioned_read_db_after_a_change_by_another_client(replica, monkeypatch):
+    user_id = uuid4()
+    # e.g. a solve from another device, this client has no cookie, the replica may still lag
+    VersionService.mark_changed(user_id)
+
+    assert bound_engine(get_versioned_read_db(request(), user_id)) is engine
+    assert bound_engine(get_versioned_read_db(request(), uuid4())) is replica
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + READ_YOUR_WRITES_WINDOW + 1)
+
+    assert bound_engine(get_versioned_read_db(request(), user_id)) is replica
+
+
+def test_versioned_read_db_after_a_write_of_the_client(replica):
+    assert bound_engine(get_versioned_read_db(request(primary_cookie(READ_YOUR_WRITES_WINDOW)), uuid4())) is engine
+
+
+def test_writes_set_the_primary_cookie():
+    client = TestClient(main.app)
+
+    assert READ_PRIMARY_COOKIE in client.post('/users/logout', follow_redirects=False).cookies
+    assert READ_PRIMARY_COOKIE not in client.get('/scramble', params={'puzzle': '3x3x3'}).cookies
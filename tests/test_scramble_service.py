@@ -0,0 +1,79 @@
+import pytest
+from fastapi import HTTPException
+from markupsafe import escape
+
+from app.constants import MODIFIERS, MOVES, WCA_SCRAMBLE_LENGTHS
+from app.controller.solutions_controller import SolutionsController
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+
+LAYERS = [''] + [str(layer) for layer in range(2, 8)]
+
+
+def every_move():
+    for face in MOVES:
+        for modifier in MODIFIERS:
+            yield f'{face}{modifier}'
+            yield f'{face}w{modifier}'
+            for layer in LAYERS[1:]:
+                yield f'{layer}{face}{modifier}'
+
+
+def test_every_move_round_trips():
+    moves = list(every_move())
+    packed = ScrambleService.encode(moves)
+
+    assert len(packed) == len(moves) == len(set(packed))
+    assert ScrambleService.decode(packed) == moves
+
+
+def test_every_code_round_trips_or_is_rejected():
+    for code in range(256):
+        try:
+            [move] = ScrambleService.decode(bytes([code]))
+        except ValueError:
+            # faces 6 and 7, modifier 3
+            assert code & 0b111 >= len(MOVES) or code >> 3 & 0b11 >= len(MODIFIERS)
+            continue
+
+        assert ScrambleService.encode([move]) == bytes([code])
+
+
+@pytest.mark.parametrize('puzzle', list(WCA_SCRAMBLE_LENGTHS))
+def test_generated_scrambles_round_trip(puzzle):
+    for _ in range(20):
+        moves = ScrambleService.generate_scramble(puzzle)
+        scramble = ' '.join(moves)
+
+        assert ScrambleService.decode(ScrambleService.encode(ScrambleService.parse(scramble))) == moves
+        assert ScrambleService.parse(scramble.replace(' ', '_')) == moves
+
+
+@pytest.mark.parametrize('move', ['X', 'r', 'M', 'R3', "R2'", "R''", 'Rw2w', '1R', '8R', '10R', '2Rw', 'R w', 'Uw3', 'x', "'"])
+def test_invalid_moves_are_rejected(move):
+    with pytest.raises(ValueError):
+        ScrambleService.encode(ScrambleService.parse(move))
+
+    with pytest.raises(HTTPException) as e:
+        SolutionService._encode_scramble(f"R U {move} F'")
+    assert e.value.status_code == 400
+
+
+def test_empty_scramble():
+    assert ScrambleService.encode(ScrambleService.parse('')) == b''
+    assert ScrambleService.decode(b'') == []
+
+
+def test_hash_collisions_are_told_apart(db, user, monkeypatch):
+    # every scramble with the same hash
+    monkeypatch.setattr(ScrambleService, 'hash', classmethod(lambda cls, data: 42))
+    scrambles = ["R U R' U'", "F2 B2 L D'", "R U R' U'"]
+    solutions = [SolutionService.create_solution('12.34', '3x3x3', scramble, user.id, db) for scramble in scrambles]
+
+    same = SolutionService.get_solutions_by_scramble(solutions[0].scramble, '3x3x3', user.id, db)
+    assert [solution.id for solution in same] == [solutions[0].id, solutions[2].id]
+
+    response = SolutionsController.get_solution_details_view(str(solutions[1].id), user.id, db)
+    body = response.body.decode()
+    assert response.status_code == 200
+    assert body.count(escape(scrambles[1])) == 1 and escape(scrambles[0]) not in body
@@ -0,0 +1,174 @@
+import threading
+from uuid import uuid4
+import numpy as np
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.constants import SESSION_BEST_AVERAGES
+from app.db.database import SessionLocal
+from app.model.practice_session import PracticeSession
+from app.model.solution import OLDEST_FIRST, Solution
+from app.services.scramble_service import ScrambleService
+from app.services.session_service import SessionService
+from app.services.solution_service import SolutionService
+from app.types.batch import BatchSolution
+from app.utils import get_rolling_avg_of
+
+PUZZLE = '3x3x3'
+
+
+def scramble() -> str:
+    return ' '.join(ScrambleService.generate_scramble(PUZZLE))
+
+
+def solve(db, user, time: float):
+    return SolutionService.create_solution(f'{time:.2f}', PUZZLE, scramble(), user.id, db)
+
+
+def aggregates(session: PracticeSession):
+    return (session.solve_count, session.dnf_count, session.time_sum, session.best_single, session.best_avg_five, session.best_avg_twelve)
+
+
+def active_session(db, user) -> PracticeSession:
+    session = SessionService.get_active_session(PUZZLE, user.id, db)
+    db.rollback()
+    return session
+
+
+def expected(db, session: PracticeSession):
+    """
+    The aggregates of a session computed from all of its solutions.
+    """
+    solutions = db.execute(select(Solution).where(Solution.session_id == session.id).order_by(*OLDEST_FIRST)).scalars().all()
+    db.rollback()
+    times = np.array([solution.time for solution in solutions])
+    finished = np.array([solution.time for solution in solutions if not solution.dnf])
+    averages = [get_rolling_avg_of(n, times, True) for n in SESSION_BEST_AVERAGES]
+
+    return (
+        len(solutions),
+        len(solutions) - len(finished),
+        pytest.approx(float(finished.sum())),
+        float(finished.min()) if len(finished) > 0 else None,
+        *[pytest.approx(float(average.min())) if len(average) > 0 else None for average in averages]
+    )
+
+
+@pytest.fixture
+def no_recompute(monkeypatch):
+    def recompute(session, db):
+        raise AssertionError('the whole session was read again')
+
+    monkeypatch.setattr(SessionService, '_recompute', recompute)
+
+
+def test_changes_match_a_recompute(db, user):
+    rng = np.random.default_rng(4)
+    solutions = [solve(db, user, time) for time in rng.lognormal(np.log(15), 0.2, 30).round(2)]
+
+    for step in range(60):
+        action = rng.choice(['solve', 'batch', 'replay', 'penalty', 'dnf', 'delete newest', 'delete'])
+        ids = [solution.id for solution in solutions]
+
+        if action == 'solve':
+            solutions.append(solve(db, user, round(rng.lognormal(np.log(15), 0.2), 2)))
+        elif action in ['batch', 'replay']:
+            # a replayed batch is older than the solutions stored since
+            created_at = solutions[len(solutions) // 2].created_at if action == 'replay' else None
+            items = [
+                BatchSolution(key=uuid4(), solution_time=f'{time:.2f}', scramble=scramble(), created_at=created_at)
+                for time in rng.lognormal(np.log(15), 0.2, int(rng.integers(1, 15))).round(2)
+            ]
+            solutions += SolutionService.create_solutions(items, PUZZLE, user.id, db)
+        elif action in ['penalty', 'dnf']:
+            SolutionService.update_solution(str(rng.choice(ids)), action, user.id, db)
+        elif len(solutions) > 0:
+            newest = max(solutions, key=lambda solution: (solution.created_at, solution.id))
+            deleted = newest if action == 'delete newest' else solutions[int(rng.integers(len(solutions)))]
+            SolutionService.delete_solution(str(deleted.id), user.id, db)
+            solutions = [solution for solution in solutions if solution.id != deleted.id]
+
+        session = active_session(db, user)
+        assert aggregates(session) == expected(db, session), f'step {step}: {action}'
+
+
+def test_appends_read_only_the_latest_solutions(db, user, no_recompute):
+    for time in [12.0, 11.0, 13.0, 10.0, 14.0, 12.5]:
+        solve(db, user, time)
+
+    items = [BatchSolution(key=uuid4(), solution_time=f'{time:.2f}', scramble=scramble()) for time in [9.0, 15.0, 11.5]]
+    SolutionService.create_solutions(items, PUZZLE, user.id, db)
+
+    session = active_session(db, user)
+    assert aggregates(session) == expected(db, session)
+
+
+def test_penalties_outside_the_best_windows_read_only_the_neighbours(db, user, no_recompute):
+    solutions = [solve(db, user, time) for time in [10.0, 10.5, 11.0, 10.2, 10.8] + [20.0 + i for i in range(12)]]
+
+    # in no window as good as the best one
+    SolutionService.update_solution(str(solutions[-1].id), 'penalty', user.id, db)
+    SolutionService.update_solution(str(solutions[-2].id), 'dnf', user.id, db)
+    SolutionService.delete_solution(str(solutions[-1].id), user.id, db)
+
+    session = active_session(db, user)
+    assert aggregates(session) == expected(db, session)
+    assert session.best_avg_five == pytest.approx(10.5)
+
+
+def test_changes_of_the_bests_are_recomputed(db, user, monkeypatch):
+    # enough solutions before the best window that all windows around it are read
+    for i in range(12):
+        solve(db, user, 30.0 + i)
+    solutions = [solve(db, user, time) for time in [10.0, 10.5, 11.0, 10.2, 10.8] + [20.0 + i for i in range(12)]]
+    recomputed = []
+    recompute = SessionService._recompute
+    monkeypatch.setattr(SessionService, '_recompute', lambda session, db: recomputed.append(session.id) or recompute(session, db))
+
+    # in the best window, the best single, from the middle
+    SolutionService.update_solution(str(solutions[1].id), 'penalty', user.id, db)
+    session = active_session(db, user)
+    assert session.best_avg_five == pytest.approx(32 / 3)
+
+    SolutionService.update_solution(str(solutions[0].id), 'penalty', user.id, db)
+    SolutionService.delete_solution(str(solutions[8].id), user.id, db)
+
+    session = active_session(db, user)
+    assert recomputed == [session.id] * 3
+    assert aggregates(session) == expected(db, session)
+    assert session.best_single == 10.2
+
+
+def test_one_active_session_per_puzzle(db, user):
+    db.add(PracticeSession(user_id=user.id, puzzle=PUZZLE, name='first'))
+    db.commit()
+
+    db.add(PracticeSession(user_id=user.id, puzzle=PUZZLE, name='second'))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+
+def test_concurrent_first_solves_share_the_session(db, user):
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        started = SessionService.lock_active_session(PUZZLE, user.id, first).id
+
+        # waits on the uncommitted insert of the first transaction, then takes its session
+        found = []
+        thread = threading.Thread(target=lambda: found.append(SessionService.lock_active_session(PUZZLE, user.id, second).id))
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+
+        first.commit()
+        thread.join(5)
+        second.commit()
+    finally:
+        first.close()
+        second.close()
+
+    assert found == [started]
+    sessions = db.execute(select(PracticeSession).where(PracticeSession.user_id == user.id)).scalars().all()
+    assert [session.is_active for session in sessions] == [True]
@@ -0,0 +1,60 @@
+import asyncio
+
+import main
+from app.constants import USER_COOKIE
+from app.controller import solutions_controller
+from app.db.database import engine
+from app.services.user_service import UserService
+
+
+async def open_event_stream(cookie: str):
+    """
+    Call the app like a server would and return once the first event (a keepalive) was sent.
+    TestClient reads the whole body before it returns, which a stream never finishes.
+    """
+    messages = asyncio.Queue()
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/solutions/events',
+        'raw_path': b'/solutions/events',
+        'root_path': '',
+        'query_string': b'puzzle=3x3x3',
+        'headers': [(b'cookie', f'{USER_COOKIE}={cookie}'.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80)
+    }
+    task = asyncio.create_task(main.app(scope, receive, messages.put))
+
+    start = await asyncio.wait_for(messages.get(), 5)
+    body = await asyncio.wait_for(messages.get(), 5)
+
+    return task, disconnected, start, body
+
+
+def test_event_stream_holds_no_connection(db, user, monkeypatch):
+    monkeypatch.setattr(solutions_controller, 'PB_EVENTS_KEEPALIVE', 0.05)
+    cookie = UserService.create_session_cookie(user)
+    db.close()
+
+    async def run():
+        task, disconnected, start, body = await open_event_stream(cookie)
+        try:
+            assert start['status'] == 200
+            assert body['body'] == b': keepalive\n\n'
+            # the user was looked up, but the stream runs on without a session
+            assert engine.pool.checkedout() == 0
+        finally:
+            disconnected.set()
+            await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from sqlalchemy import text
+
+from app.model.solution import Solution
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.types.batch import BatchSolution
+
+
+def batch_solution(created_at: datetime | None, time: str = '12.34') -> BatchSolution:
+    return BatchSolution(key=uuid4(), solution_time=time, scramble=' '.join(ScrambleService.generate_scramble('3x3x3')), created_at=created_at)
+
+
+def test_created_at_is_timezone_aware():
+    assert Solution.__table__.c.created_at.type.timezone
+
+
+def test_batch_times_without_offset_are_utc(db, user):
+    # the database session has a time zone of its own, a naive time must not be read in it
+    db.execute(text("SET LOCAL TIME ZONE 'Asia/Tokyo'"))
+
+    [solution] = SolutionService.create_solutions([batch_solution(datetime(2026, 1, 2, 3, 4, 5))], '3x3x3', user.id, db)
+
+    assert solution.created_at == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+def test_batch_times_keep_their_offset(db, user):
+    created_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-5)))
+
+    [solution] = SolutionService.create_solutions([batch_solution(created_at)], '3x3x3', user.id, db)
+
+    assert solution.created_at == created_at
+
+
+def test_replayed_batches_are_skipped(db, user):
+    items = [batch_solution(None, '10.00'), batch_solution(None, '11.00')]
+
+    assert len(SolutionService.create_solutions(items, '3x3x3', user.id, db)) == 2
+    assert SolutionService.create_solutions(items, '3x3x3', user.id, db) == []
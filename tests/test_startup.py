@@ -0,0 +1,28 @@
+import os, subprocess, sys
+from jinja2 import DictLoader, Environment
+
+from app.template_cache import TemplateBytecodeCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cold_start_is_within_budget():
+    # a fresh interpreter, the tests already imported NumPy and the app into this one
+    result = subprocess.run([sys.executable, '-m', 'app.scripts.startup_budget'], cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_importing_the_app_writes_nothing(tmp_path):
+    env = {**os.environ, 'PYTHONPATH': ROOT}
+    subprocess.run([sys.executable, '-c', 'import app.constants'], cwd=tmp_path, env=env, check=True)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_template_cache_creates_its_directory(tmp_path):
+    directory = tmp_path / 'cache' / 'templates'
+    env = Environment(loader=DictLoader({'page.html': '{{ 1 + 1 }}'}), bytecode_cache=TemplateBytecodeCache(str(directory)))
+
+    assert env.get_template('page.html').render() == '2'
+    assert len(os.listdir(directory)) == 1
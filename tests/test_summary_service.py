@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app.constants import HISTORY_METRICS
+from app.model.solution import OLDEST_FIRST, Solution
+from app.services import archive_service
+from app.services.archive_service import ArchiveService
+from app.services.invalidation_service import NEW_PB, InvalidationService
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.services.summary_service import SummaryService
+from app.types.batch import BatchSolution
+
+PUZZLE = '3x3x3'
+ACTIONS = ['solve', 'batch', 'replay', 'penalty', 'dnf', 'delete', 'archive', 'rebuild']
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive_service, 'SOLUTIONS_ARCHIVE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def snapshot(db, user):
+    """
+    Everything of the summary that the changes maintain, the versions aside.
+    """
+    summary = SummaryService.get_summary(PUZZLE, user.id, db)
+    db.rollback()
+
+    approx = lambda value: value if value is None else pytest.approx(value, abs=1e-6)
+    values = {
+        'solve_count': summary.solve_count,
+        'dnf_count': summary.dnf_count,
+        'time_sum': approx(summary.time_sum),
+        'time_sum_sq': approx(summary.time_sum_sq),
+        'best_single': summary.best_single
+    }
+    for key in HISTORY_METRICS:
+        values[key] = approx(getattr(summary, key))
+        id_key = 'single_id' if key == 'single' else f'{key}_window_start_id'
+        values[id_key] = getattr(summary, id_key)
+
+    return values
+
+
+def versions(db, user):
+    summary = SummaryService.get_summary(PUZZLE, user.id, db)
+    db.rollback()
+    return summary.version, summary.pb_version
+
+
+def live_ids(db, user):
+    ids = db.execute(select(Solution.id).where(Solution.user_id == user.id).order_by(*OLDEST_FIRST)).scalars().all()
+    db.rollback()
+    return ids
+
+
+def pick(db, user, rng, ids):
+    """
+    The newest live solution, the best single or any other, the ones with special cases in the summary.
+    """
+    best = db.execute(select(Solution.id).where(Solution.user_id == user.id, Solution.dnf == False).order_by(Solution.time)).scalars().first()
+    db.rollback()
+    candidates = [ids[-1], best, ids[int(rng.integers(len(ids)))]]
+    return next((id for id in candidates if id is not None and rng.random() < 0.5), candidates[-1])
+
+
+def batch(rng, count: int, start: datetime | None = None):
+    times = rng.lognormal(np.log(15), 0.2, count).round(2)
+    return [
+        BatchSolution(
+            key=uuid4(),
+            solution_time=f'{time:.2f}',
+            scramble=' '.join(ScrambleService.generate_scramble(PUZZLE)),
+            dnf=bool(rng.random() < 0.1),
+            created_at=start + timedelta(seconds=i) if start is not None else None
+        )
+        for i, time in enumerate(times)
+    ]
+
+
+@pytest.mark.parametrize('seed', [5, 6, 7])
+def test_changes_match_a_rebuild(db, user, seed):
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc)
+    # a history to archive from, most of it older than the archive cutoff
+    SolutionService.create_solutions(batch(rng, 150, now - timedelta(days=300)), PUZZLE, user.id, db)
+
+    for step in range(40):
+        action = ACTIONS[int(rng.integers(len(ACTIONS)))]
+        ids = live_ids(db, user)
+
+        if action == 'solve':
+            SolutionService.create_solution(f'{rng.lognormal(np.log(15), 0.2):.2f}', PUZZLE, ' '.join(ScrambleService.generate_scramble(PUZZLE)), user.id, db)
+        elif action == 'batch':
+            SolutionService.create_solutions(batch(rng, int(rng.integers(1, 20))), PUZZLE, user.id, db)
+        elif action == 'replay':
+            # lands in the middle of the history, maybe among the archived solutions
+            SolutionService.create_solutions(batch(rng, int(rng.integers(1, 20)), now - timedelta(days=int(rng.integers(1, 300)))), PUZZLE, user.id, db)
+        elif action in ['penalty', 'dnf']:
+            SolutionService.update_solution(str(pick(db, user, rng, ids)), action, user.id, db)
+        elif action == 'delete':
+            SolutionService.delete_solution(str(pick(db, user, rng, ids)), user.id, db)
+        elif action == 'archive':
+            ArchiveService.archive(PUZZLE, user.id, now - timedelta(days=120), db)
+        else:
+            version, pb_version = versions(db, user)
+            incremental = snapshot(db, user)
+            SummaryService.rebuild(db, user.id)
+
+            # the versions carry over and count the rebuild as a change
+            assert versions(db, user) == (version + 1, pb_version)
+            assert snapshot(db, user) == incremental, f'step {step}: {action}'
+            continue
+
+        incremental = snapshot(db, user)
+        version, pb_version = versions(db, user)
+        SummaryService.rebuild(db, user.id)
+        assert snapshot(db, user) == incremental, f'step {step}: {action}'
+        assert versions(db, user) == (version + 1, pb_version)
+
+
+def test_changes_after_a_rebuild_continue_from_the_carried_over_versions(db, user):
+    rng = np.random.default_rng(8)
+    SolutionService.create_solutions(batch(rng, 20), PUZZLE, user.id, db)
+    InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+    db.commit()
+    version, pb_version = versions(db, user)
+
+    SummaryService.rebuild(db, user.id)
+    [solution] = SolutionService.create_solutions(batch(rng, 1), PUZZLE, user.id, db)
+    SolutionService.update_solution(str(solution.id), 'penalty', user.id, db)
+    SolutionService.delete_solution(str(live_ids(db, user)[0]), user.id, db)
+
+    # the rebuild and three changes, the personal bests untouched
+    assert versions(db, user) == (version + 4, pb_version)
+    incremental = snapshot(db, user)
+    SummaryService.rebuild(db, user.id)
+    assert snapshot(db, user) == incremental
+
+
+def test_deleting_every_solution_empties_the_summary(db, user):
+    rng = np.random.default_rng(9)
+    SolutionService.create_solutions(batch(rng, 15), PUZZLE, user.id, db)
+
+    for id in live_ids(db, user):
+        SolutionService.delete_solution(str(id), user.id, db)
+
+    summary = snapshot(db, user)
+    assert summary['solve_count'] == 0 and summary['dnf_count'] == 0 and summary['best_single'] is None
+    assert all(summary[key] is None for key in HISTORY_METRICS)
+    assert summary['time_sum'] == pytest.approx(0, abs=1e-6)
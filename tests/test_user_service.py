@@ -0,0 +1,42 @@
+from uuid import uuid4
+from starlette.requests import Request
+
+from app.constants import USER_COOKIE
+from app.model.user import User
+from app.services.user_service import UserService, get_optional_user_id
+
+
+def request_with_cookie(value: str) -> Request:
+    return Request({'type': 'http', 'headers': [(b'cookie', f'{USER_COOKIE}={value}'.encode())]})
+
+
+def test_session_cookie_round_trip():
+    user = User(id=uuid4(), name='name', password_hash='')
+
+    assert UserService.read_session_cookie(UserService.create_session_cookie(user)) == user.id
+
+
+def test_session_cookie_rejects_other_ids():
+    user = User(id=uuid4(), name='name', password_hash='')
+    _, _, signature = UserService.create_session_cookie(user).partition('.')
+
+    assert UserService.read_session_cookie(f'{uuid4()}.{signature}') is None
+    # the unsigned cookies from before
+    assert UserService.read_session_cookie(str(user.id)) is None
+    assert UserService.read_session_cookie(f'{user.id}.') is None
+    assert UserService.read_session_cookie('not a cookie') is None
+    assert UserService.read_session_cookie(None) is None
+
+
+def test_logged_in_user(db, user):
+    request = request_with_cookie(UserService.create_session_cookie(user))
+
+    assert get_optional_user_id(request, db) == user.id
+
+
+def test_deleted_user_is_logged_out(db, user):
+    cookie = UserService.create_session_cookie(user)
+    db.delete(user)
+    db.commit()
+
+    assert get_optional_user_id(request_with_cookie(cookie), db) is None
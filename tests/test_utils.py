@@ -0,0 +1,92 @@
+import math
+import numpy as np
+import pytest
+
+from app.utils import EMPTY_TIME_STR, downsample_lttb, float_to_timestr, floats_to_timestrs, timestr_to_float, timestrs_to_floats
+
+# ties and near ties of the rounding to hundredths, the minute and digit boundaries
+EDGES = [
+    0.0, 0.005, 0.015, 0.125, 0.995, 1.005, 9.995, 9.999, 10.0, 59.99, 59.995, 59.996, 59.9999,
+    60.0, 60.005, 119.995, 599.995, 3599.995, 3600.0, 59999.995, 60000.0, 1e7
+]
+
+
+def edge_grid():
+    values = []
+    for edge in EDGES:
+        for value in (edge, -edge, np.nextafter(edge, math.inf), np.nextafter(edge, -math.inf)):
+            values.append(float(value))
+    values += [-0.001, -1e-20, -59.995, -60.0, -61.5, 5e-324, -5e-324]
+    return values
+
+
+def test_batch_formatting_matches_the_single_one():
+    values = edge_grid() + [i / 1000 for i in range(0, 120_000, 7)]
+
+    assert list(floats_to_timestrs(values)) == [float_to_timestr(value) for value in values]
+    assert list(floats_to_timestrs(np.array(values))) == [float_to_timestr(value) for value in values]
+
+
+def test_negative_zero():
+    assert float_to_timestr(-0.0) == '0.00s'
+    assert list(floats_to_timestrs([-0.0])) == ['0.00s']
+
+
+def test_missing_times():
+    assert float_to_timestr(None) == EMPTY_TIME_STR
+    assert float_to_timestr(math.nan) == EMPTY_TIME_STR
+    assert list(floats_to_timestrs([None, math.nan, 1.5])) == [EMPTY_TIME_STR, EMPTY_TIME_STR, '1.50s']
+    assert list(floats_to_timestrs([])) == []
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0.005, '0.01s'), (0.015, '0.01s'), (9.995, '9.99s'), (59.999, '60.00s'), (60.0, '1:00.00min'), (61.5, '1:01.50min')
+])
+def test_rounding(value, expected):
+    assert float_to_timestr(value) == expected
+    assert list(floats_to_timestrs([value])) == [expected]
+
+
+def test_batch_parsing_matches_the_single_one():
+    time_strs = ['12.34', '1:02.5', '59', '0:00.001', '12,5', '', 'abc', '60:00', '1:60']
+    expected = [timestr_to_float(time_str) for time_str in time_strs]
+
+    parsed = timestrs_to_floats(time_strs)
+
+    for value, single in zip(parsed, expected):
+        assert (math.isnan(value) and single is None) or value == single
+
+
+@pytest.mark.parametrize('length, points', [(1000, 50), (1000, 3), (1000, 999), (10, 7)])
+def test_downsampling_keeps_the_shape(length, points):
+    rng = np.random.default_rng(length + points)
+    x = np.cumsum(rng.uniform(1, 100, length))
+    y = rng.lognormal(np.log(15), 0.2, length)
+
+    indices = downsample_lttb(x, y, points)
+
+    assert len(indices) == points
+    assert indices[0] == 0 and indices[-1] == length - 1
+    # one point per bucket, the x values stay in order
+    assert np.all(np.diff(indices) > 0)
+    assert np.all(np.diff(x[indices]) > 0)
+
+
+def test_downsampling_keeps_a_spike():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.full(1000, 15.0)
+    y[437] = 40.0
+
+    assert 437 in downsample_lttb(x, y, 20)
+
+
+@pytest.mark.parametrize('length', [0, 1, 5, 20])
+def test_short_series_are_not_downsampled(length):
+    x = np.arange(length, dtype=np.float64)
+
+    assert downsample_lttb(x, x, 20).tolist() == list(range(length))
+
+
+def test_downsampling_needs_three_points():
+    with pytest.raises(ValueError):
+        downsample_lttb(np.arange(10.0), np.arange(10.0), 2)
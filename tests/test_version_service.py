@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from uuid import uuid4
+from fastapi.testclient import TestClient
+
+import main
+from app.constants import READ_YOUR_WRITES_WINDOW, USER_COOKIE
+from app.services.invalidation_service import NEW_PB, InvalidationService
+from app.services.scramble_service import ScrambleService
+from app.services.solution_service import SolutionService
+from app.services.user_service import UserService
+from app.services.version_service import VersionService
+
+PUZZLE = '3x3x3'
+
+
+def test_old_changes_are_forgotten(monkeypatch):
+    user_id = uuid4()
+    VersionService.mark_changed(user_id)
+    assert VersionService.changed_within(user_id, READ_YOUR_WRITES_WINDOW)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + READ_YOUR_WRITES_WINDOW + 1)
+    VersionService.mark_changed(uuid4())
+
+    assert user_id not in VersionService._changed_at
+
+
+def test_if_none_match():
+    etag = '"0123456789abcdef01234567"'
+
+    assert VersionService.is_not_modified(etag, f'"other", {etag}')
+    assert VersionService.is_not_modified(etag, '*')
+    assert not VersionService.is_not_modified(etag, '"other"')
+    assert not VersionService.is_not_modified(etag, None)
+
+
+def solve(db, user):
+    return SolutionService.create_solution('12.34', PUZZLE, ' '.join(ScrambleService.generate_scramble(PUZZLE)), user.id, db)
+
+
+def test_etag_changes_with_the_persisted_versions(db, user):
+    etag = VersionService.get_etag(user.id, [PUZZLE], db, 'cursor')
+
+    assert VersionService.get_etag(user.id, [PUZZLE], db, 'cursor') == etag
+    assert VersionService.get_etag(user.id, [PUZZLE], db, 'other') != etag
+    assert VersionService.get_etag(uuid4(), [PUZZLE], db, 'cursor') != etag
+
+    # the first solve creates the summary
+    solve(db, user)
+    after_solve = VersionService.get_etag(user.id, [PUZZLE], db, 'cursor')
+    assert after_solve != etag
+
+    # a change committed by another worker, this one never heard of it
+    InvalidationService.publish(PUZZLE, user.id, db, NEW_PB)
+    db.commit()
+    assert VersionService.get_etag(user.id, [PUZZLE], db, 'cursor') != after_solve
+
+
+def test_etags_are_the_same_in_every_worker(db, user, monkeypatch):
+    solve(db, user)
+    etag = VersionService.get_etag(user.id, [PUZZLE], db)
+
+    # another worker, or this one after a restart, knows nothing about the user
+    monkeypatch.setattr(VersionService, '_changed_at', OrderedDict())
+    monkeypatch.setattr(InvalidationService, '_seen', OrderedDict())
+
+    assert VersionService.get_etag(user.id, [PUZZLE], db) == etag
+
+
+def test_conditional_get(db, user):
+    solve(db, user)
+    client = TestClient(main.app, cookies={USER_COOKIE: UserService.create_session_cookie(user)})
+
+    response = client.get('/solutions/current', params={'puzzle': PUZZLE})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    assert client.get('/solutions/current', params={'puzzle': PUZZLE}, headers={'If-None-Match': etag}).status_code == 304
+
+    solve(db, user)
+    response = client.get('/solutions/current', params={'puzzle': PUZZLE}, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag